@@ -13,6 +13,13 @@ class DatabaseConfig(BaseSettings):
         POSTGRES_DB(str): Имя базы данных
         POSTGRES_USER(str): Пользователь БД
         POSTGRES_PASSWORD(str): Пароль пользователя БД
+        SANDBOX_DATABASE_URL(str | None): URL БД (например, реплики) для сгенерированного SQL
+        SANDBOX_POOL_SIZE(int): Размер пула соединений для сгенерированного SQL
+        SANDBOX_MAX_OVERFLOW(int): Дополнительные соединения сверх пула
+        SANDBOX_CONCURRENCY(int): Максимальное число одновременно выполняемых сгенерированных запросов
+        SANDBOX_QUEUE_TIMEOUT(float): Максимальное ожидание свободного места в песочнице (в секундах)
+        SANDBOX_STATEMENT_TIMEOUTS(dict[str, int]): statement_timeout по намерениям (в миллисекундах)
+        SANDBOX_DEFAULT_STATEMENT_TIMEOUT(int): statement_timeout для остальных намерений (в миллисекундах)
     """
     # Настройки базы данных
     DB_HOST: str
@@ -21,6 +28,15 @@ class DatabaseConfig(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
 
+    # Песочница для сгенерированного SQL
+    SANDBOX_DATABASE_URL: str | None = None
+    SANDBOX_POOL_SIZE: int = 5
+    SANDBOX_MAX_OVERFLOW: int = 0
+    SANDBOX_CONCURRENCY: int = 4
+    SANDBOX_QUEUE_TIMEOUT: float = 30
+    SANDBOX_STATEMENT_TIMEOUTS: dict[str, int] = {'data': 600_000, 'statistics': 30_000, 'analytics': 60_000}
+    SANDBOX_DEFAULT_STATEMENT_TIMEOUT: int = 30_000
+
     model_config = SettingsConfigDict(
         env_file=Path(__file__).parent.parent.parent / ".env",
         env_file_encoding='utf-8',
@@ -31,4 +47,9 @@ class DatabaseConfig(BaseSettings):
     def database_url_postgresql(self) -> str:
         """Генерирует URL для подключения к PostgreSQL с использованием asyncpg."""
         return (f'postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@'
-                f'{self.DB_HOST}:{self.DB_PORT}/{self.POSTGRES_DB}')
\ No newline at end of file
+                f'{self.DB_HOST}:{self.DB_PORT}/{self.POSTGRES_DB}')
+
+    @property
+    def database_url_sandbox(self) -> str:
+        """Возвращает URL БД для сгенерированного SQL (реплика, если задана, иначе основная БД)."""
+        return self.SANDBOX_DATABASE_URL or self.database_url_postgresql
\ No newline at end of file
@@ -31,18 +31,20 @@ class QueryWrapper:
         """
         self.query = query
 
-    async def execute(self, session: AsyncSession) -> Result:
+    async def execute(self, session: AsyncSession, params: dict | list[dict] | None = None) -> Result:
         """
         Выполняет запрос в переданной сессии.
 
         Args:
             session (AsyncSession): Асинхронная сессия SQLAlchemy.
+            params (dict | list[dict] | None, optional): Параметры запроса.
+                Список словарей выполняет запрос пакетно (executemany). Defaults to None.
 
         Returns:
             Result: Результат выполнения запроса SQLAlchemy.
         """
         logger.info(f'Выполняется query: {self.query}')
-        result = await session.execute(self.query)
+        result = await session.execute(self.query, params)
         return result
 
     async def scalar_one_or_none(self, session: AsyncSession) -> ModelType | None:
@@ -1,3 +1,5 @@
+import asyncio
+import time
 from fastapi import Depends, Request
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession, AsyncEngine
@@ -26,12 +28,15 @@ class DatabaseSessionManager:
             Существующая фабрика сессий. Defaults to None.
         engine (AsyncEngine | None, optional):
             Существующий движок базы данных. Defaults to None.
+        engine_kwargs (dict | None, optional):
+            Дополнительные параметры движка (pool_size, max_overflow и т.д.). Defaults to None.
     """
     def __init__(
             self,
             database_url: str,
             session_factory: async_sessionmaker[AsyncSession] | None = None,
-            engine: AsyncEngine | None = None
+            engine: AsyncEngine | None = None,
+            engine_kwargs: dict | None = None
     ) -> None:
         """Инициализация менеджера сессий.
 
@@ -39,10 +44,12 @@ class DatabaseSessionManager:
             database_url: URL для подключения к БД
             session_factory: Опциональная фабрика сессий
             engine: Опциональный существующий движок
+            engine_kwargs: Дополнительные параметры движка
         """
         self.database_url = database_url
         self.engine = engine
         self.session_factory = session_factory
+        self.engine_kwargs = engine_kwargs or {}
 
     async def init(self):
         """
@@ -56,6 +63,7 @@ class DatabaseSessionManager:
         try:
             self.engine = create_async_engine(
                 url=self.database_url,
+                **self.engine_kwargs,
             )
             self.session_factory = async_sessionmaker(
                 bind=self.engine,
@@ -202,6 +210,132 @@ class DatabaseSessionManager:
         return Annotated[AsyncSession, Depends(get_session)]
 
 
+class SandboxBusyError(RuntimeError):
+    """Песочница занята: место для запроса не освободилось за время ожидания"""
+
+
+class SandboxSessionManager(DatabaseSessionManager):
+    """
+    Менеджер сессий для выполнения SQL, сгенерированного LLM.
+
+    Работает на отдельном пуле соединений (при необходимости - к реплике),
+    поэтому тяжелые сгенерированные запросы не занимают соединения приложения.
+    Каждая сессия открывает транзакцию READ ONLY с statement_timeout, зависящим
+    от намерения. Число одновременно выполняемых запросов ограничено, время
+    ожидания в очереди измеряется.
+
+    Args:
+        database_url (str): URL для подключения к БД.
+        concurrency (int): Максимальное число одновременно открытых сессий песочницы.
+        queue_timeout (float): Максимальное ожидание свободного места в секундах.
+        statement_timeouts (dict[str, int]): statement_timeout по намерениям в миллисекундах.
+        default_statement_timeout (int): statement_timeout для остальных намерений в миллисекундах.
+        engine_kwargs (dict | None, optional): Дополнительные параметры движка. Defaults to None.
+    """
+    def __init__(
+            self,
+            database_url: str,
+            concurrency: int,
+            queue_timeout: float,
+            statement_timeouts: dict[str, int],
+            default_statement_timeout: int,
+            engine_kwargs: dict | None = None
+    ) -> None:
+        super().__init__(database_url, engine_kwargs=engine_kwargs)
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.statement_timeouts = statement_timeouts
+        self.default_statement_timeout = default_statement_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает загрузку песочницы и время ожидания в очереди"""
+        return {
+            'concurrency': self.concurrency,
+            'active': self.active,
+            'waiting': self.waiting,
+            'acquired': self.acquired,
+            'rejected': self.rejected,
+            'wait_avg': self.wait_total / self.acquired if self.acquired else 0.0,
+            'wait_max': self.wait_max,
+        }
+
+    def statement_timeout(self, intent: str | None) -> int:
+        """Возвращает statement_timeout для намерения в миллисекундах"""
+        return self.statement_timeouts.get(intent or '', self.default_statement_timeout)
+
+    @asynccontextmanager
+    async def sandbox(self, intent: str | None = None) -> AsyncIterator[AsyncSession]:
+        """
+        Асинхронный контекстный менеджер сессии песочницы.
+
+        Дожидается свободного места (не дольше queue_timeout), открывает
+        транзакцию READ ONLY с statement_timeout намерения и откатывает ее
+        по завершении.
+
+        Args:
+            intent (str | None, optional): Намерение (data, statistics, analytics). Defaults to None.
+
+        Yields:
+            AsyncSession: Асинхронная сессия SQLAlchemy.
+
+        Raises:
+            SandboxBusyError: Если место не освободилось за queue_timeout.
+        """
+        start_wait = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise SandboxBusyError(f'Нет свободного места для выполнения запроса за {self.queue_timeout} сек')
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - start_wait
+        self.acquired += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        if wait > 1:
+            logger.warning(f'Запрос ждал места в песочнице {wait:.2f} сек')
+
+        self.active += 1
+        try:
+            async with self.session_factory() as session:
+                try:
+                    timeout = self.statement_timeout(intent)
+                    # SET TRANSACTION должен быть первым оператором транзакции
+                    await session.execute(text('SET TRANSACTION READ ONLY'))
+                    await session.execute(text(f'SET LOCAL statement_timeout = {int(timeout)}'))
+                    logger.debug(f'Сессия песочницы открыта: намерение {intent}, statement_timeout {timeout} мс')
+                    yield session
+                finally:
+                    await session.rollback()
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+
 # Глобальный экземпляр менеджера сессий
 session_manager = DatabaseSessionManager(SQL_DATABASE_URL)
 DbSessionDepends = session_manager.dependency
+
+# Менеджер сессий для сгенерированного LLM SQL
+sandbox_manager = SandboxSessionManager(
+    config.database_config.database_url_sandbox,
+    concurrency=config.database_config.SANDBOX_CONCURRENCY,
+    queue_timeout=config.database_config.SANDBOX_QUEUE_TIMEOUT,
+    statement_timeouts=config.database_config.SANDBOX_STATEMENT_TIMEOUTS,
+    default_statement_timeout=config.database_config.SANDBOX_DEFAULT_STATEMENT_TIMEOUT,
+    engine_kwargs={
+        'pool_size': config.database_config.SANDBOX_POOL_SIZE,
+        'max_overflow': config.database_config.SANDBOX_MAX_OVERFLOW,
+        'pool_pre_ping': True,
+    },
+)
@@ -6,15 +6,22 @@ from pathlib import Path
 from loguru import logger
 from pydantic import BaseModel
 
-from backend.database.session import session_manager, DatabaseSessionManager
+from backend.database.session import (
+    session_manager, sandbox_manager, DatabaseSessionManager, SandboxSessionManager
+)
 from backend.config import config
 from backend.auth.router import auth_api_router
 from backend.rag_engine.api.routers.vector_router import vector_router
+from backend.rag_engine.api.routers.chat_router import chat_router
 from backend.rag_engine.qdrant.manager import VectorStoreManager, vector_manager
+from backend.rag_engine.export.executor import export_executor
+from backend.rag_engine.llm.registry import model_registry
+from backend.rag_engine.graph.graph import checkpoint_compactor
 
 
 class AppState(BaseModel):
     db_manager: DatabaseSessionManager
+    sandbox_manager: SandboxSessionManager
     vector_manager: VectorStoreManager
 
     model_config = {'arbitrary_types_allowed': True}
@@ -31,17 +38,29 @@ async def lifespan(app: FastAPI):
 
     # Инициализация сессий sql базы
     await session_manager.init()
+    # Инициализация отдельного пула для сгенерированного SQL
+    await sandbox_manager.init()
     # Инициализация менеджера векторной базы
     await vector_manager.init()
+    # Загрузка моделей на хостах Ollama до первого запроса
+    if config.rag_config.MODEL_WARMUP:
+        await model_registry.warm_up()
 
     app.state.db_manager = session_manager
+    app.state.sandbox_manager = sandbox_manager
     app.state.vector_manager = vector_manager
+    # Фоновое сжатие чекпоинтов диалогов
+    checkpoint_compactor.start()
     
     yield
 
+    await checkpoint_compactor.stop()
     # Очистка
     await app.state.db_manager.close()
+    await app.state.sandbox_manager.close()
     await app.state.vector_manager.close()
+    await model_registry.close()
+    export_executor.shutdown()
 
 
 def create_app() -> FastAPI:
@@ -68,6 +87,7 @@ def create_app() -> FastAPI:
     )
     app.include_router(auth_api_router)  # Установка роутера авторизации
     app.include_router(vector_router) # Установка роутера векторной бд
+    app.include_router(chat_router) # Установка роутера диалога с графом
 
     return app
 
@@ -1,18 +1,12 @@
-from langchain_ollama import ChatOllama
 from langchain.agents import create_agent
 from langchain.agents.structured_output import ToolStrategy
+from langchain_core.language_models import BaseChatModel
 
 from .schemes import AnalyticScheme, QueryIntentScheme, SQLScheme
-from .prompts import intent_classifier_prompt, sql_generate_prompt, analytic_prompt
-from ...config import config
+from .prompts import intent_classifier_prompt, sql_generate_prompt, analytic_prompt, summary_prompt
 
 
-def create_intent_classifier_agent():
-    model = ChatOllama(
-        model=config.rag_config.MODEL_NAME,
-        base_url=config.rag_config.MODEL_HOST,
-        temperature=0.1,
-    )
+def create_intent_classifier_agent(model: BaseChatModel):
     agent_intent_classifier = create_agent(
         model=model,
         system_prompt=intent_classifier_prompt,
@@ -21,12 +15,7 @@ def create_intent_classifier_agent():
     return agent_intent_classifier
  
  
-def create_sql_generate_agent():
-    model = ChatOllama(
-        model=config.rag_config.MODEL_NAME,
-        base_url=config.rag_config.MODEL_HOST,
-        temperature=0.1,
-    )
+def create_sql_generate_agent(model: BaseChatModel):
     agent_sql = create_agent(
         model=model,
         system_prompt=sql_generate_prompt,
@@ -35,12 +24,7 @@ def create_sql_generate_agent():
     return agent_sql
  
  
-def create_analytic_agent():
-    model = ChatOllama(
-        model=config.rag_config.MODEL_NAME,
-        base_url=config.rag_config.MODEL_HOST,
-        temperature=0.1,
-    )
+def create_analytic_agent(model: BaseChatModel):
     analytic_agent = create_agent(
         model=model,
         system_prompt=analytic_prompt,
@@ -49,7 +33,9 @@ def create_analytic_agent():
     return analytic_agent
  
  
-agent_intent_classifier = create_intent_classifier_agent()
-agent_sql_generate = create_sql_generate_agent()
-agent_analytic = create_analytic_agent()
- 
\ No newline at end of file
+def create_summary_agent(model: BaseChatModel):
+    summary_agent = create_agent(
+        model=model,
+        system_prompt=summary_prompt,
+    )
+    return summary_agent
@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import re
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, NamedTuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, SystemMessage
+from loguru import logger
+
+from ..llm.gateway import llm_gateway
+from ...config import config
+
+
+class _ReadySummary(NamedTuple):
+    """Сводка, посчитанная в фоне: исходная сводка, свернутые строки и результат"""
+    base_summary: str | None
+    folded: tuple[str, ...]
+    summary: str
+
+
+class HistoryContext:
+    """
+    Управление контекстом диалога вместо закрытия чата по числу сообщений.
+
+    В состоянии графа хранится окно последних сообщений, ограниченное бюджетом
+    токенов. Сообщения, выпавшие из окна, переводятся в короткие строки
+    ожидания (summary_pending) и в фоне сворачиваются LLM в общую сводку
+    (summary); готовая сводка применяется в начале следующего хода. Пока сводка
+    считается, строки ожидания попадают в промпт как есть, их размер тоже
+    ограничен. Крупные фрагменты сообщений (код, SQL, таблицы, JSON) заменяются
+    короткими ссылками. Так размер промпта не зависит от длины диалога.
+
+    Фоновые сводки хранятся в памяти процесса; если ход обработал другой воркер
+    или сводка устарела, строки ожидания сворачиваются заново. Если строки ожидания
+    превысили свой бюджет, сводка строится сразу в ходе диалога и попадает
+    в состояние графа, поэтому история не теряется при нескольких воркерах
+    и занятой очереди фоновых запросов.
+
+    Attributes:
+        get_agent (Callable[[], Any]): Возвращает агента, обновляющего сводку
+        token_budget (int): Размер окна сообщений в токенах
+        min_messages (int): Минимальное число сообщений в окне
+        summary_token_budget (int): Максимальный размер сводки в токенах
+        pending_token_budget (int): Максимальный размер строк ожидания в токенах
+        artifact_max_tokens (int): Размер фрагмента, начиная с которого он заменяется ссылкой
+
+    Args:
+        get_agent (Callable[[], Any]): Возвращает агента сводки (агент создается при первой сводке)
+        token_budget (int, optional): Defaults to config.rag_config.CONTEXT_TOKEN_BUDGET.
+        min_messages (int, optional): Defaults to config.rag_config.CONTEXT_MIN_MESSAGES.
+        summary_token_budget (int, optional): Defaults to config.rag_config.CONTEXT_SUMMARY_TOKEN_BUDGET.
+        pending_token_budget (int, optional): Defaults to config.rag_config.CONTEXT_PENDING_TOKEN_BUDGET.
+        artifact_max_tokens (int, optional): Defaults to config.rag_config.CONTEXT_ARTIFACT_MAX_TOKENS.
+    """
+    _CHARS_PER_TOKEN = 3
+    # Максимальное число готовых сводок, ожидающих следующего хода своего диалога
+    _MAX_READY = 1000
+    _CODE_BLOCK = re.compile(r'```[\w-]*\n?(.*?)```', re.S)
+    _TABLE = re.compile(r'(?:^[ \t]*\|.*\|[ \t]*(?:\n|$)){3,}', re.M)
+    _JSON = re.compile(r'[\[{][^\n]*[\]}]')
+
+    def __init__(
+            self,
+            get_agent: Callable[[], Any],
+            token_budget: int = config.rag_config.CONTEXT_TOKEN_BUDGET,
+            min_messages: int = config.rag_config.CONTEXT_MIN_MESSAGES,
+            summary_token_budget: int = config.rag_config.CONTEXT_SUMMARY_TOKEN_BUDGET,
+            pending_token_budget: int = config.rag_config.CONTEXT_PENDING_TOKEN_BUDGET,
+            artifact_max_tokens: int = config.rag_config.CONTEXT_ARTIFACT_MAX_TOKENS,
+    ):
+        self.get_agent = get_agent
+        self.token_budget = token_budget
+        self.min_messages = min_messages
+        self.summary_token_budget = summary_token_budget
+        self.pending_token_budget = pending_token_budget
+        self.artifact_max_tokens = artifact_max_tokens
+        self._ready: OrderedDict[str, _ReadySummary] = OrderedDict()
+        self._running: dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        """Оценивает число токенов текста"""
+        return len(text) // cls._CHARS_PER_TOKEN + 1
+
+    def compact_artifacts(self, text: str) -> str:
+        """Заменяет крупные фрагменты кода, таблиц и JSON короткими ссылками"""
+        def replace(kind: str):
+            def _replace(match: re.Match) -> str:
+                fragment = match.group(0)
+                if self.estimate_tokens(fragment) <= self.artifact_max_tokens:
+                    return fragment
+                lines = fragment.strip().count('\n') + 1
+                return f'[{kind}: {lines} строк, опущено]' + ('\n' if fragment.endswith('\n') else '')
+            return _replace
+
+        text = self._CODE_BLOCK.sub(replace('код'), text)
+        text = self._TABLE.sub(replace('таблица'), text)
+        return self._JSON.sub(replace('данные'), text)
+
+    def _fold(self, message: BaseMessage) -> str:
+        """Переводит сообщение в строку для сводки"""
+        role = 'Пользователь' if isinstance(message, HumanMessage) else 'Ассистент'
+        content = self.compact_artifacts(str(message.content))
+        max_chars = self.artifact_max_tokens * self._CHARS_PER_TOKEN
+        if len(content) > max_chars:
+            content = content[:max_chars - 3] + '...'
+        return f'{role}: {content}'
+
+    async def _summarize(self, thread_id: str, summary: str | None, folded: tuple[str, ...]) -> str | None:
+        """Сворачивает строки в сводку, при ошибке возвращает None"""
+        text = f'Текущая сводка: {summary or "нет"}\n\nНовые сообщения:\n' + '\n'.join(folded)
+        try:
+            result = await self.get_agent().ainvoke({'messages': [HumanMessage(content=text)]})
+            new_summary = str(result['messages'][-1].content).strip()
+        except Exception as e:
+            logger.error(f'Ошибка построения сводки диалога {thread_id}: {e}')
+            return None
+        max_chars = self.summary_token_budget * self._CHARS_PER_TOKEN
+        if len(new_summary) > max_chars:
+            new_summary = new_summary[:max_chars - 3] + '...'
+        return new_summary
+
+    async def _summarize_background(self, thread_id: str, summary: str | None, folded: tuple[str, ...]):
+        new_summary = await self._summarize(thread_id, summary, folded)
+        if new_summary is None:
+            return
+        self._ready[thread_id] = _ReadySummary(summary, folded, new_summary)
+        self._ready.move_to_end(thread_id)
+        while len(self._ready) > self._MAX_READY:
+            self._ready.popitem(last=False)
+        logger.info(f'Сводка диалога {thread_id} обновлена ({len(folded)} сообщений свернуто)')
+
+    def _schedule(self, thread_id: str, summary: str | None, pending: list[str]):
+        if not pending or thread_id in self._running:
+            return
+        # Пустой контекст: фоновый вызов LLM не должен попадать в поток событий текущего хода
+        task = asyncio.create_task(
+            self._summarize_background(thread_id, summary, tuple(pending)),
+            context=contextvars.Context(),
+        )
+        self._running[thread_id] = task
+        task.add_done_callback(lambda _: self._running.pop(thread_id, None))
+
+    async def _summarize_now(self, thread_id: str, summary: str | None, pending: list[str]) -> str | None:
+        """Сворачивает строки ожидания в ходе диалога"""
+        async def summarize() -> str | None:
+            # Ход ждет сводку, поэтому запрос идет с приоритетом диалога, а не фоновых задач
+            with llm_gateway.use_class('interactive'):
+                return await self._summarize(thread_id, summary, tuple(pending))
+
+        # Пустой контекст: вызов LLM для сводки не должен попадать в поток событий хода
+        return await asyncio.create_task(summarize(), context=contextvars.Context())
+
+    async def update(
+            self,
+            thread_id: str,
+            messages: list[BaseMessage],
+            summary: str | None,
+            pending: list[str],
+            user_input: str,
+    ) -> dict:
+        """
+        Добавляет сообщение пользователя и приводит контекст диалога к бюджету.
+
+        Args:
+            thread_id (str): ID диалога
+            messages (list[BaseMessage]): Окно сообщений из состояния
+            summary (str | None): Текущая сводка
+            pending (list[str]): Строки, ожидающие сворачивания в сводку
+            user_input (str): Сообщение пользователя
+
+        Returns:
+            dict: Обновление состояния графа (messages, summary, summary_pending, messages_length)
+        """
+        pending = list(pending)
+        ready = self._ready.pop(thread_id, None)
+        if (
+                ready is not None
+                and ready.base_summary == summary
+                and tuple(pending[:len(ready.folded)]) == ready.folded
+        ):
+            summary = ready.summary
+            pending = pending[len(ready.folded):]
+
+        # Крупные фрагменты заменяются ссылками в сообщениях с тем же id
+        window: list[BaseMessage] = []
+        replaced: dict[str, BaseMessage] = {}
+        for message in messages:
+            if isinstance(message.content, str):
+                content = self.compact_artifacts(message.content)
+                if content != message.content:
+                    message = message.model_copy(update={'content': content})
+                    replaced[message.id] = message
+            window.append(message)
+        new_message = HumanMessage(content=user_input, id=str(uuid.uuid4()))
+        window.append(new_message)
+
+        # Старые сообщения выходят из окна, пока оно больше бюджета
+        tokens = [self.estimate_tokens(str(message.content)) for message in window]
+        total = sum(tokens)
+        evicted = 0
+        while total > self.token_budget and len(window) - evicted > self.min_messages:
+            total -= tokens[evicted]
+            evicted += 1
+        removed = window[:evicted]
+        for message in removed:
+            if isinstance(message, (HumanMessage, AIMessage)):
+                pending.append(self._fold(message))
+            replaced.pop(message.id, None)
+
+        if sum(self.estimate_tokens(line) for line in pending) > self.pending_token_budget:
+            # Фоновая сводка не успевает (или считается на другом воркере): сворачиваем сейчас
+            new_summary = await self._summarize_now(thread_id, summary, pending)
+            if new_summary is not None:
+                logger.info(f'Сводка диалога {thread_id} построена в ходе ({len(pending)} сообщений свернуто)')
+                summary, pending = new_summary, []
+            else:
+                logger.warning(f'Сводка диалога {thread_id} не построена, {len(pending)} сообщений ждут следующего хода')
+
+        self._schedule(thread_id, summary, pending)
+        logger.info(
+            f'Контекст диалога {thread_id}: {len(window) - evicted} сообщений в окне (~{total} токенов), '
+            f'{evicted} свернуто, {len(pending)} ожидают сводки'
+        )
+        return {
+            'messages': [
+                *replaced.values(),
+                *(RemoveMessage(id=message.id) for message in removed),
+                new_message,
+            ],
+            'summary': summary,
+            'summary_pending': pending,
+            'messages_length': len(window) - evicted,
+        }
+
+    @staticmethod
+    def render(summary: str | None, pending: list[str], messages: list[BaseMessage]) -> list[BaseMessage]:
+        """
+        Собирает контекст диалога для промпта: сводку, несвернутые строки и окно сообщений.
+
+        Args:
+            summary (str | None): Сводка старых сообщений
+            pending (list[str]): Строки, ожидающие сворачивания
+            messages (list[BaseMessage]): Окно сообщений (без текущего вопроса)
+        """
+        context: list[BaseMessage] = []
+        parts = []
+        if summary:
+            parts.append(f'Сводка предыдущего диалога: {summary}')
+        if pending:
+            parts.append('Более ранние сообщения диалога:\n' + '\n'.join(pending))
+        if parts:
+            context.append(SystemMessage(content='\n\n'.join(parts)))
+        context.extend(message for message in messages if isinstance(message, (HumanMessage, AIMessage)))
+        return context
@@ -0,0 +1,235 @@
+import math
+import random
+from langchain_core.embeddings import Embeddings
+from pydantic import BaseModel
+from loguru import logger
+
+from ...config import config
+
+INTENT_LABELS = ('data', 'statistics', 'analytics', 'other')
+
+# Основы ключевых слов из intent_classifier_prompt (без окончаний, чтобы ловить словоформы)
+INTENT_KEYWORDS: dict[str, tuple[str, ...]] = {
+    'data': (
+        'дай данные', 'покажи', 'выведи', 'список', 'таблиц', 'поля', 'выбер', 'выбрать',
+        'получи', 'получить', 'найди', 'найти', 'показать', 'выгрузи',
+    ),
+    'statistics': (
+        'статистик', 'количеств', 'сколько', 'число', 'подсчет', 'подсчёт', 'всего', 'сумм',
+        'средн', 'минимум', 'минимальн', 'максимум', 'максимальн', 'распределени', 'процент',
+    ),
+    'analytics': (
+        'проанализ', 'анализ', 'сравни', 'сравнен', 'тенденц', 'динамик', 'закономерн',
+        'зависимост', 'корреляц', 'тренд', 'прогноз', 'факторн', 'кластер', 'сегмент',
+    ),
+    'other': (
+        'привет', 'здравствуй', 'добрый день', 'как дела', 'кто ты', 'помоги', 'что умеешь',
+        'спасибо',
+    ),
+}
+
+# Размеченные примеры для центроидов эмбеддингов
+INTENT_EXAMPLES: dict[str, tuple[str, ...]] = {
+    'data': (
+        'Покажи всех учеников 10 класса',
+        'Дай список школ с адресами',
+        'Выведи оценки Петрова по математике',
+        'Выгрузи все заказы за январь',
+        'Найди пользователей с почтой на gmail',
+    ),
+    'statistics': (
+        'Сколько учеников в каждой школе',
+        'Какой средний балл по математике',
+        'Посчитай общую сумму заказов за год',
+        'Какой процент учеников сдал экзамен',
+        'Минимальная и максимальная оценка по физике',
+    ),
+    'analytics': (
+        'Проанализируй успеваемость учеников за последние три года',
+        'Сравни результаты городских и сельских школ',
+        'Какая динамика продаж по месяцам',
+        'Есть ли зависимость между посещаемостью и оценками',
+        'Сделай прогноз количества заказов на следующий квартал',
+    ),
+    'other': (
+        'Привет',
+        'Как дела?',
+        'Кто ты и что умеешь?',
+        'Помоги мне разобраться',
+        'Спасибо за помощь',
+    ),
+}
+
+
+class IntentPrediction(BaseModel):
+    """Результат локальной классификации намерения.
+
+    Attributes:
+        intent_type(str): Наиболее вероятное намерение
+        confidence(float): Уверенность от 0 до 1
+        scores(dict[str, float]): Оценки для всех намерений
+    """
+    intent_type: str
+    confidence: float
+    scores: dict[str, float]
+
+
+class FastIntentClassifier:
+    """
+    Локальный классификатор намерений, работающий до обращения к LLM.
+
+    Комбинирует совпадения ключевых слов из intent_classifier_prompt и близость
+    эмбеддинга вопроса к центроидам размеченных примеров. Если уверенность ниже
+    порога, решение остается за LLM агентом. Часть решений быстрого пути
+    перепроверяется LLM, чтобы считать расхождения.
+
+    Attributes:
+        threshold (float): Уверенность, начиная с которой LLM не вызывается
+        sample_rate (float): Доля решений быстрого пути, перепроверяемых LLM
+        total (int): Число классифицированных сообщений
+        fast_path (int): Число сообщений, классифицированных без LLM
+        sampled (int): Число решений быстрого пути, перепроверенных LLM
+        disagreements (int): Число расхождений с LLM среди перепроверенных
+    """
+    # Чем больше, тем резче softmax по косинусной близости к центроидам
+    _SIMILARITY_SCALE = 20.0
+
+    def __init__(
+            self,
+            threshold: float = config.rag_config.INTENT_FAST_PATH_THRESHOLD,
+            sample_rate: float = config.rag_config.INTENT_SAMPLE_RATE,
+    ):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.total = 0
+        self.fast_path = 0
+        self.sampled = 0
+        self.disagreements = 0
+        self._centroids: dict[str, list[float]] | None = None
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает счетчики быстрого пути и расхождений с LLM"""
+        return {
+            'total': self.total,
+            'fast_path': self.fast_path,
+            'fast_path_ratio': self.fast_path / self.total if self.total else 0.0,
+            'sampled': self.sampled,
+            'disagreements': self.disagreements,
+            'disagreement_ratio': self.disagreements / self.sampled if self.sampled else 0.0,
+        }
+
+    @staticmethod
+    def _normalize(vector: list[float]) -> list[float]:
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    @staticmethod
+    def keyword_scores(text: str) -> dict[str, float]:
+        """
+        Считает доли совпадений ключевых слов по намерениям.
+
+        Args:
+            text: Сообщение пользователя
+
+        Returns:
+            dict[str, float]: Доли совпадений (все нули, если совпадений нет)
+        """
+        lowered = text.lower()
+        hits = {label: sum(keyword in lowered for keyword in keywords) for label, keywords in INTENT_KEYWORDS.items()}
+        total = sum(hits.values())
+        return {label: hits[label] / total if total else 0.0 for label in INTENT_LABELS}
+
+    async def _get_centroids(self, embeddings: Embeddings) -> dict[str, list[float]]:
+        """Вычисляет (один раз) центроиды эмбеддингов размеченных примеров"""
+        if self._centroids is None:
+            labels, texts = [], []
+            for label, examples in INTENT_EXAMPLES.items():
+                labels.extend([label] * len(examples))
+                texts.extend(examples)
+            vectors = [self._normalize(vector) for vector in await embeddings.aembed_documents(texts)]
+            centroids = {}
+            for label in INTENT_LABELS:
+                own = [vector for vector_label, vector in zip(labels, vectors) if vector_label == label]
+                centroids[label] = self._normalize([sum(values) / len(own) for values in zip(*own)])
+            self._centroids = centroids
+        return self._centroids
+
+    async def embedding_scores(self, text: str, embeddings: Embeddings) -> dict[str, float]:
+        """
+        Считает вероятности намерений по близости к центроидам примеров.
+
+        Args:
+            text: Сообщение пользователя
+            embeddings: Модель эмбеддингов
+
+        Returns:
+            dict[str, float]: Softmax по косинусной близости к центроидам
+        """
+        centroids = await self._get_centroids(embeddings)
+        vector = self._normalize(await embeddings.aembed_query(text))
+        similarities = {
+            label: sum(a * b for a, b in zip(vector, centroid)) for label, centroid in centroids.items()
+        }
+        exps = {label: math.exp(self._SIMILARITY_SCALE * value) for label, value in similarities.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    async def predict(self, text: str, embeddings: Embeddings | None = None) -> IntentPrediction:
+        """
+        Классифицирует сообщение без LLM.
+
+        Args:
+            text: Сообщение пользователя
+            embeddings: Модель эмбеддингов (если None, используются только ключевые слова)
+
+        Returns:
+            IntentPrediction: Намерение и уверенность
+        """
+        keyword = self.keyword_scores(text)
+        has_keywords = any(keyword.values())
+        if embeddings is not None:
+            try:
+                embedding = await self.embedding_scores(text, embeddings)
+            except Exception as e:
+                logger.warning(f'Не удалось получить эмбеддинг для классификации: {e}')
+                embedding = None
+        else:
+            embedding = None
+
+        if embedding and has_keywords:
+            scores = {label: (keyword[label] + embedding[label]) / 2 for label in INTENT_LABELS}
+        elif embedding:
+            scores = embedding
+        elif has_keywords:
+            scores = keyword
+        else:
+            scores = {label: 1 / len(INTENT_LABELS) for label in INTENT_LABELS}
+
+        intent_type = max(scores, key=scores.get)
+        return IntentPrediction(intent_type=intent_type, confidence=scores[intent_type], scores=scores)
+
+    def accept(self, prediction: IntentPrediction) -> bool:
+        """Решает, достаточно ли уверенности, чтобы не вызывать LLM, и обновляет счетчики"""
+        self.total += 1
+        if prediction.confidence >= self.threshold:
+            self.fast_path += 1
+            return True
+        return False
+
+    def should_sample(self) -> bool:
+        """Решает, нужно ли перепроверить решение быстрого пути через LLM"""
+        return random.random() < self.sample_rate
+
+    def record_comparison(self, prediction: IntentPrediction, llm_intent: str):
+        """Учитывает результат перепроверки решения быстрого пути"""
+        self.sampled += 1
+        if prediction.intent_type != llm_intent:
+            self.disagreements += 1
+            logger.info(
+                f'Быстрый классификатор ({prediction.intent_type}, {prediction.confidence:.2f}) '
+                f'разошелся с LLM ({llm_intent})'
+            )
+
+
+intent_classifier = FastIntentClassifier()
@@ -170,4 +170,16 @@ analytic_prompt = """
     - Используй понятные неспециалисту формулировки
     - Выделяй самую важную информацию
     - Предлагай конкретные действия на основе анализа
-"""
\ No newline at end of file
+"""
+summary_prompt = """
+Ты ведешь краткую сводку диалога пользователя с системой анализа базы данных.
+Тебе дают текущую сводку и новые сообщения, выпавшие из окна контекста.
+Обнови сводку так, чтобы она включала новые сообщения.
+
+Правила:
+    - Сохраняй факты, нужные для следующих вопросов: какие таблицы, поля, периоды,
+      фильтры и показатели обсуждались, ключевые цифры из ответов
+    - Не пересказывай SQL запросы и таблицы целиком, достаточно их смысла
+    - Пиши кратко, в третьем лице, без вступлений
+    - Ответ - только текст обновленной сводки
+"""
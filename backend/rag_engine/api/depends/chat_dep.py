@@ -0,0 +1,8 @@
+from fastapi import Request
+
+from ....database.session import SandboxSessionManager
+
+
+def get_sandbox_manager(request: Request) -> SandboxSessionManager:
+    '''Возвращает sandbox_manager'''
+    return request.app.state.sandbox_manager
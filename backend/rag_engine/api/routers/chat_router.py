@@ -0,0 +1,170 @@
+from contextlib import aclosing
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Annotated
+import json
+from loguru import logger
+
+from ....auth.dependencies import get_current_user
+from ....auth.models import User
+from ....database.session import DatabaseSessionManager, SandboxSessionManager
+from ...agent.intent_classifier import intent_classifier
+from ...graph.graph import ai_graph
+from ...llm.cache import llm_cache
+from ...llm.gateway import llm_gateway, LlmGatewayRejected
+from ...llm.hosts import host_pool
+from ...qdrant.manager import VectorStoreManager
+from ...sql.validator import sql_validator
+from ..schemes.chat_schemes import ChatRequestScheme, ChatResponseScheme
+from ..depends.vector_dep import get_vector_manager, get_db_manager
+from ..depends.chat_dep import get_sandbox_manager
+
+chat_router = APIRouter(prefix="/chat", tags=["chat"])
+
+
+def _thread_id(user: User, session_id: str) -> str:
+    """ID диалога в графе: диалоги разных пользователей не пересекаются"""
+    return f'{user.id}:{session_id}'
+
+
+def _rejected(e: LlmGatewayRejected) -> HTTPException:
+    """Переводит отказ шлюза LLM в ответ 429/503 с заголовком Retry-After"""
+    headers = {'Retry-After': str(e.retry_after)} if e.retry_after else None
+    return HTTPException(status_code=e.status_code, detail=f'Сервис перегружен: {e}', headers=headers)
+
+
+def _admit():
+    """Отклоняет ход диалога до начала работы, если шлюз LLM не примет его в срок"""
+    try:
+        llm_gateway.check('interactive')
+    except LlmGatewayRejected as e:
+        raise _rejected(e) from e
+
+
+def _sse(event: str, data: dict) -> str:
+    """Форматирует событие Server-Sent Events"""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n'
+
+
+@chat_router.post('', summary='Сообщение в диалог', response_model=ChatResponseScheme)
+async def chat(
+        chat_request: ChatRequestScheme,
+        user: Annotated[User, Depends(get_current_user)],
+        db_manager: DatabaseSessionManager = Depends(get_db_manager),
+        sandbox_manager: SandboxSessionManager = Depends(get_sandbox_manager),
+        vector_manager: VectorStoreManager = Depends(get_vector_manager),
+):
+    """
+    Выполняет ход диалога и возвращает итоговый ответ.
+
+    Args:
+        chat_request (ChatRequestScheme): Сообщение и ID диалога
+        user (User): Авторизованный пользователь
+
+    Returns:
+        ChatResponseScheme: Ответ на сообщение
+
+    Raises:
+        HTTPException(429): Если очередь запросов к LLM заполнена
+        HTTPException(503): Если запрос к LLM не дождется слота в срок
+    """
+    _admit()
+    try:
+        async with db_manager.session() as db_session:
+            answer = await ai_graph.call(
+                input=chat_request.message,
+                id_session=_thread_id(user, chat_request.session_id),
+                db_session=db_session,
+                vector_manager=vector_manager,
+                sandbox_manager=sandbox_manager,
+            )
+    except LlmGatewayRejected as e:
+        raise _rejected(e) from e
+    return ChatResponseScheme(answer=answer)
+
+
+@chat_router.post('/stream', summary='Сообщение в диалог с потоковым ответом')
+async def chat_stream(
+        chat_request: ChatRequestScheme,
+        request: Request,
+        user: Annotated[User, Depends(get_current_user)],
+        db_manager: DatabaseSessionManager = Depends(get_db_manager),
+        sandbox_manager: SandboxSessionManager = Depends(get_sandbox_manager),
+        vector_manager: VectorStoreManager = Depends(get_vector_manager),
+):
+    """
+    Выполняет ход диалога, отдавая прогресс и ответ потоком Server-Sent Events.
+
+    События: node (начало и завершение узла графа), token (фрагмент ответа LLM),
+    answer (итоговый ответ), error (ошибка хода). Сессия БД открывается на время
+    потока. Если шлюз LLM отклонил запрос уже во время потока, приходит error
+    с кодом 429 или 503. При отключении клиента выполнение графа и текущая генерация
+    в Ollama отменяются.
+
+    Args:
+        chat_request (ChatRequestScheme): Сообщение и ID диалога
+        request (Request): Запрос (для проверки отключения клиента)
+        user (User): Авторизованный пользователь
+
+    Returns:
+        StreamingResponse: Поток text/event-stream
+
+    Raises:
+        HTTPException(429): Если очередь запросов к LLM заполнена
+        HTTPException(503): Если запрос к LLM не дождется слота в срок
+    """
+    _admit()
+    thread_id = _thread_id(user, chat_request.session_id)
+
+    async def generate():
+        try:
+            async with db_manager.session() as db_session:
+                events = ai_graph.stream(
+                    input=chat_request.message,
+                    id_session=thread_id,
+                    db_session=db_session,
+                    vector_manager=vector_manager,
+                    sandbox_manager=sandbox_manager,
+                )
+                # aclosing: выход из цикла сразу закрывает генератор и отменяет граф
+                async with aclosing(events):
+                    async for event, data in events:
+                        if await request.is_disconnected():
+                            logger.info(f'Клиент диалога {thread_id} отключился, генерация отменена')
+                            return
+                        yield _sse(event, data)
+        except LlmGatewayRejected as e:
+            yield _sse('error', {'status_code': e.status_code, 'detail': f'Сервис перегружен: {e}',
+                                 'retry_after': e.retry_after})
+        except Exception as e:
+            logger.error(f'Ошибка хода диалога {thread_id}: {e}')
+            yield _sse('error', {'detail': 'Ошибка при формировании ответа'})
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@chat_router.get('/stats', summary='Метрики шлюза LLM, хостов модели, кэша ответов, песочницы и проверки SQL, классификатора намерений')
+async def get_llm_stats(
+        user: Annotated[User, Depends(get_current_user)],
+        sandbox_manager: SandboxSessionManager = Depends(get_sandbox_manager),
+) -> dict:
+    """
+    Возвращает текущее состояние шлюза LLM (занятые слоты, глубину очередей,
+    время ожидания и число отказов по классам запросов) и хостов модели
+    (нагрузку, ошибки, исключения), а также долю попаданий в кэш ответов агентов
+    и сэкономленное им время, загрузку песочницы SQL и ожидание в ее очереди,
+    долю намерений, определенных без LLM, и расхождения с LLM на выборке,
+    а также отклоненные до выполнения запросы SQL и сэкономленную ими работу.
+    """
+    return {
+        'gateway': llm_gateway.stats,
+        'hosts': host_pool.stats,
+        'cache': llm_cache.stats,
+        'sandbox': sandbox_manager.stats,
+        'intent': intent_classifier.stats,
+        'sql_validator': sql_validator.stats,
+    }
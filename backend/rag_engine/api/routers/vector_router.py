@@ -1,22 +1,70 @@
 from fastapi import APIRouter, Query, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from typing import Optional
+import json
 from loguru import logger
 
 from ....database.session import DatabaseSessionManager
 from ...qdrant.manager import VectorStoreManager
 from ...qdrant.script import ScriptVector
-from ..schemes.vector_schemes import VectorDbScheme, FieldsDescScheme, PointUpdateScheme
+from ..schemes.vector_schemes import VectorDbScheme, FieldsDescScheme, PointUpdateScheme, PointsPageScheme
+from ....config import config
 from ..depends.vector_dep import get_vector_manager, get_db_manager, get_fields_description
 
 vector_router = APIRouter(prefix="/vector", tags=["vector"])
 
 
-@vector_router.get('/points', summary='Получение точек из всех коллекций')
+@vector_router.get('/points', summary='Получение точек из коллекций', response_model=PointsPageScheme)
 async def get_points(
+        collection: Optional[str] = Query(None, description='Коллекция (по умолчанию все коллекции)'),
+        cursor: Optional[str] = Query(None, description='Курсор следующей страницы из предыдущего ответа'),
+        limit: int = Query(100, ge=1, le=1000, description='Размер страницы'),
+        fields: Optional[list[str]] = Query(None, description='Поля metadata, которые нужно вернуть'),
+        stream: bool = Query(False, description='Вернуть все точки потоком в формате NDJSON'),
         vector_manager: VectorStoreManager = Depends(get_vector_manager),
 ):
-    points = await ScriptVector.get_all_points(vector_manager=vector_manager)
-    return points
+    """
+    Возвращает точки векторной базы постранично.
+
+    Постраничный режим отдает не больше limit точек и курсор next_cursor,
+    который нужно передать в следующий запрос. Потоковый режим (stream=true)
+    обходит все точки начиная с cursor и отдает их по одной в строке NDJSON,
+    удерживая в памяти сервера не больше одной страницы.
+
+    Args:
+        collection (str | None): Коллекция для обхода
+        cursor (str | None): Курсор, выданный предыдущим ответом
+        limit (int): Размер страницы (в потоковом режиме - размер запроса к Qdrant)
+        fields (list[str] | None): Поля metadata для проекции
+        stream (bool): Включает потоковый режим
+        vector_manager (VectorStoreManager): Менеджер векторных хранилищ
+
+    Returns:
+        PointsPageScheme | StreamingResponse: Страница точек или поток NDJSON
+
+    Raises:
+        HTTPException(400): Если курсор поврежден или коллекция неизвестна
+    """
+    try:
+        if collection and collection not in config.rag_config.LIST_COLLECTION:
+            raise ValueError(f'Неизвестная коллекция: {collection}')
+        if cursor:
+            ScriptVector.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if stream:
+        async def generate():
+            async for point in ScriptVector.iter_points(vector_manager, collection, cursor, limit, fields):
+                yield json.dumps(point, default=str, ensure_ascii=False) + '\n'
+
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+    try:
+        points, next_cursor = await ScriptVector.get_points_page(vector_manager, collection, cursor, limit, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return PointsPageScheme(points=points, next_cursor=next_cursor)
 
 
 @vector_router.get("/schema", summary='Получение схемы базы данных')
@@ -26,6 +74,9 @@ async def get_db_schema(
     """
     Возвращает схему базы данных: список таблиц и их колонок.
 
+    Схема читается из pg_catalog и отдается из кэша, пока отпечаток каталога
+    не изменится.
+
     Returns:
         dict: Словарь, где ключ - имя таблицы, значение - список названий колонок
 
@@ -82,6 +133,8 @@ async def add_vdb(
         dict: Словарь с результатом операции:
             - success (bool): True если операция успешна
             - message (str): Сообщение о результате операции
+            - report (dict[str, list[str]]): Таблицы, которые были добавлены (added),
+              обновлены (updated), пропущены без изменений (skipped) или не описаны (failed)
 
     Raises:
         HTTPException: Исключение с кодом 404 возникает в случае ошибки при добавлении
@@ -93,23 +146,17 @@ async def add_vdb(
         vector_store_manager=vector_manager
     )
     try:
-        if flag:
-            logger.info('Добавление векторного представления в бд')
-            await script.add_data_to_vdb(
-                collection_name=vector_database.vector_database,
-                vector_manager=vector_manager,
-                fields_description=fields_description)
-            return {'success': True, 'message': 'Представления загружены в бд'}
-        else:
-            logger.info('Добавление векторного представления в бд')
-            await script.add_data_to_vdb(
-                collection_name=vector_database.vector_database,
-                vector_manager=vector_manager,
-                fields_description=fields_description)
-            return {'success': True, 'message': 'Представления загружены в бд'}
+        logger.info('Добавление векторного представления в бд')
+        report = await script.add_data_to_vdb(
+            collection_name=vector_database.vector_database,
+            vector_manager=vector_manager,
+            fields_description=fields_description)
     except Exception as e:
         logger.error(f'Ошибка загрузки представлений {e}')
         raise HTTPException(status_code=404, detail=f'Ошибка загрузки представлений {e}')
+    if isinstance(report, str):
+        raise HTTPException(status_code=404, detail=f'Ошибка загрузки представлений {report}')
+    return {'success': True, 'message': 'Представления загружены в бд', 'report': report}
 
 @vector_router.put('/update_point', summary='Обновление точки')
 async def update_vdb(
@@ -142,17 +189,16 @@ async def update_vdb(
 
        Notes
        -----
-       Функция асинхронно выполняет добавление текста в векторное хранилище.
+       Функция асинхронно выполняет upsert точки через асинхронный клиент Qdrant.
        Текст для векторизации формируется из названия таблицы и значения.
        Метаданные сохраняются вместе с вектором для последующего поиска.
     """
     try:
-        logger.info('Получение vector_store')
-        vector_store = vector_manager.get_vector_store(collection_name.vector_database)
         text = f'Название таблицы: {point.table_name} Значения и описания: {point.value}'
         logger.info('Обновление точки')
-        await vector_store.aadd_texts(
-            ids=[point.id],
+        await vector_manager.upsert_texts(
+            collection_name=collection_name.vector_database,
+            ids=[str(point.id)],
             texts=[text],
             metadatas=[{
                 'table_name': point.table_name,
@@ -196,6 +242,13 @@ async def search_vdb(
     Функция использует семантический поиск (similarity search) для нахождения
     наиболее релевантных результатов по заданному текстовому запросу.
     """
-    vector_store = vector_manager.get_vector_store(vector_database.vector_database)
-    results = vector_store.similarity_search(query)
+    results = await vector_manager.similarity_search(vector_database.vector_database, query)
     return {'message': 'ok', 'results': results}
+
+
+@vector_router.get('/embeddings/stats', summary='Статистика кэша эмбеддингов')
+async def embeddings_stats(
+        vector_manager: VectorStoreManager = Depends(get_vector_manager),
+) -> dict:
+    """Возвращает счетчики попаданий и промахов кэша эмбеддингов"""
+    return getattr(vector_manager.embeddings, 'stats', {})
@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+
+
+class ChatRequestScheme(BaseModel):
+    message: str = Field(..., min_length=1, description='Сообщение пользователя')
+    session_id: str = Field(..., min_length=1, max_length=128, description='ID диалога на стороне клиента')
+
+
+class ChatResponseScheme(BaseModel):
+    answer: str = Field(..., description='Ответ на сообщение')
@@ -35,6 +35,17 @@ class PointResponseSchema(BaseModel):
         )
 
 
+class PointScheme(BaseModel):
+    id: uuid.UUID | int = Field(..., description='ID точки')
+    collection: str = Field(..., description='Коллекция точки')
+    metadata: dict = Field(..., description='Метаданные точки (с учетом проекции полей)')
+
+
+class PointsPageScheme(BaseModel):
+    points: list[PointScheme] = Field(..., description='Точки страницы')
+    next_cursor: str | None = Field(None, description='Курсор следующей страницы (None, если точек больше нет)')
+
+
 class PointUpdateScheme(BaseModel):
     id: uuid.UUID = Field(..., description='ID точки')
     table_name: str = Field(
@@ -0,0 +1,85 @@
+import asyncio
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from loguru import logger
+
+from .memory import BoundedMemorySaver
+from .postgres import PostgresSaver
+from ...config import config
+from ...database.session import session_manager
+
+CHECKPOINTER_BACKENDS = ('memory', 'postgres')
+
+
+def create_checkpointer(backend: str = config.rag_config.CHECKPOINTER_BACKEND) -> BoundedMemorySaver | PostgresSaver:
+    """
+    Создает хранилище чекпоинтов графа.
+
+    Args:
+        backend (str, optional): memory - в памяти процесса, postgres - в основной БД
+            (общее для всех воркеров). Defaults to config.rag_config.CHECKPOINTER_BACKEND.
+
+    Returns:
+        BoundedMemorySaver | PostgresSaver: Хранилище чекпоинтов
+    """
+    if backend == 'memory':
+        return BoundedMemorySaver()
+    if backend == 'postgres':
+        return PostgresSaver(session_manager)
+    raise ValueError(f'Неизвестное хранилище чекпоинтов: {backend}. Доступны: {CHECKPOINTER_BACKENDS}')
+
+
+class CheckpointCompactor:
+    """
+    Фоновая задача, периодически сжимающая хранилище чекпоинтов.
+
+    Attributes:
+        checkpointer (BaseCheckpointSaver): Хранилище с методом acompact
+        interval (float): Интервал между сжатиями в секундах
+        removed (int): Всего удалено чекпоинтов
+
+    Args:
+        checkpointer (BaseCheckpointSaver): Хранилище чекпоинтов
+        interval (float, optional): Интервал. Defaults to config.rag_config.CHECKPOINT_COMPACT_INTERVAL.
+    """
+    def __init__(
+            self,
+            checkpointer: BaseCheckpointSaver,
+            interval: float = config.rag_config.CHECKPOINT_COMPACT_INTERVAL,
+    ):
+        self.checkpointer = checkpointer
+        self.interval = interval
+        self.removed = 0
+        self._task: asyncio.Task | None = None
+
+    async def compact(self) -> int:
+        """Выполняет одно сжатие, ошибки логируются и не прерывают фоновую задачу"""
+        try:
+            removed = await self.checkpointer.acompact()
+        except Exception as e:
+            logger.error(f'Ошибка сжатия чекпоинтов: {e}')
+            return 0
+        self.removed += removed
+        if removed:
+            logger.info(f'Сжатие чекпоинтов: удалено {removed}')
+        return removed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.compact()
+
+    def start(self):
+        """Запускает фоновую задачу (в работающем event loop)"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name='checkpoint-compactor')
+
+    async def stop(self):
+        """Останавливает фоновую задачу"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,339 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    WRITES_IDX_MAP,
+    get_checkpoint_id,
+)
+from loguru import logger
+
+from ...config import config
+
+# (тип, байты) - результат serde.dumps_typed
+Typed = tuple[str, bytes]
+
+
+class _Thread:
+    """
+    Чекпоинты одного диалога.
+
+    Attributes:
+        checkpoints (dict): checkpoint_ns -> checkpoint_id -> (чекпоинт, метаданные, ID родителя)
+        writes (dict): (checkpoint_ns, checkpoint_id) -> (task_id, idx) -> (task_id, канал, значение, task_path)
+        touched (float): Время последнего обращения (time.monotonic)
+    """
+    def __init__(self):
+        self.checkpoints: dict[str, OrderedDict[str, tuple[Typed, Typed, str | None]]] = {}
+        self.writes: dict[tuple[str, str], dict[tuple[str, int], tuple[str, str, Typed, str]]] = {}
+        self.touched = time.monotonic()
+
+    def size_bytes(self) -> int:
+        size = sum(
+            len(checkpoint[1]) + len(metadata[1])
+            for namespace in self.checkpoints.values()
+            for checkpoint, metadata, _ in namespace.values()
+        )
+        size += sum(len(value[1]) for writes in self.writes.values() for _, _, value, _ in writes.values())
+        return size
+
+    def drop(self, checkpoint_ns: str, checkpoint_id: str):
+        self.checkpoints[checkpoint_ns].pop(checkpoint_id, None)
+        self.writes.pop((checkpoint_ns, checkpoint_id), None)
+
+
+class BoundedMemorySaver(BaseCheckpointSaver):
+    """
+    Хранилище чекпоинтов графа в памяти процесса с ограничениями.
+
+    В отличие от InMemorySaver память ограничена:
+        - число диалогов: при переполнении вытесняются давно не использованные (LRU);
+        - время жизни: диалоги без обращений дольше TTL удаляются при сжатии;
+        - размер диалога: хранятся только последние чекпоинты, их число и суммарный
+          размер ограничены; последний чекпоинт каждого пространства имен хранится всегда.
+
+    Чекпоинты не переживают перезапуск и не видны другим воркерам - для этого
+    есть PostgresSaver.
+
+    Attributes:
+        max_threads (int): Максимальное число диалогов
+        ttl (float): Время жизни неактивного диалога в секундах
+        max_per_thread (int): Число хранимых чекпоинтов на пространство имен диалога
+        max_thread_bytes (int): Максимальный размер чекпоинтов диалога в байтах
+        evicted (int): Число вытесненных диалогов
+
+    Args:
+        max_threads (int, optional): Число диалогов. Defaults to config.rag_config.CHECKPOINT_MAX_THREADS.
+        ttl (float, optional): Время жизни диалога. Defaults to config.rag_config.CHECKPOINT_TTL.
+        max_per_thread (int, optional): Число чекпоинтов. Defaults to config.rag_config.CHECKPOINT_MAX_PER_THREAD.
+        max_thread_bytes (int, optional): Размер диалога. Defaults to config.rag_config.CHECKPOINT_MAX_THREAD_BYTES.
+        serde (optional): Сериализатор. Defaults to None (JsonPlusSerializer).
+    """
+    def __init__(
+            self,
+            max_threads: int = config.rag_config.CHECKPOINT_MAX_THREADS,
+            ttl: float = config.rag_config.CHECKPOINT_TTL,
+            max_per_thread: int = config.rag_config.CHECKPOINT_MAX_PER_THREAD,
+            max_thread_bytes: int = config.rag_config.CHECKPOINT_MAX_THREAD_BYTES,
+            serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self.max_per_thread = max_per_thread
+        self.max_thread_bytes = max_thread_bytes
+        self.evicted = 0
+        self._threads: OrderedDict[str, _Thread] = OrderedDict()
+        # Синхронные методы могут вызываться из потоков
+        self._lock = threading.RLock()
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает число диалогов, чекпоинтов и их размер"""
+        with self._lock:
+            return {
+                'threads': len(self._threads),
+                'checkpoints': sum(
+                    len(namespace) for thread in self._threads.values() for namespace in thread.checkpoints.values()
+                ),
+                'bytes': sum(thread.size_bytes() for thread in self._threads.values()),
+                'evicted': self.evicted,
+            }
+
+    def _expired(self, thread: _Thread) -> bool:
+        return time.monotonic() - thread.touched > self.ttl
+
+    def _get_thread(self, thread_id: str, create: bool = False) -> _Thread | None:
+        thread = self._threads.get(thread_id)
+        if thread is not None and self._expired(thread):
+            del self._threads[thread_id]
+            thread = None
+        if thread is None:
+            if not create:
+                return None
+            thread = self._threads[thread_id] = _Thread()
+            while len(self._threads) > self.max_threads:
+                evicted_id, _ = self._threads.popitem(last=False)
+                self.evicted += 1
+                logger.debug(f'Диалог {evicted_id} вытеснен из памяти чекпоинтов')
+        thread.touched = time.monotonic()
+        self._threads.move_to_end(thread_id)
+        return thread
+
+    def _trim(self, thread: _Thread) -> int:
+        """Удаляет старые чекпоинты диалога сверх ограничений числа и размера, возвращает число удаленных"""
+        removed = 0
+        keep = max(self.max_per_thread, 1)
+        for checkpoint_ns, namespace in thread.checkpoints.items():
+            for checkpoint_id in sorted(namespace)[:-keep]:
+                thread.drop(checkpoint_ns, checkpoint_id)
+                removed += 1
+        size = thread.size_bytes()
+        if size <= self.max_thread_bytes:
+            return removed
+        # Самые старые чекпоинты всех пространств имен, кроме последнего в каждом
+        candidates = sorted(
+            (checkpoint_id, checkpoint_ns)
+            for checkpoint_ns, namespace in thread.checkpoints.items()
+            for checkpoint_id in sorted(namespace)[:-1]
+        )
+        for checkpoint_id, checkpoint_ns in candidates:
+            if size <= self.max_thread_bytes:
+                break
+            thread.drop(checkpoint_ns, checkpoint_id)
+            removed += 1
+            size = thread.size_bytes()
+        return removed
+
+    def _tuple(
+            self,
+            thread_id: str,
+            checkpoint_ns: str,
+            checkpoint_id: str,
+            thread: _Thread,
+    ) -> CheckpointTuple:
+        checkpoint, metadata, parent_id = thread.checkpoints[checkpoint_ns][checkpoint_id]
+        writes = thread.writes.get((checkpoint_ns, checkpoint_id), {})
+        return CheckpointTuple(
+            config={
+                'configurable': {
+                    'thread_id': thread_id,
+                    'checkpoint_ns': checkpoint_ns,
+                    'checkpoint_id': checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed(checkpoint),
+            metadata=self.serde.loads_typed(metadata),
+            parent_config={
+                'configurable': {
+                    'thread_id': thread_id,
+                    'checkpoint_ns': checkpoint_ns,
+                    'checkpoint_id': parent_id,
+                }
+            } if parent_id else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value))
+                for task_id, channel, value, _ in writes.values()
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        with self._lock:
+            thread = self._get_thread(thread_id)
+            if thread is None or not thread.checkpoints.get(checkpoint_ns):
+                return None
+            namespace = thread.checkpoints[checkpoint_ns]
+            checkpoint_id = get_checkpoint_id(config) or max(namespace)
+            if checkpoint_id not in namespace:
+                return None
+            return self._tuple(thread_id, checkpoint_ns, checkpoint_id, thread)
+
+    def list(
+            self,
+            config: RunnableConfig | None,
+            *,
+            filter: dict[str, Any] | None = None,
+            before: RunnableConfig | None = None,
+            limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            if config is not None:
+                thread_ids = [config['configurable']['thread_id']]
+            else:
+                thread_ids = list(self._threads)
+            config_ns = config['configurable'].get('checkpoint_ns') if config is not None else None
+            config_id = get_checkpoint_id(config) if config is not None else None
+            before_id = get_checkpoint_id(before) if before is not None else None
+
+            result = []
+            for thread_id in thread_ids:
+                thread = self._get_thread(thread_id)
+                if thread is None:
+                    continue
+                for checkpoint_ns, namespace in thread.checkpoints.items():
+                    if config_ns is not None and checkpoint_ns != config_ns:
+                        continue
+                    for checkpoint_id in sorted(namespace, reverse=True):
+                        if config_id and checkpoint_id != config_id:
+                            continue
+                        if before_id and checkpoint_id >= before_id:
+                            continue
+                        item = self._tuple(thread_id, checkpoint_ns, checkpoint_id, thread)
+                        if filter and not all(item.metadata.get(key) == value for key, value in filter.items()):
+                            continue
+                        result.append(item)
+                        if limit is not None and len(result) >= limit:
+                            return iter(result)
+            return iter(result)
+
+    def put(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        with self._lock:
+            thread = self._get_thread(thread_id, create=True)
+            thread.checkpoints.setdefault(checkpoint_ns, OrderedDict())[checkpoint['id']] = (
+                self.serde.dumps_typed(checkpoint),
+                self.serde.dumps_typed(metadata),
+                config['configurable'].get('checkpoint_id'),
+            )
+            self._trim(thread)
+        return {
+            'configurable': {
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                'checkpoint_id': checkpoint['id'],
+            }
+        }
+
+    def put_writes(
+            self,
+            config: RunnableConfig,
+            writes: Sequence[tuple[str, Any]],
+            task_id: str,
+            task_path: str = '',
+    ) -> None:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_id = config['configurable']['checkpoint_id']
+        with self._lock:
+            thread = self._get_thread(thread_id, create=True)
+            stored = thread.writes.setdefault((checkpoint_ns, checkpoint_id), {})
+            for idx, (channel, value) in enumerate(writes):
+                key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+                # Обычные записи задачи не перезаписываются, специальные (ошибки, прерывания) - перезаписываются
+                if key[1] >= 0 and key in stored:
+                    continue
+                stored[key] = (task_id, channel, self.serde.dumps_typed(value), task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+    def compact(self) -> int:
+        """
+        Удаляет диалоги с истекшим TTL и старые чекпоинты сверх ограничений.
+
+        Returns:
+            int: Число удаленных чекпоинтов
+        """
+        removed = 0
+        with self._lock:
+            for thread_id, thread in list(self._threads.items()):
+                if self._expired(thread):
+                    removed += sum(len(namespace) for namespace in thread.checkpoints.values())
+                    del self._threads[thread_id]
+                else:
+                    removed += self._trim(thread)
+        return removed
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return self.get_tuple(config)
+
+    async def alist(
+            self,
+            config: RunnableConfig | None,
+            *,
+            filter: dict[str, Any] | None = None,
+            before: RunnableConfig | None = None,
+            limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+            self,
+            config: RunnableConfig,
+            writes: Sequence[tuple[str, Any]],
+            task_id: str,
+            task_path: str = '',
+    ) -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    async def acompact(self) -> int:
+        return self.compact()
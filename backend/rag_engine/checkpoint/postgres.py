@@ -0,0 +1,291 @@
+import time
+from typing import Any, AsyncIterator, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    WRITES_IDX_MAP,
+    get_checkpoint_id,
+)
+from sqlalchemy import select, delete, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from ..models import GraphCheckpoint, GraphCheckpointWrite
+from ...config import config
+from ...database.session import DatabaseSessionManager
+
+_CHECKPOINTS = GraphCheckpoint.__tablename__
+_WRITES = GraphCheckpointWrite.__tablename__
+
+# Удаляет чекпоинты диалогов с истекшим TTL и старые чекпоинты сверх ограничений
+# числа и размера; последний чекпоинт каждого пространства имен сохраняется
+_COMPACT_CHECKPOINTS = text(f"""
+    WITH ranked AS (
+        SELECT
+            id,
+            row_number() OVER newest AS position,
+            sum(size_bytes) OVER (PARTITION BY thread_id ORDER BY checkpoint_id DESC) AS thread_bytes,
+            max(created_at) OVER (PARTITION BY thread_id) AS last_created_at
+        FROM {_CHECKPOINTS}
+        WINDOW newest AS (PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC)
+    )
+    DELETE FROM {_CHECKPOINTS} AS checkpoints
+    USING ranked
+    WHERE checkpoints.id = ranked.id
+      AND (
+        ranked.last_created_at < now() - make_interval(secs => :ttl)
+        OR (ranked.position > 1 AND (ranked.position > :max_per_thread OR ranked.thread_bytes > :max_thread_bytes))
+      )
+""")
+
+_COMPACT_WRITES = text(f"""
+    DELETE FROM {_WRITES} AS writes
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {_CHECKPOINTS} AS checkpoints
+        WHERE checkpoints.thread_id = writes.thread_id
+          AND checkpoints.checkpoint_ns = writes.checkpoint_ns
+          AND checkpoints.checkpoint_id = writes.checkpoint_id
+    )
+""")
+
+
+class PostgresSaver(BaseCheckpointSaver):
+    """
+    Хранилище чекпоинтов графа в PostgreSQL на общем асинхронном движке приложения.
+
+    Чекпоинты переживают перезапуск и доступны всем воркерам uvicorn. Хранятся
+    только асинхронные методы: граф вызывается через ainvoke/astream.
+
+    Размер хранилища ограничивается фоновым сжатием (compact): удаляются
+    диалоги без новых чекпоинтов дольше TTL и старые чекпоинты диалога сверх
+    ограничений числа и суммарного размера.
+
+    Attributes:
+        session_manager (DatabaseSessionManager): Менеджер сессий основной БД
+        ttl (float): Время жизни неактивного диалога в секундах
+        max_per_thread (int): Число хранимых чекпоинтов на пространство имен диалога
+        max_thread_bytes (int): Максимальный размер чекпоинтов диалога в байтах
+
+    Args:
+        session_manager (DatabaseSessionManager): Менеджер сессий (движок создается при старте приложения)
+        ttl (float, optional): Время жизни диалога. Defaults to config.rag_config.CHECKPOINT_TTL.
+        max_per_thread (int, optional): Число чекпоинтов. Defaults to config.rag_config.CHECKPOINT_MAX_PER_THREAD.
+        max_thread_bytes (int, optional): Размер диалога. Defaults to config.rag_config.CHECKPOINT_MAX_THREAD_BYTES.
+        serde (optional): Сериализатор. Defaults to None (JsonPlusSerializer).
+    """
+    def __init__(
+            self,
+            session_manager: DatabaseSessionManager,
+            ttl: float = config.rag_config.CHECKPOINT_TTL,
+            max_per_thread: int = config.rag_config.CHECKPOINT_MAX_PER_THREAD,
+            max_thread_bytes: int = config.rag_config.CHECKPOINT_MAX_THREAD_BYTES,
+            serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.session_manager = session_manager
+        self.ttl = ttl
+        self.max_per_thread = max_per_thread
+        self.max_thread_bytes = max_thread_bytes
+
+    def _session(self) -> AsyncSession:
+        if self.session_manager.session_factory is None:
+            raise RuntimeError('Менеджер сессий БД не инициализирован')
+        # Без логирующей обертки session(): чекпоинт пишется после каждого узла графа
+        return self.session_manager.session_factory()
+
+    async def _tuple(self, session: AsyncSession, row: GraphCheckpoint) -> CheckpointTuple:
+        writes = await session.scalars(
+            select(GraphCheckpointWrite)
+            .where(
+                GraphCheckpointWrite.thread_id == row.thread_id,
+                GraphCheckpointWrite.checkpoint_ns == row.checkpoint_ns,
+                GraphCheckpointWrite.checkpoint_id == row.checkpoint_id,
+            )
+            .order_by(GraphCheckpointWrite.task_id, GraphCheckpointWrite.idx)
+        )
+        return CheckpointTuple(
+            config={
+                'configurable': {
+                    'thread_id': row.thread_id,
+                    'checkpoint_ns': row.checkpoint_ns,
+                    'checkpoint_id': row.checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((row.checkpoint_type, row.checkpoint)),
+            metadata=self.serde.loads_typed((row.metadata_type, row.checkpoint_metadata)),
+            parent_config={
+                'configurable': {
+                    'thread_id': row.thread_id,
+                    'checkpoint_ns': row.checkpoint_ns,
+                    'checkpoint_id': row.parent_checkpoint_id,
+                }
+            } if row.parent_checkpoint_id else None,
+            pending_writes=[
+                (write.task_id, write.channel, self.serde.loads_typed((write.value_type, write.value)))
+                for write in writes
+            ],
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        configurable = config['configurable']
+        statement = select(GraphCheckpoint).where(
+            GraphCheckpoint.thread_id == configurable['thread_id'],
+            GraphCheckpoint.checkpoint_ns == configurable.get('checkpoint_ns', ''),
+        )
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            statement = statement.where(GraphCheckpoint.checkpoint_id == checkpoint_id)
+        else:
+            statement = statement.order_by(GraphCheckpoint.checkpoint_id.desc()).limit(1)
+        async with self._session() as session:
+            row = await session.scalar(statement)
+            if row is None:
+                return None
+            return await self._tuple(session, row)
+
+    async def alist(
+            self,
+            config: RunnableConfig | None,
+            *,
+            filter: dict[str, Any] | None = None,
+            before: RunnableConfig | None = None,
+            limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        statement = select(GraphCheckpoint).order_by(GraphCheckpoint.checkpoint_id.desc())
+        if config is not None:
+            configurable = config['configurable']
+            statement = statement.where(GraphCheckpoint.thread_id == configurable['thread_id'])
+            if configurable.get('checkpoint_ns') is not None:
+                statement = statement.where(GraphCheckpoint.checkpoint_ns == configurable['checkpoint_ns'])
+            if get_checkpoint_id(config):
+                statement = statement.where(GraphCheckpoint.checkpoint_id == get_checkpoint_id(config))
+        if before is not None and get_checkpoint_id(before):
+            statement = statement.where(GraphCheckpoint.checkpoint_id < get_checkpoint_id(before))
+        # Метаданные сериализованы, поэтому фильтр применяется после загрузки
+        if limit is not None and not filter:
+            statement = statement.limit(limit)
+
+        async with self._session() as session:
+            rows = await session.scalars(statement)
+            returned = 0
+            for row in rows.all():
+                item = await self._tuple(session, row)
+                if filter and not all(item.metadata.get(key) == value for key, value in filter.items()):
+                    continue
+                yield item
+                returned += 1
+                if limit is not None and returned >= limit:
+                    return
+
+    async def aput(
+            self,
+            config: RunnableConfig,
+            checkpoint: Checkpoint,
+            metadata: CheckpointMetadata,
+            new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config['configurable']
+        thread_id = configurable['thread_id']
+        checkpoint_ns = configurable.get('checkpoint_ns', '')
+        checkpoint_type, checkpoint_bytes = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_bytes = self.serde.dumps_typed(metadata)
+        values = {
+            'parent_checkpoint_id': configurable.get('checkpoint_id'),
+            'checkpoint_type': checkpoint_type,
+            'checkpoint': checkpoint_bytes,
+            'metadata_type': metadata_type,
+            'checkpoint_metadata': metadata_bytes,
+            'size_bytes': len(checkpoint_bytes) + len(metadata_bytes),
+        }
+        statement = insert(GraphCheckpoint).values(
+            thread_id=thread_id,
+            checkpoint_ns=checkpoint_ns,
+            checkpoint_id=checkpoint['id'],
+            **values,
+        ).on_conflict_do_update(
+            index_elements=['thread_id', 'checkpoint_ns', 'checkpoint_id'],
+            set_=values,
+        )
+        async with self._session() as session, session.begin():
+            await session.execute(statement)
+        return {
+            'configurable': {
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                'checkpoint_id': checkpoint['id'],
+            }
+        }
+
+    async def aput_writes(
+            self,
+            config: RunnableConfig,
+            writes: Sequence[tuple[str, Any]],
+            task_id: str,
+            task_path: str = '',
+    ) -> None:
+        if not writes:
+            return
+        configurable = config['configurable']
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_bytes = self.serde.dumps_typed(value)
+            rows.append({
+                'thread_id': configurable['thread_id'],
+                'checkpoint_ns': configurable.get('checkpoint_ns', ''),
+                'checkpoint_id': configurable['checkpoint_id'],
+                'task_id': task_id,
+                'idx': WRITES_IDX_MAP.get(channel, idx),
+                'channel': channel,
+                'value_type': value_type,
+                'value': value_bytes,
+                'task_path': task_path,
+            })
+        statement = insert(GraphCheckpointWrite).values(rows)
+        index_elements = ['thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx']
+        # Специальные записи (ошибки, прерывания) перезаписываются, обычные записи задачи - нет
+        if all(channel in WRITES_IDX_MAP for channel, _ in writes):
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={
+                    'channel': statement.excluded.channel,
+                    'value_type': statement.excluded.value_type,
+                    'value': statement.excluded.value,
+                },
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=index_elements)
+        async with self._session() as session, session.begin():
+            await session.execute(statement)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        async with self._session() as session, session.begin():
+            await session.execute(delete(GraphCheckpointWrite).where(GraphCheckpointWrite.thread_id == thread_id))
+            await session.execute(delete(GraphCheckpoint).where(GraphCheckpoint.thread_id == thread_id))
+
+    async def acompact(self) -> int:
+        """
+        Удаляет диалоги с истекшим TTL, старые чекпоинты сверх ограничений и их записи.
+
+        Returns:
+            int: Число удаленных чекпоинтов
+        """
+        started = time.perf_counter()
+        async with self._session() as session, session.begin():
+            result = await session.execute(
+                _COMPACT_CHECKPOINTS,
+                {
+                    # Граница TTL считается в БД: created_at заполняется ее now(), а не временем приложения
+                    'ttl': float(self.ttl),
+                    'max_per_thread': max(self.max_per_thread, 1),
+                    'max_thread_bytes': self.max_thread_bytes,
+                },
+            )
+            removed = result.rowcount
+            await session.execute(_COMPACT_WRITES)
+        logger.debug(f'Сжатие чекпоинтов в БД: {time.perf_counter() - started:.2f} сек')
+        return removed
@@ -12,17 +12,135 @@ class RagConfig(BaseSettings):
     """
     MODEL_NAME: str
     MODEL_HOST: str
+    MODEL_HOST_MAX_FAILS: int = 3
+    MODEL_HOST_EJECT_TIME: float = 30
+    MODEL_KEEP_ALIVE: int = 1800
+    MODEL_WARMUP: bool = True
+    MODEL_WARMUP_TIMEOUT: float = 120
+    MODEL_HTTP_MAX_CONNECTIONS: int = 32
+    MODEL_HTTP_MAX_KEEPALIVE: int = 16
+    MODEL_HTTP_KEEPALIVE_EXPIRY: float = 60
     TEMPERATURE: float
 
     QDRANT_HOST: str
     QDRANT_PORT: int
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_HTTPS: bool = False
+    QDRANT_API_KEY: str | None = None
+    QDRANT_TIMEOUT: int | None = None
     VECTOR_SIZE: int
     LIST_COLLECTION: list[str]
 
+    # Быстрая классификация намерений без LLM
+    INTENT_FAST_PATH_THRESHOLD: float = 0.75
+    INTENT_SAMPLE_RATE: float = 0.05
+
+    # Семантический кэш SQL запросов
+    SQL_CACHE_COLLECTION: str = 'sql'
+    SQL_CACHE_REUSE_THRESHOLD: float = 0.95
+    SQL_CACHE_HINT_THRESHOLD: float = 0.85
+
     EMBEDDINGS_MODEL_NAME: str
+    EMBED_BATCH_SIZE: int = 64
+    EMBEDDINGS_CACHE_SIZE: int = 10000
+    EMBEDDINGS_CACHE_PATH: str | None = 'files/cache/embeddings.sqlite3'
+
+    # Генерация описаний схемы БД
+    DESCRIBE_TOKEN_BUDGET: int = 3000
+    DESCRIBE_CONCURRENCY: int = 4
+    DESCRIBE_RETRIES: int = 2
+    DESCRIBE_TIMEOUT: float = 300
+
+    # Потоковая выгрузка результатов запросов
+    EXPORT_DIR: str = 'files'
+    EXPORT_FORMAT: str = 'csv'
+    EXPORT_MAX_ROWS: int | None = 10_000_000
+    EXPORT_MAX_BYTES: int | None = 2 * 1024 ** 3
+    EXPORT_CHUNK_ROWS: int = 50_000
+    EXPORT_XLSX_MAX_ROWS: int = 1_048_575
+
+    # Результаты выполненных запросов: ограничение строк и кэш
+    RESULT_MAX_ROWS: int | None = 1_000_000
+    RESULT_CACHE_TTL: float = 300
+    RESULT_CACHE_MAX_ITEMS: int = 32
+    RESULT_CACHE_MAX_BYTES: int = 512 * 1024 ** 2
+
+    # Проверка сгенерированного SQL через EXPLAIN до выполнения
+    SQL_MAX_ESTIMATED_COST: float | None = 1e8
+    SQL_MAX_ESTIMATED_ROWS: int | None = 50_000_000
+
+    # Сводка результата запроса для аналитического агента (в токенах)
+    ANALYTIC_DIGEST_TOKEN_BUDGET: int = 1500
+    # Контроль размера результата аналитического запроса
+    ANALYTIC_MAX_ROWS: int = 500
+    ANALYTIC_MAX_OPTIMIZE_ATTEMPTS: int = 2
+    ANALYTIC_ESTIMATE_BLOCK_FACTOR: float = 100
+
+    # Пулы для синхронной работы экспорта вне event loop
+    EXECUTOR_FETCH_THREADS: int = 4
+    EXECUTOR_SERIALIZE_PROCESSES: int = 2
+    EXECUTOR_SERIALIZE_THREADS: int = 2
+    EXECUTOR_WRITE_THREADS: int = 4
+    EXECUTOR_MAX_QUEUE: int = 64
+    EXECUTOR_SLOW_THRESHOLD: float = 5
+
+    # Хранилище чекпоинтов диалогов (memory, postgres) и их ограничения
+    CHECKPOINTER_BACKEND: str = 'memory'
+    CHECKPOINT_MAX_THREADS: int = 1000
+    CHECKPOINT_TTL: float = 24 * 3600
+    CHECKPOINT_MAX_PER_THREAD: int = 10
+    CHECKPOINT_MAX_THREAD_BYTES: int = 16 * 1024 ** 2
+    CHECKPOINT_COMPACT_INTERVAL: float = 600
+
+    # Контекст диалога: окно последних сообщений и сводка старых (в токенах)
+    CONTEXT_TOKEN_BUDGET: int = 2000
+    CONTEXT_MIN_MESSAGES: int = 2
+    CONTEXT_SUMMARY_TOKEN_BUDGET: int = 500
+    CONTEXT_PENDING_TOKEN_BUDGET: int = 1500
+    CONTEXT_ARTIFACT_MAX_TOKENS: int = 150
+
+    # Шлюз запросов к Ollama: общий лимит и лимиты классов (interactive, embeddings, batch)
+    LLM_MAX_CONCURRENCY: int = 4
+    LLM_INTERACTIVE_CONCURRENCY: int = 3
+    LLM_INTERACTIVE_MAX_QUEUE: int = 32
+    LLM_INTERACTIVE_DEADLINE: float = 30
+    LLM_EMBEDDINGS_CONCURRENCY: int = 2
+    LLM_EMBEDDINGS_MAX_QUEUE: int = 64
+    LLM_EMBEDDINGS_DEADLINE: float = 15
+    LLM_BATCH_CONCURRENCY: int = 1
+    LLM_BATCH_MAX_QUEUE: int = 256
+    LLM_BATCH_DEADLINE: float = 600
+
+    # Кэш ответов агентов (memory, redis, none) и время жизни ответов по агентам (в секундах, 0 - без кэша)
+    LLM_CACHE_BACKEND: str = 'memory'
+    LLM_CACHE_MAX_ITEMS: int = 10000
+    LLM_CACHE_TTL_INTENT_CLASSIFIER: float = 3600
+    LLM_CACHE_TTL_SQL_GENERATE: float = 600
+    LLM_CACHE_TTL_ANALYTIC: float = 300
+    LLM_CACHE_TTL_SUMMARY: float = 0
+
+    REDIS_HOST: str = 'localhost'
+    REDIS_PORT: int = 6379
+    REDIS_PASSWORD: str | None = None
+    REDIS_DB: int = 0
 
     model_config = SettingsConfigDict(
         env_file=Path(__file__).parent.parent.parent / ".env",
         env_file_encoding='utf-8',
-        extra="ignore"
-    )
\ No newline at end of file
+        extra="ignore",
+        # Пустое значение необязательного параметра (QDRANT_TIMEOUT=, EXPORT_MAX_ROWS=) - None
+        env_parse_none_str='',
+    )
+
+    @property
+    def embeddings_cache_path(self) -> Path | None:
+        """Возвращает путь к файлу кэша эмбеддингов относительно корня проекта"""
+        if not self.EMBEDDINGS_CACHE_PATH:
+            return None
+        return Path(__file__).parent.parent.parent / self.EMBEDDINGS_CACHE_PATH
+
+    @property
+    def export_dir(self) -> Path:
+        """Возвращает каталог выгрузок относительно корня проекта"""
+        return Path(__file__).parent.parent.parent / self.EXPORT_DIR
\ No newline at end of file
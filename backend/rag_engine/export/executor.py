@@ -0,0 +1,208 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Literal
+from loguru import logger
+
+from ...config import config
+
+PoolName = Literal['fetch', 'serialize', 'write']
+
+
+class ExecutorQueueFull(RuntimeError):
+    """Очередь пула переполнена, задача не принята"""
+
+
+def _timed_call(func: Callable, args: tuple) -> tuple[float, float, Any]:
+    """
+    Выполняет функцию в воркере и замеряет время.
+
+    Функция уровня модуля, чтобы ее можно было передать в пул процессов.
+
+    Returns:
+        tuple: Время старта (time.time), длительность выполнения и результат
+    """
+    started = time.time()
+    run_start = time.perf_counter()
+    value = func(*args)
+    return started, time.perf_counter() - run_start, value
+
+
+class _Pool:
+    """Пул с ограничением очереди и счетчиками времени ожидания и выполнения"""
+    def __init__(self, name: str, factory: Callable[[], Executor], workers: int, max_queue: int):
+        self.name = name
+        self.factory = factory
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor: Executor | None = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+    @property
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'running': min(self.pending, self.workers),
+            'queued': max(self.pending - self.workers, 0),
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'wait_avg': self.wait_total / finished if finished else 0.0,
+            'wait_max': self.wait_max,
+            'run_avg': self.run_total / finished if finished else 0.0,
+            'run_max': self.run_max,
+        }
+
+    def get_executor(self) -> Executor:
+        if self.executor is None:
+            self.executor = self.factory()
+        return self.executor
+
+    def record(self, wait: float, run: float, failed: bool):
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.run_total += run
+        self.run_max = max(self.run_max, run)
+
+
+class ExportExecutor:
+    """
+    Пулы для синхронной работы экспорта, вынесенной из event loop.
+
+    Три пула под разные виды нагрузки:
+        fetch - сборка DataFrame из строк, полученных от БД (потоки);
+        serialize - xlsx, JSON и другая CPU-тяжелая сериализация (процессы,
+            если SERIALIZE_PROCESSES > 0, иначе SERIALIZE_THREADS потоков);
+        write - запись файлов на диск (потоки).
+
+    Каждый пул ограничен числом воркеров и длиной очереди: если задач больше,
+    чем воркеров и мест в очереди, новая задача отклоняется с ExecutorQueueFull.
+    Для каждого пула считаются время ожидания в очереди и время выполнения.
+
+    Attributes:
+        max_queue (int): Максимальное число задач в очереди каждого пула
+        slow_threshold (float): Время ожидания + выполнения, после которого задача логируется как медленная
+
+    Args:
+        fetch_threads (int, optional): Потоки пула fetch. Defaults to config.rag_config.EXECUTOR_FETCH_THREADS.
+        serialize_processes (int, optional): Процессы пула serialize (0 - потоки).
+            Defaults to config.rag_config.EXECUTOR_SERIALIZE_PROCESSES.
+        serialize_threads (int, optional): Потоки пула serialize, если процессы выключены.
+            Defaults to config.rag_config.EXECUTOR_SERIALIZE_THREADS.
+        write_threads (int, optional): Потоки пула write. Defaults to config.rag_config.EXECUTOR_WRITE_THREADS.
+        max_queue (int, optional): Длина очереди каждого пула. Defaults to config.rag_config.EXECUTOR_MAX_QUEUE.
+        slow_threshold (float, optional): Порог медленной задачи в секундах.
+            Defaults to config.rag_config.EXECUTOR_SLOW_THRESHOLD.
+    """
+    def __init__(
+            self,
+            fetch_threads: int = config.rag_config.EXECUTOR_FETCH_THREADS,
+            serialize_processes: int = config.rag_config.EXECUTOR_SERIALIZE_PROCESSES,
+            serialize_threads: int = config.rag_config.EXECUTOR_SERIALIZE_THREADS,
+            write_threads: int = config.rag_config.EXECUTOR_WRITE_THREADS,
+            max_queue: int = config.rag_config.EXECUTOR_MAX_QUEUE,
+            slow_threshold: float = config.rag_config.EXECUTOR_SLOW_THRESHOLD,
+    ):
+        self.max_queue = max_queue
+        self.slow_threshold = slow_threshold
+        if serialize_processes > 0:
+            # spawn: fork процесса с запущенным event loop и потоками небезопасен
+            serialize_factory = lambda: ProcessPoolExecutor(
+                max_workers=serialize_processes,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            serialize_workers = serialize_processes
+        else:
+            serialize_factory = lambda: ThreadPoolExecutor(max_workers=serialize_threads, thread_name_prefix='serialize')
+            serialize_workers = serialize_threads
+        self._pools: dict[str, _Pool] = {
+            'fetch': _Pool(
+                'fetch',
+                lambda: ThreadPoolExecutor(max_workers=fetch_threads, thread_name_prefix='fetch'),
+                fetch_threads,
+                max_queue,
+            ),
+            'serialize': _Pool('serialize', serialize_factory, serialize_workers, max_queue),
+            'write': _Pool(
+                'write',
+                lambda: ThreadPoolExecutor(max_workers=write_threads, thread_name_prefix='write'),
+                write_threads,
+                max_queue,
+            ),
+        }
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает счетчики и время ожидания/выполнения по пулам"""
+        return {name: pool.stats for name, pool in self._pools.items()}
+
+    async def run(self, pool_name: PoolName, func: Callable, *args) -> Any:
+        """
+        Выполняет функцию в пуле и возвращает результат.
+
+        Для пула serialize с процессами функция и аргументы должны сериализоваться
+        через pickle (функции уровня модуля, DataFrame, пути).
+
+        Args:
+            pool_name (str): Пул (fetch, serialize, write)
+            func (Callable): Синхронная функция
+            *args: Аргументы функции
+
+        Returns:
+            Any: Результат функции
+
+        Raises:
+            ExecutorQueueFull: Если очередь пула заполнена
+        """
+        pool = self._pools[pool_name]
+        if pool.pending >= pool.workers + pool.max_queue:
+            pool.rejected += 1
+            raise ExecutorQueueFull(f'Очередь пула {pool_name} заполнена ({pool.max_queue} задач)')
+
+        pool.pending += 1
+        submitted = time.time()
+        run_start = time.perf_counter()
+        started, run, failed = None, 0.0, True
+        try:
+            started, run, value = await asyncio.get_running_loop().run_in_executor(
+                pool.get_executor(), _timed_call, func, args
+            )
+            failed = False
+            return value
+        finally:
+            pool.pending -= 1
+            if started is None:
+                # Задача упала в воркере: время ожидания неизвестно, считаем все время выполнением
+                wait, run = 0.0, time.perf_counter() - run_start
+            else:
+                wait = max(started - submitted, 0.0)
+            pool.record(wait, run, failed)
+            if wait + run > self.slow_threshold:
+                logger.warning(
+                    f'Медленная задача {getattr(func, "__name__", func)} в пуле {pool_name}: '
+                    f'ожидание {wait:.2f} сек, выполнение {run:.2f} сек'
+                )
+
+    def shutdown(self):
+        """Останавливает пулы, дожидаясь выполняющихся задач"""
+        for pool in self._pools.values():
+            if pool.executor is not None:
+                pool.executor.shutdown(wait=True, cancel_futures=True)
+                pool.executor = None
+
+
+export_executor = ExportExecutor()
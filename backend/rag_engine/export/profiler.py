@@ -0,0 +1,203 @@
+import math
+import polars as pl
+
+from ...config import config
+
+# Уровни детализации сводки: (top-k значений, строк выборки, квантили, тренды)
+_DETAIL_LEVELS: tuple[tuple[int, int, bool, bool], ...] = (
+    (5, 20, True, True),
+    (5, 10, True, True),
+    (3, 5, True, True),
+    (3, 0, False, True),
+    (0, 0, False, False),
+)
+
+
+def _fmt(value) -> str:
+    """Форматирует значение для промпта: числа до 4 значащих цифр, длинные строки обрезаются"""
+    if value is None:
+        return 'null'
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return str(value)
+        return f'{value:.4g}'
+    text = str(value)
+    return text if len(text) <= 40 else text[:37] + '...'
+
+
+class ResultProfiler:
+    """
+    Сводка результата запроса для промпта аналитического агента.
+
+    Вместо полного JSON результата агент получает: размер результата, для каждой
+    колонки тип и число null, для числовых - min/max/mean и квантили, для
+    категориальных - самые частые значения, для колонок времени - наклон трендов
+    числовых колонок, и небольшую выборку строк, стратифицированную по самой
+    подходящей категориальной колонке. Если результат целиком укладывается
+    в бюджет, вместо выборки в сводку попадают все строки.
+
+    Детализация уменьшается по уровням, пока оценка размера сводки не уложится
+    в бюджет токенов; на последнем уровне обрезается список колонок.
+
+    Attributes:
+        token_budget (int): Максимальный размер сводки в токенах
+        max_trend_columns (int): Максимальное число числовых колонок в трендах
+        max_strata (int): Максимальное число уникальных значений колонки стратификации
+
+    Args:
+        token_budget (int, optional): Бюджет токенов. Defaults to config.rag_config.ANALYTIC_DIGEST_TOKEN_BUDGET.
+        max_trend_columns (int, optional): Число колонок в трендах. Defaults to 5.
+        max_strata (int, optional): Порог уникальных значений для стратификации. Defaults to 20.
+    """
+    _CHARS_PER_TOKEN = 3
+    _QUANTILES = (0.25, 0.5, 0.75)
+
+    def __init__(
+            self,
+            token_budget: int = config.rag_config.ANALYTIC_DIGEST_TOKEN_BUDGET,
+            max_trend_columns: int = 5,
+            max_strata: int = 20,
+    ):
+        self.token_budget = token_budget
+        self.max_trend_columns = max_trend_columns
+        self.max_strata = max_strata
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        """Оценивает число токенов текста"""
+        return len(text) // cls._CHARS_PER_TOKEN + 1
+
+    @staticmethod
+    def _is_temporal(dtype: pl.DataType) -> bool:
+        return dtype.is_temporal() and dtype not in (pl.Time, pl.Duration)
+
+    @staticmethod
+    def _is_categorical(dtype: pl.DataType) -> bool:
+        return dtype in (pl.Utf8, pl.Categorical, pl.Boolean) or isinstance(dtype, pl.Enum)
+
+    def _describe_column(self, df: pl.DataFrame, name: str, top_k: int, quantiles: bool) -> str:
+        series = df.get_column(name)
+        dtype = series.dtype
+        nulls = series.null_count()
+        parts = [f'null {nulls} ({nulls / df.height:.0%})' if df.height else 'null 0']
+        non_null = series.drop_nulls()
+        if non_null.is_empty():
+            return f'- {name} ({dtype}): ' + '; '.join(parts)
+
+        if dtype.is_numeric():
+            parts.append(f'min {_fmt(non_null.min())}; max {_fmt(non_null.max())}; mean {_fmt(non_null.mean())}')
+            if quantiles:
+                values = ', '.join(_fmt(non_null.quantile(q)) for q in self._QUANTILES)
+                parts.append(f'q25/q50/q75 {values}')
+        elif dtype.is_temporal():
+            parts.append(f'от {_fmt(non_null.min())} до {_fmt(non_null.max())}')
+        if not dtype.is_numeric() or self._is_categorical(dtype):
+            parts.append(f'уникальных {non_null.n_unique()}')
+            if top_k and self._is_categorical(dtype):
+                counts = non_null.value_counts(sort=True).head(top_k)
+                top = ', '.join(f'{_fmt(value)}: {count}' for value, count in counts.iter_rows())
+                parts.append(f'топ: {top}')
+        return f'- {name} ({dtype}): ' + '; '.join(parts)
+
+    def _trends(self, df: pl.DataFrame) -> list[str]:
+        """Считает наклон линейного тренда числовых колонок по первой колонке времени (в единицах за день)"""
+        time_columns = [name for name, dtype in df.schema.items() if self._is_temporal(dtype)]
+        numeric_columns = [name for name, dtype in df.schema.items() if dtype.is_numeric()]
+        if not time_columns or not numeric_columns or df.height < 3:
+            return []
+        time_column = time_columns[0]
+        days = (
+            pl.col(time_column).cast(pl.Datetime('us')).dt.epoch('s').cast(pl.Float64) / 86400
+        ).alias('__days')
+        lines = []
+        for name in numeric_columns[:self.max_trend_columns]:
+            frame = df.select(days, pl.col(name).cast(pl.Float64).alias('__value')).drop_nulls()
+            if frame.height < 3:
+                continue
+            stats = frame.select(
+                pl.cov('__days', '__value').alias('cov'),
+                pl.col('__days').var().alias('var'),
+            ).row(0)
+            if not stats[1]:
+                continue
+            lines.append(f'- {name} по {time_column}: наклон {_fmt(stats[0] / stats[1])} в день ({frame.height} точек)')
+        return lines
+
+    def _strata_column(self, df: pl.DataFrame) -> str | None:
+        """Выбирает категориальную колонку с наименьшим (но больше одного) числом значений"""
+        best, best_unique = None, None
+        for name, dtype in df.schema.items():
+            if not self._is_categorical(dtype):
+                continue
+            unique = df.get_column(name).n_unique()
+            if 1 < unique <= self.max_strata and (best_unique is None or unique < best_unique):
+                best, best_unique = name, unique
+        return best
+
+    def _sample(self, df: pl.DataFrame, rows: int) -> tuple[str, pl.DataFrame]:
+        """Возвращает заголовок и стратифицированную выборку строк"""
+        strata = self._strata_column(df)
+        if strata is None:
+            return f'Выборка ({min(rows, df.height)} строк)', df.sample(n=min(rows, df.height), seed=0)
+        per_group = max(rows // df.get_column(strata).n_unique(), 1)
+        sample = df.group_by(strata, maintain_order=True).head(per_group).head(rows)
+        return f'Выборка ({sample.height} строк, по {per_group} на значение {strata})', sample
+
+    @staticmethod
+    def _render_rows(df: pl.DataFrame) -> str:
+        lines = [','.join(df.columns)]
+        lines.extend(','.join(_fmt(value) for value in row) for row in df.iter_rows())
+        return '\n'.join(lines)
+
+    def _build(self, df: pl.DataFrame, columns: list[str], level: tuple[int, int, bool, bool]) -> str:
+        top_k, sample_rows, quantiles, trends = level
+        sections = [f'Строк: {df.height}, колонок: {df.width}']
+        sections.append('Колонки:\n' + '\n'.join(
+            self._describe_column(df, name, top_k, quantiles) for name in columns
+        ))
+        if len(columns) < df.width:
+            sections.append(f'(еще {df.width - len(columns)} колонок опущено)')
+        if trends:
+            trend_lines = self._trends(df)
+            if trend_lines:
+                sections.append('Тренды:\n' + '\n'.join(trend_lines))
+        if sample_rows and df.height:
+            title, sample = self._sample(df, sample_rows)
+            sections.append(f'{title}:\n{self._render_rows(sample)}')
+        return '\n\n'.join(sections)
+
+    def profile(self, df: pl.DataFrame) -> str:
+        """
+        Строит сводку результата в пределах бюджета токенов.
+
+        Args:
+            df (pl.DataFrame): Результат запроса
+
+        Returns:
+            str: Текстовая сводка для промпта
+        """
+        if df.is_empty():
+            return f'Результат пуст, колонки: {", ".join(df.columns)}'
+
+        # Маленький результат отдается целиком
+        full = f'Строк: {df.height}, колонок: {df.width}\nВсе строки:\n{self._render_rows(df)}'
+        if self.estimate_tokens(full) <= self.token_budget:
+            return full
+
+        columns = df.columns
+        digest = ''
+        for level in _DETAIL_LEVELS:
+            digest = self._build(df, columns, level)
+            if self.estimate_tokens(digest) <= self.token_budget:
+                return digest
+
+        # Даже минимальная сводка не помещается: оставляем столько колонок, сколько влезает
+        while len(columns) > 1 and self.estimate_tokens(digest) > self.token_budget:
+            columns = columns[:max(len(columns) * self.token_budget // self.estimate_tokens(digest), 1)]
+            digest = self._build(df, columns, _DETAIL_LEVELS[-1])
+        return digest
+
+
+def profile_frame(df: pl.DataFrame) -> str:
+    """Строит сводку с настройками по умолчанию (функция уровня модуля для пула процессов)"""
+    return ResultProfiler().profile(df)
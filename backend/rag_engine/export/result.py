@@ -0,0 +1,267 @@
+import asyncio
+import re
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Sequence
+import polars as pl
+import pyarrow as pa
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from .executor import export_executor
+from .profiler import profile_frame
+from ...config import config
+
+FRAME_FORMATS = ('csv', 'parquet', 'xlsx')
+
+
+def rows_to_frame(columns: list[str], rows: Sequence[Sequence[Any]]) -> pl.DataFrame:
+    """Собирает DataFrame из строк результата запроса"""
+    return pl.DataFrame([tuple(row) for row in rows], schema=columns, orient='row', infer_schema_length=None)
+
+
+def frame_to_json(df: pl.DataFrame) -> str:
+    return df.write_json()
+
+
+def write_frame(df: pl.DataFrame, path: Path, export_format: str) -> Path:
+    """Записывает DataFrame в файл (функция уровня модуля для пула процессов)"""
+    if export_format == 'csv':
+        df.write_csv(path.as_posix())
+    elif export_format == 'parquet':
+        df.write_parquet(path.as_posix())
+    elif export_format == 'xlsx':
+        df.write_excel(path.as_posix(), worksheet='List1', autofit=True)
+    else:
+        raise ValueError(f'Неизвестный формат файла: {export_format}. Доступны: {FRAME_FORMATS}')
+    return path
+
+
+class QueryResult:
+    """
+    Результат SQL запроса, выполненного один раз.
+
+    Данные хранятся в DataFrame polars (колонки в памяти Arrow), все
+    представления - файлы, JSON превью, сводная статистика - строятся из него
+    без повторного обращения к БД.
+
+    Attributes:
+        query (str): SQL запрос
+        df (pl.DataFrame): Данные результата
+        truncated (bool): Результат обрезан по ограничению строк
+        created_at (float): Время выполнения запроса (time.monotonic)
+    """
+    def __init__(self, query: str, df: pl.DataFrame, truncated: bool = False):
+        self.query = query
+        self.df = df
+        self.truncated = truncated
+        self.created_at = time.monotonic()
+
+    @property
+    def row_count(self) -> int:
+        return self.df.height
+
+    @property
+    def size_bytes(self) -> int:
+        return int(self.df.estimated_size())
+
+    def to_arrow(self) -> pa.Table:
+        """Возвращает результат как таблицу Arrow (без копирования данных)"""
+        return self.df.to_arrow()
+
+    async def to_json(self, limit: int | None = None) -> str:
+        """
+        Сериализует результат (или его первые строки) в JSON в пуле serialize.
+
+        Args:
+            limit (int | None, optional): Число строк превью. Defaults to None (все строки).
+        """
+        df = self.df if limit is None else self.df.head(limit)
+        return await export_executor.run('serialize', frame_to_json, df)
+
+    def summary(self) -> pl.DataFrame:
+        """Возвращает сводную статистику по колонкам (count, null_count, mean, min, max, ...)"""
+        return self.df.describe()
+
+    async def digest(self) -> str:
+        """Строит компактную сводку результата для промпта LLM в пуле serialize"""
+        digest = await export_executor.run('serialize', profile_frame, self.df)
+        if self.truncated:
+            # Агент не должен делать выводы о данных за пределами полученных строк
+            digest = f'Результат обрезан: получены только первые {self.row_count} строк\n{digest}'
+        return digest
+
+    async def write(self, export_dir: Path, export_format: str) -> Path:
+        """
+        Записывает результат в файл нового имени в подкаталоге формата.
+
+        Xlsx собирается в пуле serialize, остальные форматы пишутся в пуле write.
+
+        Args:
+            export_dir (Path): Каталог выгрузок
+            export_format (str): Формат файла (csv, parquet, xlsx)
+
+        Returns:
+            Path: Путь к записанному файлу
+        """
+        if export_format not in FRAME_FORMATS:
+            raise ValueError(f'Неизвестный формат файла: {export_format}. Доступны: {FRAME_FORMATS}')
+        directory = export_dir / export_format
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'query_result_{uuid.uuid4()}.{export_format}'
+        pool_name = 'serialize' if export_format == 'xlsx' else 'write'
+        return await export_executor.run(pool_name, write_frame, self.df, path, export_format)
+
+
+class ResultStore:
+    """
+    Выполняет SQL запросы в QueryResult и кэширует их на время TTL.
+
+    Ключ кэша - URL БД и нормализованный запрос (без лишних пробелов и
+    завершающей точки с запятой). Одинаковые запросы, пришедшие одновременно,
+    выполняются один раз. Кэш ограничен числом записей и суммарным размером
+    данных, при переполнении вытесняются давно не использованные записи.
+
+    Attributes:
+        max_rows (int | None): Ограничение числа строк результата (None - без ограничения)
+        ttl (float): Время жизни записи в секундах (0 - кэш выключен)
+        max_items (int): Максимальное число записей
+        max_bytes (int): Максимальный суммарный размер данных записей
+        hits (int): Число попаданий в кэш
+        misses (int): Число выполненных запросов
+
+    Args:
+        max_rows (int | None, optional): Ограничение строк. Defaults to config.rag_config.RESULT_MAX_ROWS.
+        ttl (float, optional): Время жизни записи. Defaults to config.rag_config.RESULT_CACHE_TTL.
+        max_items (int, optional): Максимальное число записей. Defaults to config.rag_config.RESULT_CACHE_MAX_ITEMS.
+        max_bytes (int, optional): Максимальный размер данных. Defaults to config.rag_config.RESULT_CACHE_MAX_BYTES.
+    """
+    # Строковые литералы и идентификаторы в кавычках не нормализуются
+    _QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+    _WHITESPACE = re.compile(r'\s+')
+
+    def __init__(
+            self,
+            max_rows: int | None = config.rag_config.RESULT_MAX_ROWS,
+            ttl: float = config.rag_config.RESULT_CACHE_TTL,
+            max_items: int = config.rag_config.RESULT_CACHE_MAX_ITEMS,
+            max_bytes: int = config.rag_config.RESULT_CACHE_MAX_BYTES,
+    ):
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._results: OrderedDict[tuple[str, str], QueryResult] = OrderedDict()
+        self._pending: dict[tuple[str, str], asyncio.Future] = {}
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает счетчики и размер кэша результатов"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'items': len(self._results),
+            'bytes': sum(result.size_bytes for result in self._results.values()),
+        }
+
+    @classmethod
+    def normalize(cls, query: str) -> str:
+        """Приводит запрос к каноническому виду: схлопывает пробелы вне кавычек, убирает завершающую ;"""
+        parts = cls._QUOTED.split(query.strip().rstrip(';'))
+        # Нечетные элементы split - содержимое в кавычках
+        return ''.join(
+            part if index % 2 else cls._WHITESPACE.sub(' ', part)
+            for index, part in enumerate(parts)
+        ).strip()
+
+    def _get(self, key: tuple[str, str]) -> QueryResult | None:
+        result = self._results.get(key)
+        if result is None:
+            return None
+        if time.monotonic() - result.created_at > self.ttl:
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return result
+
+    def _put(self, key: tuple[str, str], result: QueryResult):
+        if self.ttl <= 0 or result.size_bytes > self.max_bytes:
+            return
+        self._results[key] = result
+        self._results.move_to_end(key)
+        total = sum(item.size_bytes for item in self._results.values())
+        while self._results and (len(self._results) > self.max_items or total > self.max_bytes):
+            _, evicted = self._results.popitem(last=False)
+            total -= evicted.size_bytes
+
+    async def _execute(self, session: AsyncSession, query: str) -> QueryResult:
+        logger.info(f'Выполняю sql запрос...{session}')
+        statement = query.strip().rstrip(';')
+        if self.max_rows is not None:
+            # Строка сверх ограничения только отличает обрезанный результат от полного
+            statement = f'SELECT * FROM ({statement}) AS result_query LIMIT {self.max_rows + 1}'
+        # Ожидание БД асинхронное, сборка DataFrame - в пуле fetch
+        connection = await session.connection()
+        result = await connection.exec_driver_sql(statement)
+        columns = list(result.keys())
+        rows = result.all()
+        truncated = self.max_rows is not None and len(rows) > self.max_rows
+        if truncated:
+            rows = rows[:self.max_rows]
+        df = await export_executor.run('fetch', rows_to_frame, columns, rows)
+        if truncated:
+            logger.warning(f'Результат запроса обрезан до {self.max_rows} строк')
+        return QueryResult(query, df, truncated)
+
+    async def get(self, session: AsyncSession, query: str) -> QueryResult:
+        """
+        Возвращает результат запроса из кэша или выполняет запрос.
+
+        Args:
+            session (AsyncSession): Сессия БД
+            query (str): SQL запрос
+
+        Returns:
+            QueryResult: Результат запроса
+        """
+        # Выполняется исходный запрос: схлопывание строк сломало бы комментарии "--"
+        key = (str(session.bind.url), self.normalize(query))
+        result = self._get(key)
+        if result is not None:
+            self.hits += 1
+            logger.info(f'Результат запроса взят из кэша ({result.row_count} строк)')
+            return result
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await self._execute(session, query)
+            self._put(key, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передается вызывающему, ожидающих может не быть
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    def invalidate(self):
+        """Сбрасывает кэш результатов"""
+        self._results.clear()
+
+
+result_store = ResultStore()
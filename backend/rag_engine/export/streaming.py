@@ -0,0 +1,389 @@
+import gzip
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from asyncpg import Connection, Record
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from .executor import export_executor
+from ...config import config
+
+EXPORT_FORMATS = ('csv', 'csv.gz', 'parquet')
+
+# Excel вмещает 1 048 576 строк вместе со строкой заголовка
+EXCEL_MAX_ROWS = 1_048_575
+
+
+class ExportResult(BaseModel):
+    """Результат выгрузки запроса в файл.
+
+    Attributes:
+        path(Path): Путь к файлу выгрузки
+        export_format(str): Формат файла (csv, csv.gz, parquet)
+        row_count(int): Число выгруженных строк
+        byte_count(int): Число байт, полученных от БД (для parquet - записанных в файл)
+        truncated(bool): Выгрузка остановлена по ограничению строк или байт
+        xlsx_path(Path | None): Путь к xlsx копии (None, если результат не помещается в Excel)
+    """
+    path: Path
+    export_format: str
+    row_count: int
+    byte_count: int
+    truncated: bool = False
+    xlsx_path: Path | None = None
+
+
+class _ByteLimitReached(Exception):
+    """Прерывает COPY, когда выгрузка достигла ограничения по байтам"""
+
+
+class _RowLimitReached(Exception):
+    """Прерывает COPY, когда в выгрузке появилась строка сверх ограничения по строкам"""
+
+
+class _CsvSink:
+    """
+    Приемник данных COPY, который пишет чанки в файл и считает записи и байты.
+
+    Записи CSV считаются по переводам строк вне кавычек, поэтому значения
+    с переводами строк не искажают счет. Запрос выбирает на одну строку больше
+    ограничения: появление этой строки означает, что результат обрезан, сама
+    строка в файл не пишется. При достижении ограничения по байтам чанк
+    дописывается до последней полной записи. В обоих случаях COPY прерывается.
+
+    Attributes:
+        record_count (int): Число записанных записей CSV вместе с заголовком
+        truncated (bool): Выгрузка обрезана по строкам или байтам
+    """
+    def __init__(self, path: Path, compress: bool, max_bytes: int | None, max_rows: int | None = None):
+        self.file = gzip.open(path, 'wb') if compress else open(path, 'wb')
+        self.max_bytes = max_bytes
+        # Заголовок - тоже запись
+        self.max_records = None if max_rows is None else max_rows + 1
+        self.byte_count = 0
+        self.record_count = 0
+        self.truncated = False
+        self._quoted = False
+
+    def _count(self, chunk: bytes) -> int | None:
+        """
+        Считает записи, завершенные в чанке.
+
+        Returns:
+            int | None: Длина начала чанка до конца последней допустимой записи,
+                если дальше в чанке есть данные сверх ограничения, иначе None
+        """
+        if self.max_records is not None and self.record_count >= self.max_records:
+            return 0 if chunk else None
+        offset = 0
+        # Части между кавычками попеременно вне и внутри значения ("" внутри значения меняет состояние дважды)
+        for index, part in enumerate(chunk.split(b'"')):
+            if index:
+                self._quoted = not self._quoted
+                offset += 1
+            if not self._quoted:
+                count = part.count(b'\n')
+                if self.max_records is not None and self.record_count + count >= self.max_records:
+                    position = -1
+                    for _ in range(self.max_records - self.record_count):
+                        position = part.find(b'\n', position + 1)
+                    self.record_count = self.max_records
+                    end = offset + position + 1
+                    return end if end < len(chunk) else None
+                self.record_count += count
+            offset += len(part)
+        return None
+
+    def _last_record_end(self, chunk: bytes) -> int:
+        """Возвращает длину начала чанка до последнего перевода строки вне кавычек (0 - такого нет)"""
+        quoted = self._quoted
+        offset = 0
+        end = 0
+        for index, part in enumerate(chunk.split(b'"')):
+            if index:
+                quoted = not quoted
+                offset += 1
+            if not quoted:
+                position = part.rfind(b'\n')
+                if position != -1:
+                    end = offset + position + 1
+            offset += len(part)
+        return end
+
+    async def __call__(self, chunk: bytes):
+        stop = None
+        if self.max_bytes is not None and self.byte_count + len(chunk) > self.max_bytes:
+            chunk = chunk[:max(self.max_bytes - self.byte_count, 0)]
+            # Обрыв только на границе записи: значение с переводами строк не разрезается
+            chunk = chunk[:self._last_record_end(chunk)]
+            stop = _ByteLimitReached
+        end = self._count(chunk)
+        if end is not None:
+            chunk = chunk[:end]
+            stop = stop or _RowLimitReached
+        # Запись (и сжатие) чанка выполняется в пуле write, не блокируя event loop
+        await export_executor.run('write', self._write, chunk)
+        if stop is not None:
+            self.truncated = True
+            raise stop()
+
+    def _write(self, chunk: bytes):
+        self.file.write(chunk)
+        self.byte_count += len(chunk)
+
+    def close(self):
+        self.file.close()
+
+
+def _as_float(value: Any) -> float | None:
+    return None if value is None else float(value)
+
+
+def _as_str(value: Any) -> str | None:
+    return None if value is None else str(value)
+
+
+def _as_naive(value: datetime | None) -> datetime | None:
+    return None if value is None else value.replace(tzinfo=None)
+
+
+def _records_to_arrow(
+        rows: list[Record],
+        columns: list[str],
+        types: list[tuple[Any, Callable[[Any], Any] | None]],
+        schema: dict[str, Any],
+) -> pa.Table:
+    """Собирает пачку строк курсора в таблицу Arrow по схеме запроса"""
+    data = {
+        name: [convert(row[index]) if convert else row[index] for row in rows]
+        for index, (name, (_, convert)) in enumerate(zip(columns, types))
+    }
+    return pl.DataFrame(data, schema=schema).to_arrow()
+
+
+def _xlsx_from_file(source: Path, export_format: str, target: Path) -> Path:
+    """Пересобирает выгрузку в xlsx (функция уровня модуля для пула процессов)"""
+    if export_format == 'parquet':
+        df = pl.read_parquet(source)
+    else:
+        df = pl.read_csv(source, infer_schema_length=10000)
+    df.write_excel(target.as_posix(), worksheet='List1', autofit=True)
+    return target
+
+
+class StreamingExporter:
+    """
+    Потоковая выгрузка результата SQL запроса на диск без загрузки в память.
+
+    CSV и gzip-CSV выгружаются через COPY (...) TO STDOUT: чанки от PostgreSQL
+    пишутся в файл по мере поступления. Parquet собирается из серверного курсора
+    пачками по chunk_rows строк. Объем выгрузки ограничивается по строкам
+    (LIMIT на одну строку больше ограничения поверх запроса: лишняя строка
+    не выгружается и только отмечает обрезку) и по байтам (выгрузка обрывается на последней полной
+    строке). Xlsx копия создается только если результат помещается в Excel.
+
+    Attributes:
+        export_dir (Path): Каталог выгрузок
+        export_format (str): Формат по умолчанию (csv, csv.gz, parquet)
+        max_rows (int | None): Ограничение по строкам (None - без ограничения)
+        max_bytes (int | None): Ограничение по байтам (None - без ограничения)
+        chunk_rows (int): Размер пачки строк серверного курсора
+        xlsx_max_rows (int): Максимальное число строк, при котором создается xlsx (0 - xlsx не создается)
+
+    Args:
+        export_dir (Path, optional): Каталог выгрузок. Defaults to config.rag_config.export_dir.
+        export_format (str, optional): Формат по умолчанию. Defaults to config.rag_config.EXPORT_FORMAT.
+        max_rows (int | None, optional): Ограничение по строкам. Defaults to config.rag_config.EXPORT_MAX_ROWS.
+        max_bytes (int | None, optional): Ограничение по байтам. Defaults to config.rag_config.EXPORT_MAX_BYTES.
+        chunk_rows (int, optional): Размер пачки курсора. Defaults to config.rag_config.EXPORT_CHUNK_ROWS.
+        xlsx_max_rows (int, optional): Порог строк для xlsx. Defaults to config.rag_config.EXPORT_XLSX_MAX_ROWS.
+    """
+    # Типы PostgreSQL -> (тип polars, преобразование значения asyncpg)
+    _PG_TYPES: dict[str, tuple[Any, Callable[[Any], Any] | None]] = {
+        'bool': (pl.Boolean, None),
+        'int2': (pl.Int16, None),
+        'int4': (pl.Int32, None),
+        'int8': (pl.Int64, None),
+        'float4': (pl.Float32, None),
+        'float8': (pl.Float64, None),
+        'numeric': (pl.Float64, _as_float),
+        'money': (pl.Utf8, _as_str),
+        'date': (pl.Date, None),
+        'timestamp': (pl.Datetime('us'), None),
+        # asyncpg отдает timestamptz в UTC, polars ожидает наивное время для колонки с tz
+        'timestamptz': (pl.Datetime('us', 'UTC'), _as_naive),
+        'time': (pl.Time, None),
+        'interval': (pl.Duration('us'), None),
+        'text': (pl.Utf8, None),
+        'varchar': (pl.Utf8, None),
+        'bpchar': (pl.Utf8, None),
+        'name': (pl.Utf8, None),
+    }
+
+    def __init__(
+            self,
+            export_dir: Path = config.rag_config.export_dir,
+            export_format: str = config.rag_config.EXPORT_FORMAT,
+            max_rows: int | None = config.rag_config.EXPORT_MAX_ROWS,
+            max_bytes: int | None = config.rag_config.EXPORT_MAX_BYTES,
+            chunk_rows: int = config.rag_config.EXPORT_CHUNK_ROWS,
+            xlsx_max_rows: int = config.rag_config.EXPORT_XLSX_MAX_ROWS,
+    ):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f'Неизвестный формат выгрузки: {export_format}. Доступны: {EXPORT_FORMATS}')
+        self.export_dir = export_dir
+        self.export_format = export_format
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.chunk_rows = chunk_rows
+        self.xlsx_max_rows = min(xlsx_max_rows, EXCEL_MAX_ROWS)
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Убирает завершающие точки с запятой, которые недопустимы внутри COPY и подзапроса"""
+        return query.strip().rstrip(';').strip()
+
+    def limited_query(self, query: str) -> str:
+        """Оборачивает запрос в LIMIT на строку больше ограничения, чтобы отличить обрезанный результат от полного"""
+        query = self.normalize_query(query)
+        if self.max_rows is None:
+            return query
+        return f'SELECT * FROM ({query}) AS export_query LIMIT {self.max_rows + 1}'
+
+    @staticmethod
+    async def raw_connection(session: AsyncSession) -> Connection:
+        """Возвращает соединение asyncpg, на котором работает сессия"""
+        connection = await session.connection()
+        raw = await connection.get_raw_connection()
+        return raw.driver_connection # type: ignore
+
+    def _target(self, export_format: str) -> Path:
+        directory = self.export_dir / export_format.split('.')[0]
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f'query_result_{uuid.uuid4()}.{export_format}'
+
+    async def _copy_csv(self, conn: Connection, query: str, path: Path, compress: bool) -> ExportResult:
+        """Выгружает запрос через COPY TO STDOUT в CSV (или gzip-CSV)"""
+        sink = _CsvSink(path, compress, self.max_bytes, self.max_rows)
+        try:
+            # Савепоинт, чтобы прерванный COPY не ломал транзакцию сессии
+            async with conn.transaction():
+                status = await conn.copy_from_query(self.limited_query(query), output=sink, format='csv', header=True)
+            # Статус COPY содержит точное число строк
+            row_count = int(status.split()[-1])
+        except (_ByteLimitReached, _RowLimitReached) as e:
+            if isinstance(e, _ByteLimitReached):
+                logger.warning(f'Выгрузка остановлена по ограничению {self.max_bytes} байт')
+            else:
+                logger.warning(f'Выгрузка остановлена по ограничению {self.max_rows} строк')
+            # Без статуса COPY строки - записанные записи без заголовка
+            row_count = max(sink.record_count - 1, 0)
+        finally:
+            await export_executor.run('write', sink.close)
+
+        return ExportResult(
+            path=path,
+            export_format='csv.gz' if compress else 'csv',
+            row_count=row_count,
+            byte_count=sink.byte_count,
+            truncated=sink.truncated,
+        )
+
+    async def _cursor_parquet(self, conn: Connection, query: str, path: Path) -> ExportResult:
+        """Выгружает запрос в Parquet пачками из серверного курсора"""
+        row_count = 0
+        truncated = False
+        writer = None
+        try:
+            async with conn.transaction():
+                statement = await conn.prepare(self.limited_query(query))
+                columns = [attribute.name for attribute in statement.get_attributes()]
+                types = [
+                    self._PG_TYPES.get(attribute.type.name, (pl.Utf8, _as_str))
+                    for attribute in statement.get_attributes()
+                ]
+                schema = {name: dtype for name, (dtype, _) in zip(columns, types)}
+                cursor = await statement.cursor()
+                while True:
+                    rows = await cursor.fetch(self.chunk_rows)
+                    if self.max_rows is not None and row_count + len(rows) > self.max_rows:
+                        # Строка сверх ограничения только отмечает обрезку
+                        rows = rows[:self.max_rows - row_count]
+                        truncated = True
+                    if not rows:
+                        break
+                    frame = await export_executor.run('fetch', _records_to_arrow, rows, columns, types, schema)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, frame.schema)
+                    await export_executor.run('write', writer.write_table, frame)
+                    row_count += len(rows)
+                    if truncated:
+                        logger.warning(f'Выгрузка остановлена по ограничению {self.max_rows} строк')
+                        break
+                    if self.max_bytes is not None and path.stat().st_size > self.max_bytes:
+                        logger.warning(f'Выгрузка остановлена по ограничению {self.max_bytes} байт')
+                        truncated = True
+                        break
+        finally:
+            if writer is not None:
+                await export_executor.run('write', writer.close)
+
+        if writer is None:
+            await export_executor.run('write', pl.DataFrame(schema=schema).write_parquet, path)
+        return ExportResult(
+            path=path,
+            export_format='parquet',
+            row_count=row_count,
+            byte_count=path.stat().st_size,
+            truncated=truncated,
+        )
+
+    async def _write_xlsx(self, result: ExportResult) -> Path:
+        """Создает xlsx копию выгрузки в пуле serialize (результат уже ограничен лимитом Excel)"""
+        return await export_executor.run(
+            'serialize', _xlsx_from_file, result.path, result.export_format, self._target('xlsx')
+        )
+
+    async def export(self, session: AsyncSession, query: str, export_format: str | None = None) -> ExportResult:
+        """
+        Выгружает результат запроса в файл.
+
+        Args:
+            session (AsyncSession): Сессия БД, в транзакции которой выполняется запрос
+            query (str): SQL запрос
+            export_format (str | None, optional): Формат файла. Defaults to формат экспортера.
+
+        Returns:
+            ExportResult: Путь к файлу, число строк и признак обрезки
+        """
+        export_format = export_format or self.export_format
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f'Неизвестный формат выгрузки: {export_format}. Доступны: {EXPORT_FORMATS}')
+        conn = await self.raw_connection(session)
+        path = self._target(export_format)
+        logger.info(f'Выгрузка запроса в {path}')
+        try:
+            if export_format == 'parquet':
+                result = await self._cursor_parquet(conn, query, path)
+            else:
+                result = await self._copy_csv(conn, query, path, compress=export_format == 'csv.gz')
+        except Exception:
+            path.unlink(missing_ok=True)
+            raise
+
+        if 0 < result.row_count <= self.xlsx_max_rows:
+            result.xlsx_path = await self._write_xlsx(result)
+        logger.info(
+            f'Выгружено {result.row_count} строк, {result.byte_count} байт'
+            f'{" (обрезано по ограничению)" if result.truncated else ""}'
+        )
+        return result
+
+
+streaming_exporter = StreamingExporter()
@@ -1,16 +1,7 @@
-from loguru import logger
-
 from .state import GraphState
 
 
 class Conditions:
-    @staticmethod
-    async def check_len_context_chat(state: GraphState) -> str:
-        if state.messages_length >= 45:
-            logger.info('Контекст переполнен, закрываю чат')
-            return 'end'
-        return 'continue'
-
     @staticmethod
     async def classify_routing(state: GraphState) -> str:
         classify = state.message_type
@@ -30,9 +21,9 @@ class Conditions:
         return 'continue'
 
     @staticmethod
-    def check_size_df(state: GraphState):
-        if state.df_len >= 500:
-            state.need_to_optimize = True
+    def check_analytic_result(state: GraphState):
+        if state.error_str:
+            return 'repeat'
+        if state.need_to_optimize:
             return 'need_optimize'
-        state.need_to_optimize = False
-        return 'not_need_optimize'
+        return 'continue'
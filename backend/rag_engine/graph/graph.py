@@ -1,7 +1,8 @@
 from langgraph.constants import START, END
+from langchain_core.messages import AIMessage
 from sqlalchemy.ext.asyncio import AsyncSession
 from langgraph.graph import StateGraph
-from typing import Any
+from typing import Any, AsyncIterator
 
 from .state import GraphState
 from .nodes import Nodes
@@ -15,23 +16,23 @@ class AIGraphDatabase(Nodes, Conditions):
         self.graph = StateGraph(GraphState)
 
         self.graph.add_node('user_input', self.user_input_node)
+        self.graph.add_node('start_turn', self.start_turn_node)
         self.graph.add_node('classify_intent', self.classify_intent_node)
+        self.graph.add_node('retrieve_schema', self.retrieve_schema_node)
+        self.graph.add_node('route_intent', self.route_intent_node)
         self.graph.add_node('data', self.data_node)
         self.graph.add_node('statistics', self.statistics_node)
         self.graph.add_node('generate_sql_for_analytic', self.generate_sql_analytic_node)
         self.graph.add_node('analytic', self.analytic_node)
 
         self.graph.add_edge(START, 'user_input')
+        self.graph.add_edge('user_input', 'start_turn')
+        # Поиск схемы не зависит от намерения, поэтому идет параллельно с классификацией
+        self.graph.add_edge('start_turn', 'classify_intent')
+        self.graph.add_edge('start_turn', 'retrieve_schema')
+        self.graph.add_edge(['classify_intent', 'retrieve_schema'], 'route_intent')
         self.graph.add_conditional_edges(
-            'user_input',
-            self.check_len_context_chat,
-            {
-                'continue': 'classify_intent',
-                'end': END
-            }
-        )
-        self.graph.add_conditional_edges(
-            'classify_intent',
+            'route_intent',
             self.classify_routing,
             {
                 'data': 'data',
@@ -58,42 +59,118 @@ class AIGraphDatabase(Nodes, Conditions):
         )
         self.graph.add_conditional_edges(
             'generate_sql_for_analytic',
-            self.check_to_repeat_sql_generate,
+            self.check_analytic_result,
             {
                 'repeat': 'generate_sql_for_analytic',
-                'continue': 'analytic'
-            }
-        )
-        self.graph.add_conditional_edges(
-            'generate_sql_for_analytic',
-            self.check_size_df,
-            {
                 'need_optimize': 'generate_sql_for_analytic',
-                'not_need_optimize': 'analytic'
+                'continue': 'analytic'
             }
         )
         self.graph.add_edge('analytic', END)
 
         self.ai_graph_database = self.graph.compile(checkpointer=checkpointer)
 
-    async def call(self, input: str, id_session: str, db_session: AsyncSession, vector_manager) -> str:
+    @staticmethod
+    def _turn_input(input: str) -> dict:
+        """
+        Начальные значения полей хода.
+
+        Поля истории диалога (messages, summary, summary_pending, messages_length)
+        не передаются: без редьюсера значение из входа перезаписало бы сохраненное
+        в чекпоинте, и сводка старых сообщений терялась бы на каждом ходе.
+        """
+        return GraphState(current_user_input=input).model_dump(
+            exclude={'messages', 'summary', 'summary_pending', 'messages_length'}
+        )
+
+    async def call(
+            self,
+            input: str,
+            id_session: str,
+            db_session: AsyncSession,
+            vector_manager,
+            sandbox_manager=None
+    ) -> str:
         result = await self.ai_graph_database.ainvoke(
-            GraphState(
-                current_user_input=input
-            ).model_dump(), # type: ignore
+            self._turn_input(input), # type: ignore
             config={
                 'configurable': {
                     'vector_manager': vector_manager,
                     'db_session': db_session,
+                    'sandbox_manager': sandbox_manager,
                     'thread_id': id_session
                 }
             }
         )
-        return result['messages'][-1].content
+        last_message = result['messages'][-1]
+        # Ход без ответа (намерение other) заканчивается сообщением пользователя
+        return last_message.content if isinstance(last_message, AIMessage) else ''
+
+    async def stream(
+            self,
+            input: str,
+            id_session: str,
+            db_session: AsyncSession,
+            vector_manager,
+            sandbox_manager=None
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Выполняет ход диалога, отдавая события по мере выполнения графа.
+
+        События:
+            node - начало и завершение узла графа ({'node', 'status': start | end});
+            token - фрагмент ответа LLM ({'node', 'kind': text | tool_args, 'content'}),
+                структурированные ответы агентов приходят как фрагменты аргументов (tool_args);
+            answer - итоговый ответ хода ({'content'}).
+
+        Закрытие генератора (отключение клиента) отменяет выполнение графа
+        вместе с текущим запросом к LLM.
+
+        Args:
+            input (str): Сообщение пользователя
+            id_session (str): ID диалога
+            db_session (AsyncSession): Сессия БД на время хода
+            vector_manager: Менеджер векторной базы
+            sandbox_manager (optional): Пул для сгенерированного SQL. Defaults to None.
+
+        Yields:
+            tuple[str, dict]: Тип события и данные
+        """
+        config = {
+            'configurable': {
+                'vector_manager': vector_manager,
+                'db_session': db_session,
+                'sandbox_manager': sandbox_manager,
+                'thread_id': id_session
+            }
+        }
+        nodes = set(self.graph.nodes)
+        async for event in self.ai_graph_database.astream_events(
+            self._turn_input(input), # type: ignore
+            config=config, # type: ignore
+            version='v2'
+        ):
+            kind = event['event']
+            node = event.get('metadata', {}).get('langgraph_node')
+            if kind in ('on_chain_start', 'on_chain_end') and event['name'] in nodes and event['name'] == node:
+                yield 'node', {'node': node, 'status': 'start' if kind == 'on_chain_start' else 'end'}
+            elif kind == 'on_chat_model_stream':
+                chunk = event['data']['chunk']
+                if chunk.content:
+                    yield 'token', {'node': node, 'kind': 'text', 'content': chunk.content}
+                for tool_chunk in getattr(chunk, 'tool_call_chunks', None) or []:
+                    if tool_chunk.get('args'):
+                        yield 'token', {'node': node, 'kind': 'tool_args', 'content': tool_chunk['args']}
+
+        state = await self.ai_graph_database.aget_state(config) # type: ignore
+        messages = state.values.get('messages', [])
+        last_message = messages[-1] if messages else None
+        yield 'answer', {'content': last_message.content if isinstance(last_message, AIMessage) else ''}
 
-from langgraph.checkpoint.memory import InMemorySaver
+from ..checkpoint.compaction import create_checkpointer, CheckpointCompactor
 
-checkpointer = InMemorySaver()
+checkpointer = create_checkpointer()
+checkpoint_compactor = CheckpointCompactor(checkpointer)
 ai_graph = AIGraphDatabase(checkpointer=checkpointer)
 
 # @session_manager.connection()
@@ -1,73 +1,150 @@
-import uuid
+import asyncio
+import contextvars
 from langchain_core.runnables import RunnableConfig
 from loguru import logger
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
-import polars as pl
-from pathlib import Path
-from polars import DataFrame
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .state import GraphState
-from ..agent.agents import (
-    create_analytic_agent,
-    create_intent_classifier_agent,
-    create_sql_generate_agent
-)
+from ..export.streaming import streaming_exporter, ExportResult
+from ..export.result import result_store, QueryResult
+from ..sql.explain import PlanEstimate
+from ..sql.validator import sql_validator
+from ...config import config as app_config
+from ...database.session import SandboxSessionManager
+from ..qdrant.sql_cache import sql_cache, CachedSql
+from ..agent.intent_classifier import intent_classifier, IntentPrediction
+from ..agent.context import HistoryContext
+from ..llm.gateway import llm_gateway, LlmGatewayRejected
+from ..llm.registry import model_registry
 
 
 class Nodes:
     def __init__(self):
-        self.agent_intent_classifier = create_intent_classifier_agent()
-        self.agent_sql_generate = create_sql_generate_agent()
-        self.agent_analytic = create_analytic_agent()
+        self.history = HistoryContext(lambda: model_registry.agent('summary'))
+        self._background_tasks: set[asyncio.Task] = set()
+
+    # Агенты общие для всего приложения и создаются реестром при первом обращении
+    @property
+    def agent_intent_classifier(self):
+        return model_registry.agent('intent_classifier')
+
+    @property
+    def agent_sql_generate(self):
+        return model_registry.agent('sql_generate')
+
+    @property
+    def agent_analytic(self):
+        return model_registry.agent('analytic')
     
     @staticmethod
-    async def _get_schema_db_info_for_vector(input: str, config: RunnableConfig) -> str | None:
+    async def _get_schema_db_info_for_vector(
+            input: str,
+            config: RunnableConfig
+    ) -> tuple[str | None, list[float] | None]:
         try:
             vector_manager = config['configurable'].get('vector_manager') # type: ignore
-            structure_store = vector_manager.get_vector_store('structure') # type: ignore
-            sql_info_scheme = await structure_store.asimilarity_search(input)
-            logger.info(f"Найдено {len(sql_info_scheme)} релевантных таблиц")
-            if not sql_info_scheme:
-                return None
+            query_embedding = await vector_manager.embeddings.aembed_query(input) # type: ignore
+        except LlmGatewayRejected:
+            raise
+        except Exception as e:
+            logger.error(f'Ошибка получения эмбеддинга запроса: {e}')
+            return None, None
+        try:
+            points = await vector_manager.search('structure', query_embedding) # type: ignore
+            logger.info(f"Найдено {len(points)} релевантных таблиц")
+            if not points:
+                return None, query_embedding
             schema_info = ""
-            for doc in sql_info_scheme:
+            for point in points:
+                doc = vector_manager.to_document(point) # type: ignore
                 table_name = doc.metadata.get('table_name', 'unknown')
                 schema_info += f"Таблица: {table_name}\n"
                 schema_info += f"Описание: {doc.page_content}\n\n"
-            return schema_info
+            return schema_info, query_embedding
         except Exception as e:
             logger.error(f'Ошибка получения данных из векторки: {e}')
-            return None
+            return None, query_embedding
 
     @staticmethod
-    async def _execute_query_to_df(query: str, config: RunnableConfig) -> DataFrame:
-        db_session: AsyncSession = config['configurable'].get('db_session') # type: ignore
-        logger.info(f"Выполняю sql запрос...{db_session}")
-        df = pl.read_database(query=query, connection=db_session)
-        return df
-
-    async def _write_excel_and_csv_from_sql_data(self, query: str, config: RunnableConfig):
-        df = await self._execute_query_to_df(query, config)
-        excel_dir = Path(__file__).parent.parent.parent.parent / 'files' / 'xlsx'
-        csv_dir = Path(__file__).parent.parent.parent.parent / 'files' / 'csv'
-        excel_dir.mkdir(parents=True, exist_ok=True)
-        csv_dir.mkdir(parents=True, exist_ok=True)
-        excel_filepath = excel_dir / f'query_result_{uuid.uuid4()}.xlsx'
-        csv_filepath = csv_dir / f'query_result_{uuid.uuid4()}.csv'
-        
-        df.write_excel(
-            excel_filepath.as_posix(),
-            worksheet='List1',
-            autofit=True,
-        )
-        df.write_csv(csv_filepath.as_posix())
+    @asynccontextmanager
+    async def _sql_session(config: RunnableConfig, intent: str | None) -> AsyncIterator[AsyncSession]:
+        # Сгенерированный SQL выполняется в песочнице, если она передана, иначе в сессии приложения
+        sandbox_manager: SandboxSessionManager | None = config['configurable'].get('sandbox_manager') # type: ignore
+        if sandbox_manager is None:
+            yield config['configurable'].get('db_session') # type: ignore
+            return
+        async with sandbox_manager.sandbox(intent) as session:
+            yield session
+
+    @staticmethod
+    async def _execute_query(query: str, session: AsyncSession) -> QueryResult:
+        result = await result_store.get(session, query)
+        logger.info(f'Запрос выполнен успешно, получено {result.row_count} записей')
+        return result
+
+    @staticmethod
+    async def _export_sql_data(query: str, session: AsyncSession) -> ExportResult:
+        return await streaming_exporter.export(session, query)
+
+    @staticmethod
+    async def _write_excel_and_csv_from_result(result: QueryResult):
+        export_dir = streaming_exporter.export_dir
+        if 0 < result.row_count <= streaming_exporter.xlsx_max_rows:
+            await result.write(export_dir, 'xlsx')
+        await result.write(export_dir, 'csv')
+
+    @staticmethod
+    async def _validate_sql(query: str, session: AsyncSession, check_rows: bool = True) -> PlanEstimate:
+        return await sql_validator.validate(session, query, check_rows)
+
+    @staticmethod
+    def _need_optimize(rows: int, max_rows: int, optimize_attempt: int) -> bool:
+        if rows <= max_rows:
+            return False
+        if optimize_attempt >= app_config.rag_config.ANALYTIC_MAX_OPTIMIZE_ATTEMPTS:
+            logger.warning(f'Результат ({rows} строк) больше {max_rows}, но попытки уточнения исчерпаны')
+            return False
+        return True
 
-    async def _write_json_from_sql_data(self, query: str, config: RunnableConfig):
-        df = await self._execute_query_to_df(query, config)
-        logger.info(f'Запрос выполнен успешно, получено {len(df)} записей')
-        df_json = df.write_json()
-        return df_json
+    @staticmethod
+    async def _find_cached_sql(
+            question: str,
+            intent: str,
+            config: RunnableConfig,
+            query_embedding: list[float] | None = None
+    ) -> CachedSql | None:
+        try:
+            vector_manager = config['configurable'].get('vector_manager') # type: ignore
+            db_session: AsyncSession = config['configurable'].get('db_session') # type: ignore
+            return await sql_cache.lookup(
+                vector_manager, db_session.bind, question, intent, query_embedding # type: ignore
+            )
+        except Exception as e:
+            logger.error(f'Ошибка поиска в кэше SQL: {e}')
+            return None
+
+    @staticmethod
+    async def _store_cached_sql(
+            question: str,
+            intent: str,
+            schema_info: str | None,
+            sql_query: str,
+            row_count: int,
+            config: RunnableConfig,
+            query_embedding: list[float] | None = None
+    ):
+        try:
+            vector_manager = config['configurable'].get('vector_manager') # type: ignore
+            db_session: AsyncSession = config['configurable'].get('db_session') # type: ignore
+            await sql_cache.store(
+                vector_manager, db_session.bind, question, intent, schema_info, sql_query, row_count, # type: ignore
+                query_embedding
+            )
+        except Exception as e:
+            logger.error(f'Ошибка сохранения в кэш SQL: {e}')
 
     async def _generate_sql_and_execute(
             self,
@@ -75,13 +152,37 @@ class Nodes:
             error_attempt: int,
             config: RunnableConfig,
             need_write: bool = False,
+            need_stream: bool = False,
             need_return_df: bool = False,
             output_messages: list[BaseMessage] | None = None,
+            question: str | None = None,
+            intent: str | None = None,
+            schema_info: str | None = None,
+            query_embedding: list[float] | None = None,
+            max_rows: int | None = None,
+            optimize_attempt: int = 0,
     ) -> dict:
+        cached = None
+        sql_query = None
         try:
-            result = await self.agent_sql_generate.ainvoke({'messages': input_messages}) # type: ignore
-            sql_query = result['structured_response'].sql_query
-            logger.info(f'Сгенерированный SQL: {sql_query}')
+            # При уточнении слишком большого запроса кэш вернул бы тот же запрос
+            if question and intent and not error_attempt and not optimize_attempt:
+                cached = await self._find_cached_sql(question, intent, config, query_embedding)
+            if cached and cached.reusable:
+                sql_query = cached.sql_query
+                logger.info(f'SQL взят из кэша без обращения к LLM: {sql_query}')
+            else:
+                if cached:
+                    input_messages = [
+                        *input_messages,
+                        SystemMessage(content=f'Для похожего вопроса ({cached.question}) '
+                                              f'был выполнен запрос: {cached.sql_query}. '
+                                              f'Адаптируй его под текущий вопрос, если он подходит')
+                    ]
+                    cached = None
+                result = await self.agent_sql_generate.ainvoke({'messages': input_messages}) # type: ignore
+                sql_query = result['structured_response'].sql_query
+                logger.info(f'Сгенерированный SQL: {sql_query}')
             response = {
                 'sql_query': sql_query,
                 'error_str': None,
@@ -89,16 +190,79 @@ class Nodes:
             }
             if output_messages:
                 response['messages'] = output_messages
-            if need_write:
-                await self._write_excel_and_csv_from_sql_data(sql_query, config)
-            if need_return_df:
-                json_df = await self._write_json_from_sql_data(sql_query, config)
-                response['df'] = json_df
+            row_count = 0
+            query_result = None
+            async with self._sql_session(config, intent) as sql_session:
+                # Ошибки и заведомо тяжелые запросы отсекаются EXPLAIN до выполнения
+                estimate = await self._validate_sql(sql_query, sql_session, check_rows=not need_stream)
+                if need_stream:
+                    export = await self._export_sql_data(sql_query, sql_session)
+                    row_count = export.row_count
+                    if export.truncated:
+                        response['messages'] = [
+                            *response.get('messages', []),
+                            AIMessage(content=f'Результат слишком большой, в файл выгружено только {row_count} строк')
+                        ]
+                if need_write or need_return_df:
+                    if max_rows is not None:
+                        # Оценка планировщика может ошибаться на порядки (соединения, GROUP BY),
+                        # поэтому без выполнения отсекаются только запросы с оценкой намного больше лимита
+                        estimated_rows = estimate.rows
+                        response['estimated_rows'] = estimated_rows
+                        block_rows = max_rows * app_config.rag_config.ANALYTIC_ESTIMATE_BLOCK_FACTOR
+                        if estimated_rows > block_rows and self._need_optimize(
+                                estimated_rows, max_rows, optimize_attempt
+                        ):
+                            logger.info(
+                                f'Оценка результата {estimated_rows} строк больше {max_rows}, запрос не выполняется'
+                            )
+                            return {
+                                **response,
+                                'df_len': estimated_rows,
+                                'need_to_optimize': True,
+                                'optimize_attempt': optimize_attempt + 1,
+                            }
+                    # Запрос выполняется один раз, все представления строятся из одного результата
+                    query_result = await self._execute_query(sql_query, sql_session)
+
+            if query_result is not None:
+                row_count = query_result.row_count
+                if max_rows is not None:
+                    response['df_len'] = row_count
+                    logger.info(
+                        f'Размер результата: оценка {response["estimated_rows"]}, факт {row_count}, '
+                        f'попыток уточнения {optimize_attempt}'
+                    )
+                    if self._need_optimize(row_count, max_rows, optimize_attempt):
+                        return {
+                            **response,
+                            'need_to_optimize': True,
+                            'optimize_attempt': optimize_attempt + 1,
+                        }
+                    response['need_to_optimize'] = False
+                if need_write:
+                    await self._write_excel_and_csv_from_result(query_result)
+                    if query_result.truncated:
+                        response['messages'] = [
+                            *response.get('messages', []),
+                            AIMessage(content=f'Результат слишком большой, в файл записано только {row_count} строк')
+                        ]
+                if need_return_df:
+                    response['df'] = await query_result.digest()
 
+            if question and intent and not cached:
+                await self._store_cached_sql(
+                    question, intent, schema_info, sql_query, row_count, config, query_embedding
+                )
             return response
 
+        except LlmGatewayRejected:
+            # Перегрузка LLM не исправляется повторной генерацией
+            raise
         except Exception as e:
             logger.error(f'Ошибка генерации SQL: {e}')
+            if cached:
+                await sql_cache.evict(config['configurable'].get('vector_manager'), cached.point_id) # type: ignore
             if error_attempt >= 3:
                 return {
                     'messages': [AIMessage(content='Извините, произошла ошибка при формировании запроса.')],
@@ -106,28 +270,85 @@ class Nodes:
                     'error_attempt': 0,
                 }
             return {
+                'sql_query': sql_query,
                 'error_str': str(e),
-                'error_attempt': error_attempt + 1
+                'error_attempt': error_attempt + 1,
+                'need_to_optimize': False,
             }
 
+    async def user_input_node(self, state: GraphState, config: RunnableConfig) -> dict:
+        update = await self.history.update(
+            thread_id=config['configurable']['thread_id'], # type: ignore
+            messages=state.messages,
+            summary=state.summary,
+            pending=state.summary_pending,
+            user_input=state.current_user_input,
+        )
+        # Сводка результата прошлого хода в чекпоинте больше не нужна
+        update['df'] = None
+        return update
+
+    def _history(self, state: GraphState) -> list[BaseMessage]:
+        # Последнее сообщение окна - текущий вопрос, он добавляется в промпт отдельно
+        return self.history.render(state.summary, state.summary_pending, state.messages[:-1])
+
+    async def _classify_intent_with_llm(self, current_user_input: str) -> str:
+        result = await self.agent_intent_classifier.ainvoke({'messages': [HumanMessage(content=current_user_input)]})
+        return result['structured_response'].intent_type
+
+    async def _sample_fast_intent(self, current_user_input: str, prediction: IntentPrediction):
+        try:
+            # Перепроверка не нужна для ответа и не должна занимать слоты диалога
+            with llm_gateway.use_class('batch'):
+                llm_intent = await self._classify_intent_with_llm(current_user_input)
+            intent_classifier.record_comparison(prediction, llm_intent)
+        except Exception as e:
+            logger.error(f'Ошибка перепроверки классификации: {e}')
+
     @staticmethod
-    async def user_input_node(state: GraphState) -> dict:
-        dialog_messages = [m for m in state.messages if isinstance(m, (HumanMessage, AIMessage))]
-        messages_length = len(dialog_messages)
-        logger.info(f'Сообщений: {messages_length}')
+    async def start_turn_node(state: GraphState) -> dict:
+        # Точка ветвления: классификация и поиск схемы выполняются параллельно
+        return {}
+
+    async def retrieve_schema_node(self, state: GraphState, config: RunnableConfig) -> dict:
+        schema_info, query_embedding = await self._get_schema_db_info_for_vector(state.current_user_input, config)
         return {
-            'messages_length': messages_length
+            'schema_info': schema_info,
+            'query_embedding': query_embedding
         }
 
-    async def classify_intent_node(self, state: GraphState) -> dict:
+    @staticmethod
+    async def route_intent_node(state: GraphState) -> dict:
+        # Точка слияния: дожидается классификации и поиска схемы
+        return {}
+
+    async def classify_intent_node(self, state: GraphState, config: RunnableConfig) -> dict:
         current_user_input = state.current_user_input
         try:
-            result = await self.agent_intent_classifier.ainvoke({'messages': [HumanMessage(content=current_user_input)]})
-            intent = result['structured_response']
-            logger.info(f'Определено намерение: {intent.intent_type}')
+            vector_manager = config['configurable'].get('vector_manager') # type: ignore
+            embeddings = vector_manager.embeddings if vector_manager else None
+            prediction = await intent_classifier.predict(current_user_input, embeddings)
+            if intent_classifier.accept(prediction):
+                logger.info(f'Определено намерение без LLM: {prediction.intent_type} ({prediction.confidence:.2f})')
+                if intent_classifier.should_sample():
+                    # Пустой контекст: проверочный вызов LLM не должен попадать в поток событий хода
+                    task = asyncio.create_task(
+                        self._sample_fast_intent(current_user_input, prediction),
+                        context=contextvars.Context(),
+                    )
+                    self._background_tasks.add(task)
+                    task.add_done_callback(self._background_tasks.discard)
+                return {
+                    'message_type': prediction.intent_type
+                }
+
+            intent_type = await self._classify_intent_with_llm(current_user_input)
+            logger.info(f'Определено намерение: {intent_type}')
             return {
-                'message_type': intent.intent_type
+                'message_type': intent_type
             }
+        except LlmGatewayRejected:
+            raise
         except Exception as e:
             logger.error(f'Ошибка классификации: {e}')
             return {
@@ -139,26 +360,33 @@ class Nodes:
         error_str = state.error_str
         error_attempt = state.error_attempt
 
-        schema_info = await self._get_schema_db_info_for_vector(current_user_input, config)
+        schema_info = state.schema_info
         logger.info('Создаю sql запрос...')
         if not error_str:
             messages = [
                 SystemMessage(content=f'Сейчас будет запрос на получение данных, вот структура базы: {schema_info}'),
+                *self._history(state),
                 HumanMessage(content=current_user_input)
             ]
         else:
             messages = [
                 SystemMessage(
                     content=f'Ошибка предыдущего запроса({current_user_input}).'
-                            f'Исправь ошибку с учетом структуры БД: {error_str}')
+                            f'Запрос: {state.sql_query}. '
+                            f'Исправь ошибку с учетом структуры БД: {error_str}\n'
+                            f'Структура базы: {schema_info}')
             ]
 
         answer = await self._generate_sql_and_execute(
             input_messages=messages, # type: ignore
-            output_messages=[AIMessage(content='Ваш запрос на получение данных был выполнен и записан в excel файл')],
+            output_messages=[AIMessage(content='Ваш запрос на получение данных был выполнен и записан в файл')],
             error_attempt=error_attempt,
             config=config,
-            need_write=True
+            need_stream=True,
+            question=current_user_input,
+            intent='data',
+            schema_info=schema_info,
+            query_embedding=state.query_embedding,
         )
         return answer
 
@@ -167,28 +395,35 @@ class Nodes:
         error_str = state.error_str
         error_attempt = state.error_attempt
 
-        schema_info = await self._get_schema_db_info_for_vector(current_user_input, config)
+        schema_info = state.schema_info
         logger.info('Создаю sql запрос...')
         if not error_str:
             messages = [
                 SystemMessage(
                     content=f'Сейчас будет запрос на получение статистики, вот структура базы: {schema_info}'),
+                *self._history(state),
                 HumanMessage(content=current_user_input)
             ]
         else:
             messages = [
                 SystemMessage(
                     content=f'Ошибка предыдущего запроса({current_user_input}).'
-                            f'Исправь ошибку с учетом структуры БД: {error_str}')
+                            f'Запрос: {state.sql_query}. '
+                            f'Исправь ошибку с учетом структуры БД: {error_str}\n'
+                            f'Структура базы: {schema_info}')
             ]
 
         answer = await self._generate_sql_and_execute(
             input_messages=messages, # type: ignore
             output_messages=[
-                AIMessage(content='Ваш запрос на получение статистики был выполнен и записан в excel файл')],
+                AIMessage(content='Ваш запрос на получение статистики был выполнен и записан в файл')],
             error_attempt=error_attempt,
             need_write=True,
             config=config,
+            question=current_user_input,
+            intent='statistics',
+            schema_info=schema_info,
+            query_embedding=state.query_embedding,
         )
         return answer
 
@@ -198,31 +433,44 @@ class Nodes:
         error_attempt = state.error_attempt
         need_to_optimize = state.need_to_optimize
         df_len = state.df_len
+        max_rows = app_config.rag_config.ANALYTIC_MAX_ROWS
 
-        schema_info = await self._get_schema_db_info_for_vector(current_user_input, config)
+        schema_info = state.schema_info
         logger.info('Создаю sql запрос...')
-        if not error_str:
+        if need_to_optimize:
             messages = [
-                SystemMessage(content=f'Сейчас будет запрос на аналитику, вот структура базы: {schema_info}'),
-                HumanMessage(content=current_user_input)
+                SystemMessage(
+                    content=f'Предыдущий SQL запрос({state.sql_query}) вернул слишком много данных: {df_len} строк '
+                            f'при допустимых {max_rows}. Сделай более точный запрос по вопросу пользователя '
+                            f'({current_user_input}): добавь фильтры или агрегируй данные (GROUP BY), '
+                            f'чтобы результат был не больше {max_rows} строк.\n'
+                            f'Структура базы: {schema_info}')
             ]
-        elif need_to_optimize:
+        elif not error_str:
             messages = [
-                SystemMessage(
-                    content=f'Предыдущий SQL запрос({state.sql_query}) вернул слишком много данных: {df_len}.'
-                            f'Улучши или сделай более точный запрос')
+                SystemMessage(content=f'Сейчас будет запрос на аналитику, вот структура базы: {schema_info}'),
+                *self._history(state),
+                HumanMessage(content=current_user_input)
             ]
         else:
             messages = [
                 SystemMessage(
                     content=f'Ошибка предыдущего запроса({current_user_input}).'
-                            f'Исправь ошибку с учетом структуры БД: {error_str}')
+                            f'Запрос: {state.sql_query}. '
+                            f'Исправь ошибку с учетом структуры БД: {error_str}\n'
+                            f'Структура базы: {schema_info}')
             ]
         answer = await self._generate_sql_and_execute(
             input_messages=messages, # type: ignore
             error_attempt=error_attempt,
             need_return_df=True,
-            config=config
+            config=config,
+            question=current_user_input,
+            intent='analytics',
+            schema_info=schema_info,
+            query_embedding=state.query_embedding,
+            max_rows=max_rows,
+            optimize_attempt=state.optimize_attempt,
         )
         return answer
 
@@ -231,11 +479,16 @@ class Nodes:
         df = state.df
         try:
             result = await self.agent_analytic.ainvoke(
-                {'messages': [SystemMessage(content=f'Напиши аналитику по запросу пользователя '
-                                                    f'на sql запросу {sql_query} на эти данные {df}')]}
+                {'messages': [
+                    *self._history(state),
+                    SystemMessage(content=f'Напиши аналитику по запросу пользователя ({state.current_user_input}) '
+                                          f'на sql запросу {sql_query} по сводке его результата:\n{df}')
+                ]}
             )
             answer = result['structured_response'].answer
             return {'messages': [AIMessage(content=answer)]}
+        except LlmGatewayRejected:
+            raise
         except Exception as e:
             logger.error(str(e))
             error_message = AIMessage(
@@ -8,10 +8,16 @@ class GraphState(BaseModel):
     messages: Annotated[list[BaseMessage], add_messages] = []
     message_type: str | None = None
     messages_length: int = 0
+    summary: str | None = None
+    summary_pending: list[str] = []
     current_user_input: str
+    schema_info: str | None = None
+    query_embedding: list[float] | None = None
     sql_query: str | None = None
     error_str: str | None = None
     error_attempt: int = 0
     df_len: int = 0
+    estimated_rows: int | None = None
     need_to_optimize: bool = False
+    optimize_attempt: int = 0
     df: str | None = None
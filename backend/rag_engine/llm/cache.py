@@ -0,0 +1,351 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+from langchain_core.messages import BaseMessage
+from loguru import logger
+from pydantic import BaseModel
+
+from ...config import config
+
+LLM_CACHE_BACKENDS = ('memory', 'redis', 'none')
+
+
+class MemoryLlmStore:
+    """
+    Хранилище ответов в памяти процесса: LRU с временем жизни записей.
+
+    Attributes:
+        max_items (int): Максимальное число записей, давно не использованные вытесняются
+    """
+    def __init__(self, max_items: int = config.rag_config.LLM_CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        # ключ -> (время истечения по time.monotonic, ответ, время вычисления ответа)
+        self._items: OrderedDict[str, tuple[float, bytes, float]] = OrderedDict()
+
+    @property
+    def size(self) -> int:
+        return len(self._items)
+
+    async def get(self, key: str) -> tuple[bytes, float] | None:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, value, latency = item
+        if expires <= time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value, latency
+
+    async def set(self, key: str, value: bytes, latency: float, ttl: float):
+        self._items[key] = (time.monotonic() + ttl, value, latency)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    async def close(self):
+        self._items.clear()
+
+
+class RedisLlmStore:
+    """
+    Хранилище ответов в Redis, общее для всех воркеров. Время жизни записей
+    задается через EXPIRE, вытеснение - политикой maxmemory самого Redis.
+
+    Требует пакет redis (pip install redis).
+
+    Attributes:
+        prefix (str): Префикс ключей кэша
+    """
+    def __init__(
+            self,
+            host: str = config.rag_config.REDIS_HOST,
+            port: int = config.rag_config.REDIS_PORT,
+            password: str | None = config.rag_config.REDIS_PASSWORD,
+            db: int = config.rag_config.REDIS_DB,
+            prefix: str = 'llm:',
+    ):
+        try:
+            from redis.asyncio import Redis
+        except ImportError as e:
+            raise RuntimeError('Для кэша ответов LLM в Redis установите пакет redis') from e
+        self.prefix = prefix
+        self._redis = Redis(host=host, port=port, password=password, db=db)
+
+    @property
+    def size(self) -> int | None:
+        return None
+
+    async def get(self, key: str) -> tuple[bytes, float] | None:
+        value, latency = await self._redis.hmget(self.prefix + key, 'value', 'latency')
+        if value is None:
+            return None
+        return value, float(latency)
+
+    async def set(self, key: str, value: bytes, latency: float, ttl: float):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.prefix + key, mapping={'value': value, 'latency': latency})
+            pipe.expire(self.prefix + key, max(int(ttl), 1))
+            await pipe.execute()
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def create_llm_store(
+        backend: str = config.rag_config.LLM_CACHE_BACKEND,
+) -> MemoryLlmStore | RedisLlmStore | None:
+    """
+    Создает хранилище кэша ответов LLM.
+
+    Args:
+        backend (str, optional): memory - в памяти процесса, redis - в Redis (общее для всех воркеров),
+            none - кэш выключен. Defaults to config.rag_config.LLM_CACHE_BACKEND.
+
+    Returns:
+        MemoryLlmStore | RedisLlmStore | None: Хранилище или None, если кэш выключен
+    """
+    if backend == 'memory':
+        return MemoryLlmStore()
+    if backend == 'redis':
+        return RedisLlmStore()
+    if backend == 'none':
+        return None
+    raise ValueError(f'Неизвестное хранилище кэша ответов LLM: {backend}. Доступны: {LLM_CACHE_BACKENDS}')
+
+
+class _AgentStats:
+    """Счетчики кэша одного агента"""
+    def __init__(self):
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.errors = 0
+        self.saved = 0.0
+        self.spent = 0.0
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.coalesced + self.misses
+        return {
+            'hits': self.hits,
+            'coalesced': self.coalesced,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': (self.hits + self.coalesced) / total if total else 0.0,
+            'latency_saved': self.saved,
+            'latency_avg': self.spent / self.misses if self.misses else 0.0,
+        }
+
+
+class LlmResponseCache:
+    """
+    Кэш ответов агентов по точному совпадению запроса.
+
+    Ключ - хэш (модель, хэш системного промпта, нормализованные сообщения).
+    Повторный запрос в течение времени жизни записи возвращает сохраненный
+    ответ без обращения к LLM. Одинаковые запросы, пришедшие одновременно,
+    ждут один вызов модели. Ошибки хранилища логируются и считаются промахом:
+    запрос уходит в модель. Ошибки модели не кэшируются.
+
+    Хранится только структурированный ответ агента в JSON, при попадании он
+    собирается заново схемой ответа агента.
+
+    Attributes:
+        store (MemoryLlmStore | RedisLlmStore | None): Хранилище ответов (None - кэш выключен)
+
+    Args:
+        store (MemoryLlmStore | RedisLlmStore | None): Хранилище ответов
+    """
+    def __init__(self, store: MemoryLlmStore | RedisLlmStore | None):
+        self.store = store
+        self._agents: dict[str, _AgentStats] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает долю попаданий и сэкономленное время (в секундах) по агентам"""
+        return {
+            'backend': type(self.store).__name__ if self.store else None,
+            'size': self.store.size if self.store else 0,
+            'agents': {name: agent.stats for name, agent in self._agents.items()},
+        }
+
+    @staticmethod
+    def _normalize(message: Any) -> list[str]:
+        """Приводит сообщение к паре (роль, текст) без лишних пробелов"""
+        if isinstance(message, BaseMessage):
+            role, content = message.type, message.content
+        elif isinstance(message, dict):
+            role, content = message.get('role', 'user'), message.get('content', '')
+        elif isinstance(message, (tuple, list)):
+            role, content = message
+        else:
+            role, content = 'human', message
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+        return [str(role), ' '.join(content.split())]
+
+    @classmethod
+    def key(cls, model: str, system_prompt: str, messages: list) -> str:
+        """
+        Возвращает ключ кэша запроса.
+
+        Args:
+            model (str): Модель и параметры генерации
+            system_prompt (str): Системный промпт агента
+            messages (list): Сообщения запроса
+        """
+        prompt_hash = hashlib.sha256(system_prompt.encode()).hexdigest()
+        payload = json.dumps(
+            [model, prompt_hash, [cls._normalize(message) for message in messages]],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def _get(self, stats: _AgentStats, key: str) -> tuple[bytes, float] | None:
+        try:
+            return await self.store.get(key)
+        except Exception as e:
+            stats.errors += 1
+            logger.warning(f'Ошибка чтения кэша ответов LLM: {e}')
+            return None
+
+    async def _set(self, stats: _AgentStats, key: str, value: bytes, latency: float, ttl: float):
+        try:
+            await self.store.set(key, value, latency, ttl)
+        except Exception as e:
+            stats.errors += 1
+            logger.warning(f'Ошибка записи кэша ответов LLM: {e}')
+
+    async def get_or_call(
+            self,
+            agent: str,
+            key: str,
+            ttl: float,
+            scheme: type[BaseModel],
+            call: Callable[[], Awaitable[BaseModel]],
+    ) -> BaseModel:
+        """
+        Возвращает структурированный ответ из кэша или вызывает модель и сохраняет ответ.
+
+        Args:
+            agent (str): Название агента (для метрик)
+            key (str): Ключ запроса
+            ttl (float): Время жизни записи в секундах (0 - без кэша)
+            scheme (type[BaseModel]): Схема ответа агента
+            call (Callable): Вызов модели, возвращающий ответ по схеме
+        """
+        if self.store is None or ttl <= 0:
+            return await call()
+        stats = self._agents.setdefault(agent, _AgentStats())
+
+        cached = await self._get(stats, key)
+        if cached is not None:
+            value, latency = cached
+            stats.hits += 1
+            stats.saved += latency
+            return scheme.model_validate_json(value)
+
+        leader = self._inflight.get(key)
+        if leader is not None:
+            try:
+                value, latency = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                # Отменен вызов, который ждали, а не текущий - идем в модель сами
+                if not leader.cancelled():
+                    raise
+            else:
+                stats.coalesced += 1
+                stats.saved += latency
+                return scheme.model_validate_json(value)
+
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        started = time.perf_counter()
+        try:
+            result = await call()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Ожидающих может не быть: исключение считается полученным
+                future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+        latency = time.perf_counter() - started
+        value = result.model_dump_json().encode()
+        future.set_result((value, latency))
+        stats.misses += 1
+        stats.spent += latency
+        await self._set(stats, key, value, latency, ttl)
+        return result
+
+    async def close(self):
+        """Закрывает хранилище"""
+        if self.store is not None:
+            await self.store.close()
+            logger.info(f'Кэш ответов LLM закрыт: {self.stats}')
+
+
+class CachedAgent:
+    """
+    Агент, вызовы ainvoke которого проходят через кэш ответов.
+
+    При попадании в кэш ответ содержит входные сообщения и structured_response,
+    но не промежуточные сообщения модели. Остальные методы делегируются
+    исходному агенту без кэша.
+
+    Attributes:
+        name (str): Название агента
+        agent: Исходный агент (create_agent)
+        cache (LlmResponseCache): Кэш ответов
+        model (str): Модель и параметры генерации, входят в ключ
+        system_prompt (str): Системный промпт агента, входит в ключ
+        scheme (type[BaseModel]): Схема структурированного ответа агента
+        ttl (float): Время жизни ответов агента в секундах
+    """
+    def __init__(
+            self,
+            name: str,
+            agent: Any,
+            cache: LlmResponseCache,
+            model: str,
+            system_prompt: str,
+            scheme: type[BaseModel],
+            ttl: float,
+    ):
+        self.name = name
+        self.agent = agent
+        self.cache = cache
+        self.model = model
+        self.system_prompt = system_prompt
+        self.scheme = scheme
+        self.ttl = ttl
+
+    async def ainvoke(self, input: dict, config: Any = None, **kwargs: Any) -> dict:
+        messages = input.get('messages', [])
+        key = self.cache.key(self.model, self.system_prompt, messages)
+        result = None
+
+        async def call() -> BaseModel:
+            nonlocal result
+            result = await self.agent.ainvoke(input, config, **kwargs)
+            return result['structured_response']
+
+        structured = await self.cache.get_or_call(self.name, key, self.ttl, self.scheme, call)
+        if result is not None:
+            return result
+        return {'messages': list(messages), 'structured_response': structured}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.agent, name)
+
+
+llm_cache = LlmResponseCache(create_llm_store())
@@ -0,0 +1,254 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Literal
+from loguru import logger
+
+from ...config import config
+
+LlmClass = Literal['interactive', 'embeddings', 'batch']
+
+# Класс, навязанный вызывающим кодом (например, индексация вместо embeddings)
+_class_override: ContextVar[str | None] = ContextVar('llm_class_override', default=None)
+
+
+class LlmGatewayRejected(RuntimeError):
+    """
+    Запрос к LLM не принят шлюзом.
+
+    Attributes:
+        llm_class (str): Класс запроса
+        status_code (int): HTTP код для клиента: 429 - очередь заполнена, 503 - не дождался слота
+        retry_after (int | None): Рекомендуемая пауза перед повтором в секундах
+    """
+    def __init__(self, llm_class: str, status_code: int, detail: str, retry_after: int | None = None):
+        super().__init__(detail)
+        self.llm_class = llm_class
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _ClassState:
+    """Лимиты, очередь и счетчики одного класса запросов"""
+    # Вес последнего замера в скользящем среднем времени выполнения
+    _RUN_ALPHA = 0.2
+
+    def __init__(self, name: str, priority: int, concurrency: int, max_queue: int, deadline: float):
+        self.name = name
+        self.priority = priority
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_avg = 0.0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'priority': self.priority,
+            'concurrency': self.concurrency,
+            'max_queue': self.max_queue,
+            'deadline': self.deadline,
+            'active': self.active,
+            'queued': len(self.waiters),
+            'admitted': self.admitted,
+            'rejected_full': self.rejected_full,
+            'rejected_deadline': self.rejected_deadline,
+            'wait_avg': self.wait_total / self.admitted if self.admitted else 0.0,
+            'wait_max': self.wait_max,
+            'run_avg': self.run_avg,
+        }
+
+    def record_run(self, run: float):
+        self.run_avg = run if not self.run_avg else self.run_avg + self._RUN_ALPHA * (run - self.run_avg)
+
+
+class LlmGateway:
+    """
+    Единая точка допуска запросов к Ollama.
+
+    Все вызовы моделей (агенты графа, эмбеддинги, описание схемы) занимают слот
+    шлюза. Слоты ограничены общим лимитом и лимитом класса запроса. Освободившийся
+    слот получает ожидающий запрос самого приоритетного класса, у которого есть
+    свободный лимит; внутри класса - в порядке очереди. Классы по убыванию
+    приоритета: interactive (диалог), embeddings, batch (описание схемы,
+    индексация, фоновые сводки).
+
+    Запрос отклоняется сразу, если очередь класса заполнена (429), и по истечении
+    срока ожидания в очереди (503). Метод check позволяет отклонить запрос
+    до начала работы, если по текущей очереди слот не освободится в срок.
+
+    Attributes:
+        max_concurrency (int): Общий лимит одновременных запросов
+        active (int): Число занятых слотов
+
+    Args:
+        max_concurrency (int, optional): Общий лимит. Defaults to config.rag_config.LLM_MAX_CONCURRENCY.
+        classes (dict[str, tuple[int, int, float]] | None, optional): Лимиты классов в порядке убывания
+            приоритета: класс -> (concurrency, max_queue, deadline). Defaults to None (из конфига).
+    """
+    def __init__(
+            self,
+            max_concurrency: int = config.rag_config.LLM_MAX_CONCURRENCY,
+            classes: dict[str, tuple[int, int, float]] | None = None,
+    ):
+        if classes is None:
+            classes = {
+                'interactive': (
+                    config.rag_config.LLM_INTERACTIVE_CONCURRENCY,
+                    config.rag_config.LLM_INTERACTIVE_MAX_QUEUE,
+                    config.rag_config.LLM_INTERACTIVE_DEADLINE,
+                ),
+                'embeddings': (
+                    config.rag_config.LLM_EMBEDDINGS_CONCURRENCY,
+                    config.rag_config.LLM_EMBEDDINGS_MAX_QUEUE,
+                    config.rag_config.LLM_EMBEDDINGS_DEADLINE,
+                ),
+                'batch': (
+                    config.rag_config.LLM_BATCH_CONCURRENCY,
+                    config.rag_config.LLM_BATCH_MAX_QUEUE,
+                    config.rag_config.LLM_BATCH_DEADLINE,
+                ),
+            }
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self._classes: dict[str, _ClassState] = {
+            name: _ClassState(name, priority, *limits)
+            for priority, (name, limits) in enumerate(classes.items())
+        }
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает занятые слоты, глубину очередей и время ожидания по классам"""
+        return {
+            'max_concurrency': self.max_concurrency,
+            'active': self.active,
+            'classes': {name: state.stats for name, state in self._classes.items()},
+        }
+
+    @staticmethod
+    @contextmanager
+    def use_class(llm_class: LlmClass) -> Iterator[None]:
+        """Выполняет вложенные вызовы моделей в указанном классе (например, индексацию как batch)"""
+        token = _class_override.set(llm_class)
+        try:
+            yield
+        finally:
+            _class_override.reset(token)
+
+    def _state(self, llm_class: str) -> _ClassState:
+        return self._classes[_class_override.get() or llm_class]
+
+    def _can_run(self, state: _ClassState) -> bool:
+        return self.active < self.max_concurrency and state.active < state.concurrency
+
+    def _dispatch(self):
+        """Раздает свободные слоты ожидающим запросам в порядке приоритета классов"""
+        for state in self._classes.values():
+            while state.waiters and self._can_run(state):
+                future = state.waiters.popleft()
+                if future.done():
+                    continue
+                state.active += 1
+                self.active += 1
+                future.set_result(None)
+
+    @staticmethod
+    def _abandon(state: _ClassState, future: asyncio.Future):
+        """Убирает из очереди запрос, который перестал ждать"""
+        future.cancel()
+        if future in state.waiters:
+            state.waiters.remove(future)
+
+    def _release(self, state: _ClassState):
+        state.active -= 1
+        self.active -= 1
+        self._dispatch()
+
+    def estimate_wait(self, llm_class: LlmClass) -> float:
+        """Оценивает ожидание слота новым запросом класса по очереди и среднему времени выполнения"""
+        state = self._state(llm_class)
+        if self._can_run(state) and not state.waiters:
+            return 0.0
+        return (len(state.waiters) + 1) / state.concurrency * state.run_avg
+
+    def _reject(self, state: _ClassState, status_code: int, detail: str, retry_after: float) -> LlmGatewayRejected:
+        if status_code == 429:
+            state.rejected_full += 1
+        else:
+            state.rejected_deadline += 1
+        logger.warning(f'Шлюз LLM отклонил запрос класса {state.name}: {detail}')
+        return LlmGatewayRejected(state.name, status_code, detail, max(math.ceil(retry_after), 1))
+
+    def check(self, llm_class: LlmClass):
+        """
+        Проверяет, будет ли запрос класса принят, до начала работы.
+
+        Raises:
+            LlmGatewayRejected: 429, если очередь заполнена; 503, если по оценке
+                слот не освободится за срок ожидания класса
+        """
+        state = self._state(llm_class)
+        if len(state.waiters) >= state.max_queue:
+            raise self._reject(state, 429, f'очередь заполнена ({state.max_queue})', state.run_avg)
+        wait = self.estimate_wait(llm_class)
+        if wait > state.deadline:
+            raise self._reject(state, 503, f'ожидаемое ожидание {wait:.1f} сек больше {state.deadline} сек', wait)
+
+    @asynccontextmanager
+    async def slot(self, llm_class: LlmClass) -> AsyncIterator[None]:
+        """
+        Занимает слот на время запроса к модели.
+
+        Args:
+            llm_class (str): Класс запроса (interactive, embeddings, batch)
+
+        Raises:
+            LlmGatewayRejected: Если очередь заполнена или слот не освободился за срок ожидания
+        """
+        state = self._state(llm_class)
+        if len(state.waiters) >= state.max_queue:
+            raise self._reject(state, 429, f'очередь заполнена ({state.max_queue})', state.run_avg)
+
+        submitted = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append(future)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=state.deadline)
+        except asyncio.TimeoutError:
+            # Слот мог быть выдан одновременно с таймаутом
+            if not future.done():
+                self._abandon(state, future)
+                raise self._reject(
+                    state, 503, f'слот не освободился за {state.deadline} сек', state.run_avg
+                ) from None
+        except asyncio.CancelledError:
+            if future.done():
+                self._release(state)
+            else:
+                self._abandon(state, future)
+            raise
+
+        wait = time.perf_counter() - submitted
+        state.admitted += 1
+        state.wait_total += wait
+        state.wait_max = max(state.wait_max, wait)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            state.record_run(time.perf_counter() - started)
+            self._release(state)
+
+
+llm_gateway = LlmGateway()
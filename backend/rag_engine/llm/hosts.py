@@ -0,0 +1,223 @@
+import json
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Literal
+from loguru import logger
+
+from ...config import config
+
+HostGroup = Literal['generate', 'embed']
+HOST_GROUPS = ('generate', 'embed')
+
+
+def _model_key(model: str) -> str:
+    """Приводит имя модели Ollama к виду с тегом (model -> model:latest)"""
+    return model if ':' in model else f'{model}:latest'
+
+
+class OllamaHost:
+    """
+    Хост Ollama в пуле.
+
+    Attributes:
+        url (str): Адрес хоста
+        weight (float): Вес хоста (доля нагрузки относительно других)
+        models (set[str] | None): Доступные модели (None - любые)
+        groups (set[str]): Группы запросов, которые обслуживает хост (generate, embed)
+        outstanding (int): Число выполняющихся запросов
+        failures (int): Число ошибок подряд
+        ejected_until (float): Время (time.monotonic), до которого хост исключен
+    """
+    def __init__(
+            self,
+            url: str,
+            weight: float = 1,
+            models: list[str] | None = None,
+            groups: list[str] | None = None,
+    ):
+        if weight <= 0:
+            raise ValueError(f'Вес хоста {url} должен быть больше 0')
+        unknown = set(groups or ()) - set(HOST_GROUPS)
+        if unknown:
+            raise ValueError(f'Неизвестные группы хоста {url}: {unknown}. Доступны: {HOST_GROUPS}')
+        self.url = url.rstrip('/')
+        self.weight = weight
+        self.models = {_model_key(model) for model in models} if models else None
+        self.groups = set(groups or HOST_GROUPS)
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'weight': self.weight,
+            'groups': sorted(self.groups),
+            'models': sorted(self.models) if self.models else None,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'errors': self.errors,
+            'ejections': self.ejections,
+        }
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def serves(self, group: str, model: str) -> bool:
+        return group in self.groups and (self.models is None or _model_key(model) in self.models)
+
+
+class OllamaHostPool:
+    """
+    Пул хостов Ollama с балансировкой по числу выполняющихся запросов.
+
+    Запрос уходит на исправный хост нужной группы (generate или embed), на котором
+    есть модель, с наименьшим числом выполняющихся запросов относительно веса;
+    при равенстве хост выбирается случайно. Исправность проверяется пассивно:
+    после max_fails ошибок подряд хост исключается на eject_time секунд, после
+    чего получает запросы снова, но первая же ошибка исключает его повторно.
+    Если исключены все подходящие хосты, используется тот, что вернется раньше.
+
+    Attributes:
+        hosts (list[OllamaHost]): Хосты пула
+        max_fails (int): Число ошибок подряд до исключения хоста
+        eject_time (float): Время исключения в секундах
+
+    Args:
+        hosts (list[OllamaHost]): Хосты пула
+        max_fails (int, optional): Defaults to config.rag_config.MODEL_HOST_MAX_FAILS.
+        eject_time (float, optional): Defaults to config.rag_config.MODEL_HOST_EJECT_TIME.
+    """
+    def __init__(
+            self,
+            hosts: list[OllamaHost],
+            max_fails: int = config.rag_config.MODEL_HOST_MAX_FAILS,
+            eject_time: float = config.rag_config.MODEL_HOST_EJECT_TIME,
+    ):
+        if not hosts:
+            raise ValueError('Пул хостов модели пуст')
+        self.hosts = hosts
+        self.max_fails = max_fails
+        self.eject_time = eject_time
+
+    @classmethod
+    def parse(cls, spec: str, **kwargs) -> 'OllamaHostPool':
+        """
+        Создает пул из значения MODEL_HOST.
+
+        Поддерживаются один адрес, адреса через запятую и JSON список объектов
+        {"url", "weight", "models", "groups"}.
+
+        Args:
+            spec (str): Значение MODEL_HOST
+            **kwargs: Параметры пула (max_fails, eject_time)
+        """
+        spec = spec.strip()
+        if spec.startswith('['):
+            items = json.loads(spec)
+            hosts = [
+                OllamaHost(
+                    url=item['url'],
+                    weight=item.get('weight', 1),
+                    models=item.get('models'),
+                    groups=item.get('groups'),
+                )
+                for item in items
+            ]
+        else:
+            hosts = [OllamaHost(url.strip()) for url in spec.split(',') if url.strip()]
+        return cls(hosts, **kwargs)
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает состояние и счетчики хостов"""
+        return {host.url: host.stats for host in self.hosts}
+
+    def select(self, group: HostGroup, model: str) -> OllamaHost:
+        """
+        Выбирает хост для запроса.
+
+        Args:
+            group (str): Группа запроса (generate, embed)
+            model (str): Модель
+
+        Returns:
+            OllamaHost: Хост с наименьшей нагрузкой относительно веса
+
+        Raises:
+            LookupError: Если модель не обслуживает ни один хост группы
+        """
+        candidates = [host for host in self.hosts if host.serves(group, model)]
+        if not candidates:
+            raise LookupError(f'Нет хоста группы {group} с моделью {model}')
+        healthy = [host for host in candidates if host.healthy]
+        if not healthy:
+            host = min(candidates, key=lambda candidate: candidate.ejected_until)
+            logger.warning(f'Все хосты группы {group} исключены, запрос уходит на {host.url}')
+            return host
+        load = min((host.outstanding + 1) / host.weight for host in healthy)
+        return random.choice([host for host in healthy if (host.outstanding + 1) / host.weight == load])
+
+    def _finish(self, host: OllamaHost, error: Exception | None):
+        host.outstanding -= 1
+        if error is None:
+            host.failures = 0
+            return
+        host.errors += 1
+        host.failures += 1
+        if host.failures >= self.max_fails:
+            host.ejected_until = time.monotonic() + self.eject_time
+            host.ejections += 1
+            logger.error(
+                f'Хост модели {host.url} исключен на {self.eject_time} сек после {host.failures} ошибок подряд: {error}'
+            )
+
+    @asynccontextmanager
+    async def request(self, group: HostGroup, model: str) -> AsyncIterator[str]:
+        """
+        Выбирает хост и учитывает запрос к нему: нагрузку и ошибки.
+
+        Отмена запроса (CancelledError) ошибкой хоста не считается.
+
+        Yields:
+            str: Адрес хоста
+        """
+        host = self.select(group, model)
+        host.outstanding += 1
+        host.requests += 1
+        try:
+            yield host.url
+        except Exception as e:
+            self._finish(host, e)
+            raise
+        except BaseException:
+            host.outstanding -= 1
+            raise
+        else:
+            self._finish(host, None)
+
+    @contextmanager
+    def request_sync(self, group: HostGroup, model: str) -> Iterator[str]:
+        """Синхронный вариант request"""
+        host = self.select(group, model)
+        host.outstanding += 1
+        host.requests += 1
+        try:
+            yield host.url
+        except Exception as e:
+            self._finish(host, e)
+            raise
+        except BaseException:
+            host.outstanding -= 1
+            raise
+        else:
+            self._finish(host, None)
+
+
+host_pool = OllamaHostPool.parse(config.rag_config.MODEL_HOST)
@@ -0,0 +1,80 @@
+from typing import Any, AsyncIterator
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from pydantic import PrivateAttr
+
+from .gateway import llm_gateway, LlmClass
+from .hosts import host_pool
+
+
+class GatedChatOllama(ChatOllama):
+    """
+    ChatOllama, вызовы которого проходят через шлюз LLM и пул хостов.
+
+    Асинхронный вызов занимает слот шлюза, затем выполняется копией модели
+    с адресом хоста, выбранного пулом (группа generate). Синхронные вызовы
+    шлюз не проходят, но тоже распределяются по хостам.
+
+    Attributes:
+        llm_class (str): Класс запросов модели в шлюзе
+    """
+    llm_class: LlmClass = 'interactive'
+    _delegates: dict[str, ChatOllama] = PrivateAttr(default_factory=dict)
+
+    def _delegate(self, url: str) -> ChatOllama:
+        """Возвращает копию модели с клиентом хоста"""
+        delegate = self._delegates.get(url)
+        if delegate is None:
+            params = self.model_dump(exclude={'llm_class', 'base_url'}, exclude_unset=True)
+            delegate = self._delegates[url] = ChatOllama(**params, base_url=url)
+        return delegate
+
+    def _generate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        with host_pool.request_sync('generate', self.model) as url:
+            return self._delegate(url)._generate(*args, **kwargs)
+
+    async def _agenerate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        async with llm_gateway.slot(self.llm_class):
+            async with host_pool.request('generate', self.model) as url:
+                return await self._delegate(url)._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args: Any, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        # Слот и хост заняты, пока идет поток токенов; закрытие потока освобождает их
+        async with llm_gateway.slot(self.llm_class):
+            async with host_pool.request('generate', self.model) as url:
+                async for chunk in self._delegate(url)._astream(*args, **kwargs):
+                    yield chunk
+
+
+class GatedOllamaEmbeddings(OllamaEmbeddings):
+    """
+    OllamaEmbeddings, вызовы которого проходят через шлюз LLM и пул хостов (группа embed).
+
+    Attributes:
+        llm_class (str): Класс запросов модели в шлюзе
+    """
+    llm_class: LlmClass = 'embeddings'
+    _delegates: dict[str, OllamaEmbeddings] = PrivateAttr(default_factory=dict)
+
+    def _delegate(self, url: str) -> OllamaEmbeddings:
+        """Возвращает копию модели с клиентом хоста"""
+        delegate = self._delegates.get(url)
+        if delegate is None:
+            params = self.model_dump(exclude={'llm_class', 'base_url'}, exclude_unset=True)
+            delegate = self._delegates[url] = OllamaEmbeddings(**params, base_url=url)
+        return delegate
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with host_pool.request_sync('embed', self.model) as url:
+            return self._delegate(url).embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        async with llm_gateway.slot(self.llm_class):
+            async with host_pool.request('embed', self.model) as url:
+                return await self._delegate(url).aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,207 @@
+import asyncio
+from typing import Any, Callable, Literal
+import httpx
+from loguru import logger
+from pydantic import BaseModel
+
+from .cache import CachedAgent, llm_cache
+from .gateway import LlmClass
+from .hosts import host_pool
+from .models import GatedChatOllama, GatedOllamaEmbeddings
+from ..agent.agents import (
+    create_analytic_agent,
+    create_intent_classifier_agent,
+    create_sql_generate_agent,
+    create_summary_agent
+)
+from ..agent.prompts import intent_classifier_prompt, sql_generate_prompt, analytic_prompt, summary_prompt
+from ..agent.schemes import AnalyticScheme, QueryIntentScheme, SQLScheme
+from ...config import config
+
+AgentName = Literal['intent_classifier', 'sql_generate', 'analytic', 'summary']
+
+# Фабрика агента, класс его запросов в шлюзе LLM, системный промпт (ключ кэша),
+# схема структурированного ответа (None - ответ не кэшируется) и время жизни ответов в кэше
+_AGENTS: dict[str, tuple[Callable[[Any], Any], LlmClass, str, type[BaseModel] | None, float]] = {
+    'intent_classifier': (
+        create_intent_classifier_agent, 'interactive', intent_classifier_prompt, QueryIntentScheme,
+        config.rag_config.LLM_CACHE_TTL_INTENT_CLASSIFIER,
+    ),
+    'sql_generate': (
+        create_sql_generate_agent, 'interactive', sql_generate_prompt, SQLScheme,
+        config.rag_config.LLM_CACHE_TTL_SQL_GENERATE,
+    ),
+    'analytic': (
+        create_analytic_agent, 'interactive', analytic_prompt, AnalyticScheme,
+        config.rag_config.LLM_CACHE_TTL_ANALYTIC,
+    ),
+    # Сводки диалогов строятся в фоне и не должны отнимать слоты у диалога
+    'summary': (
+        create_summary_agent, 'batch', summary_prompt, None,
+        config.rag_config.LLM_CACHE_TTL_SUMMARY,
+    ),
+}
+
+
+class ModelRegistry:
+    """
+    Общий реестр моделей и агентов.
+
+    Каждый агент и модель создаются один раз при первом обращении. Все клиенты
+    Ollama (модели для всех хостов пула, эмбеддинги, описание схемы) используют
+    общий пул HTTP соединений с keep-alive. Модели запрашиваются с keep_alive,
+    чтобы Ollama не выгружала их между запросами, а warm_up загружает модели на
+    хостах при старте приложения.
+
+    Attributes:
+        keep_alive (int): Сколько Ollama держит модель в памяти после запроса (секунды, -1 - всегда)
+        warmup_timeout (float): Таймаут загрузки модели при старте в секундах
+        limits (httpx.Limits): Ограничения пула соединений
+
+    Args:
+        keep_alive (int, optional): Defaults to config.rag_config.MODEL_KEEP_ALIVE.
+        warmup_timeout (float, optional): Defaults to config.rag_config.MODEL_WARMUP_TIMEOUT.
+        max_connections (int, optional): Defaults to config.rag_config.MODEL_HTTP_MAX_CONNECTIONS.
+        max_keepalive (int, optional): Defaults to config.rag_config.MODEL_HTTP_MAX_KEEPALIVE.
+        keepalive_expiry (float, optional): Defaults to config.rag_config.MODEL_HTTP_KEEPALIVE_EXPIRY.
+    """
+    def __init__(
+            self,
+            keep_alive: int = config.rag_config.MODEL_KEEP_ALIVE,
+            warmup_timeout: float = config.rag_config.MODEL_WARMUP_TIMEOUT,
+            max_connections: int = config.rag_config.MODEL_HTTP_MAX_CONNECTIONS,
+            max_keepalive: int = config.rag_config.MODEL_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry: float = config.rag_config.MODEL_HTTP_KEEPALIVE_EXPIRY,
+    ):
+        self.keep_alive = keep_alive
+        self.warmup_timeout = warmup_timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._async_transport: httpx.AsyncHTTPTransport | None = None
+        self._sync_transport: httpx.HTTPTransport | None = None
+        self._http_client: httpx.AsyncClient | None = None
+        self._chat_models: dict[tuple[str, float], GatedChatOllama] = {}
+        self._agents: dict[str, Any] = {}
+        self._embeddings: GatedOllamaEmbeddings | None = None
+
+    @property
+    def async_transport(self) -> httpx.AsyncHTTPTransport:
+        """Общий пул асинхронных соединений с хостами модели"""
+        if self._async_transport is None:
+            self._async_transport = httpx.AsyncHTTPTransport(limits=self.limits)
+        return self._async_transport
+
+    @property
+    def sync_transport(self) -> httpx.HTTPTransport:
+        """Общий пул синхронных соединений с хостами модели"""
+        if self._sync_transport is None:
+            self._sync_transport = httpx.HTTPTransport(limits=self.limits)
+        return self._sync_transport
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """HTTP клиент для прямых запросов к Ollama на общем пуле соединений (таймаут задается в запросе)"""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(transport=self.async_transport, timeout=None)
+        return self._http_client
+
+    def _client_kwargs(self) -> dict:
+        # Клиенты ollama передают эти параметры в httpx: соединения берутся из общего пула
+        return {
+            'async_client_kwargs': {'transport': self.async_transport},
+            'sync_client_kwargs': {'transport': self.sync_transport},
+        }
+
+    def chat_model(self, llm_class: LlmClass = 'interactive', temperature: float = 0.1) -> GatedChatOllama:
+        """Возвращает общую модель генерации для класса запросов и температуры"""
+        key = (llm_class, temperature)
+        model = self._chat_models.get(key)
+        if model is None:
+            model = self._chat_models[key] = GatedChatOllama(
+                model=config.rag_config.MODEL_NAME,
+                temperature=temperature,
+                keep_alive=self.keep_alive,
+                llm_class=llm_class,
+                **self._client_kwargs(),
+            )
+        return model
+
+    def agent(self, name: AgentName) -> Any:
+        """Возвращает агента, создавая его при первом обращении (с кэшем ответов, если он включен)"""
+        agent = self._agents.get(name)
+        if agent is None:
+            factory, llm_class, system_prompt, scheme, ttl = _AGENTS[name]
+            model = self.chat_model(llm_class)
+            agent = factory(model)
+            if llm_cache.store is not None and scheme is not None and ttl > 0:
+                agent = CachedAgent(
+                    name, agent, llm_cache,
+                    model=f'{model.model}@{model.temperature}',
+                    system_prompt=system_prompt,
+                    scheme=scheme,
+                    ttl=ttl,
+                )
+            self._agents[name] = agent
+            logger.info(f'Создан агент {name}')
+        return agent
+
+    def embeddings(self) -> GatedOllamaEmbeddings:
+        """Возвращает общую модель эмбеддингов"""
+        if self._embeddings is None:
+            self._embeddings = GatedOllamaEmbeddings(
+                model=config.rag_config.EMBEDDINGS_MODEL_NAME,
+                keep_alive=self.keep_alive,
+                **self._client_kwargs(),
+            )
+        return self._embeddings
+
+    async def _warm_up_host(self, url: str, path: str, payload: dict):
+        try:
+            response = await self.http_client.post(f'{url}{path}', json=payload, timeout=self.warmup_timeout)
+            response.raise_for_status()
+            logger.info(f'Модель {payload["model"]} загружена на {url}')
+        except Exception as e:
+            logger.warning(f'Не удалось загрузить модель {payload["model"]} на {url}: {e}')
+
+    async def warm_up(self):
+        """
+        Загружает модели генерации и эмбеддингов на всех хостах пула.
+
+        Запрос без текста загружает модель в память Ollama на keep_alive секунд,
+        поэтому первый запрос пользователя не ждет загрузки. Ошибки логируются
+        и не мешают старту приложения.
+        """
+        jobs = []
+        for host in host_pool.hosts:
+            if host.serves('generate', config.rag_config.MODEL_NAME):
+                jobs.append(self._warm_up_host(host.url, '/api/generate', {
+                    'model': config.rag_config.MODEL_NAME,
+                    'keep_alive': self.keep_alive,
+                }))
+            if host.serves('embed', config.rag_config.EMBEDDINGS_MODEL_NAME):
+                jobs.append(self._warm_up_host(host.url, '/api/embed', {
+                    'model': config.rag_config.EMBEDDINGS_MODEL_NAME,
+                    'input': 'warm-up',
+                    'keep_alive': self.keep_alive,
+                }))
+        logger.info(f'Загрузка моделей на хостах ({len(jobs)} запросов)...')
+        await asyncio.gather(*jobs)
+
+    async def close(self):
+        """Закрывает общий пул соединений и кэш ответов"""
+        await llm_cache.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        elif self._async_transport is not None:
+            await self._async_transport.aclose()
+        self._async_transport = None
+        if self._sync_transport is not None:
+            self._sync_transport.close()
+            self._sync_transport = None
+
+
+model_registry = ModelRegistry()
@@ -1,5 +1,6 @@
 import uuid
-from sqlalchemy.orm import Mapped
+from sqlalchemy import LargeBinary, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
 
 from ..database.model import Base
 
@@ -9,6 +10,65 @@ class QdrantIds(Base):
     Attributes:
         ids(uuid): ID точки в векторной бд
         table_name(str): Название таблицы, соответствующей точке
+        schema_hash(str | None): Хэш колонок и типов таблицы на момент описания
     """
     ids: Mapped[uuid.UUID]
-    table_name: Mapped[str]
\ No newline at end of file
+    table_name: Mapped[str]
+    schema_hash: Mapped[str | None]
+
+class GraphCheckpoint(Base):
+    """ORM-модель чекпоинта состояния графа (истории диалога).
+
+    Attributes:
+        thread_id(str): ID диалога
+        checkpoint_ns(str): Пространство имен чекпоинта (подграфы)
+        checkpoint_id(str): ID чекпоинта (сортируется по времени создания)
+        parent_checkpoint_id(str | None): ID предыдущего чекпоинта
+        checkpoint_type(str): Тип сериализации чекпоинта
+        checkpoint(bytes): Сериализованный чекпоинт
+        metadata_type(str): Тип сериализации метаданных
+        checkpoint_metadata(bytes): Сериализованные метаданные
+        size_bytes(int): Размер чекпоинта и метаданных в байтах
+    """
+    __table_args__ = (
+        UniqueConstraint('thread_id', 'checkpoint_ns', 'checkpoint_id'),
+    )
+
+    thread_id: Mapped[str] = mapped_column(index=True)
+    checkpoint_ns: Mapped[str] = mapped_column(default='')
+    checkpoint_id: Mapped[str]
+    parent_checkpoint_id: Mapped[str | None]
+    checkpoint_type: Mapped[str]
+    checkpoint: Mapped[bytes] = mapped_column(LargeBinary)
+    metadata_type: Mapped[str]
+    checkpoint_metadata: Mapped[bytes] = mapped_column(LargeBinary)
+    size_bytes: Mapped[int] = mapped_column(default=0)
+
+
+class GraphCheckpointWrite(Base):
+    """ORM-модель промежуточной записи узла графа, относящейся к чекпоинту.
+
+    Attributes:
+        thread_id(str): ID диалога
+        checkpoint_ns(str): Пространство имен чекпоинта
+        checkpoint_id(str): ID чекпоинта
+        task_id(str): ID задачи узла
+        idx(int): Номер записи в задаче
+        channel(str): Канал состояния
+        value_type(str): Тип сериализации значения
+        value(bytes): Сериализованное значение
+        task_path(str): Путь задачи
+    """
+    __table_args__ = (
+        UniqueConstraint('thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'),
+    )
+
+    thread_id: Mapped[str] = mapped_column(index=True)
+    checkpoint_ns: Mapped[str] = mapped_column(default='')
+    checkpoint_id: Mapped[str]
+    task_id: Mapped[str]
+    idx: Mapped[int]
+    channel: Mapped[str]
+    value_type: Mapped[str]
+    value: Mapped[bytes] = mapped_column(LargeBinary)
+    task_path: Mapped[str] = mapped_column(default='')
@@ -0,0 +1,265 @@
+import asyncio
+import json
+import httpx
+from pydantic import BaseModel, Field, ValidationError
+from loguru import logger
+
+from ..llm.gateway import llm_gateway
+from ..llm.hosts import host_pool
+from ..llm.registry import model_registry
+from ...config import config
+
+
+class FieldDescriptionScheme(BaseModel):
+    """Описание поля, сгенерированное LLM"""
+    description: str = Field(..., description='Описание поля на русском языке')
+    confidentiality: int = Field(..., ge=1, le=10, description='Степень конфиденциальности')
+
+
+def build_describe_prompt(schema_info: dict[str, list[str]]) -> str:
+    """
+    Формирует промпт для генерации описаний полей.
+
+    Args:
+        schema_info: Словарь, где ключ - имя таблицы, значение - список колонок
+
+    Returns:
+        str: Промпт для LLM
+    """
+    return (f'Твоя задача — сгенерировать описания и степень конфиденциальности для полей базы данных.\n'
+           f'Входные данные (схема БД): {schema_info}\n\n'
+           f'Требования к ответу:\n'
+           f'1. Ответ должен быть ТОЛЬКО валидным JSON-объектом\n'
+           f'2. Никакого дополнительного текста, пояснений, markdown-разметки или обрамления кодом\n'
+           f'3. Структура JSON:\n'
+           f'{{\n'
+           f'  "имя_таблицы_1": {{\n'
+           f'    "имя_поля_1": {{\n'
+           f'      "description": "понятное описание на русском языке",\n'
+           f'      "confidentiality": число_от_1_до_10\n'
+           f'    }},\n'
+           f'    "имя_поля_2": {{\n'
+           f'      "description": "понятное описание на русском языке",\n'
+           f'      "confidentiality": число_от_1_до_10\n'
+           f'    }}\n'
+           f'  }},\n'
+           f'  "имя_таблицы_2": {{\n'
+           f'    "имя_поля_1": {{\n'
+           f'      "description": "понятное описание на русском языке",\n'
+           f'      "confidentiality": число_от_1_до_10\n'
+           f'    }}\n'
+           f'  }}\n'
+           f'}}\n\n'
+           f'Правила генерации описаний:\n'
+           f'- Описания должны быть краткими (2-5 слов)\n'
+           f'- Описывай, какие данные хранятся в поле\n'
+           f'- Используй бизнес-контекст, а не технические термины\n'
+           f'- Для id полей пиши "Уникальный идентификатор записи"\n'
+           f'- Для полей с датами пиши "Дата и время создания/изменения/события"\n'
+           f'- Для внешних ключей указывай, на какую таблицу ссылаются\n\n'
+           f'Правила определения степени конфиденциальности (confidentiality от 1 до 10):\n'
+           f'- 1-2: Публичная информация (можно публиковать открыто)\n'
+           f'  * Примеры: id, даты создания, статусы, справочные значения\n'
+           f'- 3-4: Внутренняя информация (можно показывать внутри компании)\n'
+           f'  * Примеры: названия, описания, категории, технические поля\n'
+           f'- 5-6: Ограниченного доступа (только для авторизованных пользователей)\n'
+           f'  * Примеры: email, username, обезличенная статистика\n'
+           f'- 7-8: Конфиденциальная информация (ограниченный круг сотрудников)\n'
+           f'  * Примеры: персональные данные, финансовые показатели, оценки\n'
+           f'- 9-10: Особо конфиденциальная (только владелец и администраторы)\n'
+           f'  * Примеры: пароли, токены, ключи доступа, медицинские данные\n\n'
+           f'Пример:\n'
+           f'Вход: {{"users": ["id", "username", "email", "password", "created_at", "scopes"]}}\n'
+           f'Ответ: {{\n'
+           f'  "users": {{\n'
+           f'    "id": {{\n'
+           f'      "description": "Уникальный идентификатор пользователя",\n'
+           f'      "confidentiality": 1\n'
+           f'    }},\n'
+           f'    "username": {{\n'
+           f'      "description": "Имя пользователя для входа",\n'
+           f'      "confidentiality": 5\n'
+           f'    }},\n'
+           f'    "email": {{\n'
+           f'      "description": "Электронная почта пользователя",\n'
+           f'      "confidentiality": 6\n'
+           f'    }},\n'
+           f'    "password": {{\n'
+           f'      "description": "Хэш пароля",\n'
+           f'      "confidentiality": 10\n'
+           f'    }},\n'
+           f'    "created_at": {{\n'
+           f'      "description": "Дата регистрации пользователя",\n'
+           f'      "confidentiality": 2\n'
+           f'    }},\n'
+           f'    "scopes": {{\n'
+           f'      "description": "Разрешения и роли пользователя",\n'
+           f'      "confidentiality": 8\n'
+           f'    }}\n'
+           f'  }}\n'
+           f'}}\n\n'
+           f'Начинай генерацию ответа сразу с JSON:')
+
+
+class SchemaDescriber:
+    """
+    Параллельная генерация описаний полей БД через LLM по частям.
+
+    Схема разбивается на пачки таблиц, размер которых ограничен бюджетом токенов.
+    Пачки отправляются в Ollama одновременно (не более concurrency запросов
+    за раз, каждый занимает слот класса batch в шлюзе LLM) через асинхронный HTTP клиент. Ответы валидируются и объединяются,
+    повторно отправляются только таблицы, для которых не пришло корректного описания.
+
+    Attributes:
+        token_budget (int): Максимальный размер схемы в одной пачке (в токенах)
+        concurrency (int): Максимальное число одновременных запросов к LLM
+        retries (int): Число повторных попыток для неудавшихся пачек
+        timeout (float): Таймаут одного запроса к LLM в секундах
+    """
+    # Грубая оценка: в среднем 3 символа на токен для идентификаторов
+    _CHARS_PER_TOKEN = 3
+
+    def __init__(
+            self,
+            token_budget: int = config.rag_config.DESCRIBE_TOKEN_BUDGET,
+            concurrency: int = config.rag_config.DESCRIBE_CONCURRENCY,
+            retries: int = config.rag_config.DESCRIBE_RETRIES,
+            timeout: float = config.rag_config.DESCRIBE_TIMEOUT,
+    ):
+        self.token_budget = token_budget
+        self.concurrency = concurrency
+        self.retries = retries
+        self.timeout = timeout
+
+    @classmethod
+    def estimate_tokens(cls, table_name: str, columns: list[str]) -> int:
+        """Оценивает число токенов, которое таблица займет в промпте"""
+        return len(json.dumps({table_name: columns}, ensure_ascii=False)) // cls._CHARS_PER_TOKEN + 1
+
+    def split(self, schema_info: dict[str, list[str]]) -> list[dict[str, list[str]]]:
+        """
+        Разбивает схему на пачки таблиц в пределах бюджета токенов.
+
+        Таблица, которая сама по себе больше бюджета, попадает в отдельную пачку.
+
+        Args:
+            schema_info: Словарь, где ключ - имя таблицы, значение - список колонок
+
+        Returns:
+            list[dict[str, list[str]]]: Список пачек
+        """
+        chunks: list[dict[str, list[str]]] = []
+        current: dict[str, list[str]] = {}
+        current_tokens = 0
+        for table_name, columns in schema_info.items():
+            tokens = self.estimate_tokens(table_name, columns)
+            if current and current_tokens + tokens > self.token_budget:
+                chunks.append(current)
+                current, current_tokens = {}, 0
+            current[table_name] = columns
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    @staticmethod
+    def validate(chunk: dict[str, list[str]], answer: dict) -> dict[str, dict]:
+        """
+        Отбирает из ответа LLM корректные описания таблиц пачки.
+
+        Таблица считается описанной, если в ответе есть описание для каждой ее колонки.
+
+        Args:
+            chunk: Пачка таблиц, отправленная в LLM
+            answer: Разобранный JSON ответа
+
+        Returns:
+            dict[str, dict]: Описания корректно описанных таблиц
+        """
+        valid = {}
+        for table_name, columns in chunk.items():
+            fields = answer.get(table_name)
+            if not isinstance(fields, dict):
+                continue
+            try:
+                described = {
+                    column: FieldDescriptionScheme.model_validate(fields[column]).model_dump()
+                    for column in columns
+                }
+            except (KeyError, ValidationError) as e:
+                logger.warning(f'Некорректное описание таблицы {table_name}: {e}')
+                continue
+            valid[table_name] = described
+        return valid
+
+    async def _describe_chunk(
+            self,
+            client: httpx.AsyncClient,
+            semaphore: asyncio.Semaphore,
+            chunk: dict[str, list[str]],
+    ) -> dict[str, dict]:
+        """
+        Отправляет одну пачку в LLM и возвращает корректные описания.
+
+        Args:
+            client: Асинхронный HTTP клиент
+            semaphore: Семафор, ограничивающий число одновременных запросов
+            chunk: Пачка таблиц
+
+        Returns:
+            dict[str, dict]: Описания таблиц (пустой словарь при ошибке)
+        """
+        data = {
+            "model": config.rag_config.MODEL_NAME,
+            "stream": False,
+            "format": "json",
+            "prompt": build_describe_prompt(chunk),
+            "keep_alive": model_registry.keep_alive
+        }
+        async with semaphore:
+            try:
+                # Описание схемы - фоновая работа с низшим приоритетом в шлюзе LLM
+                async with llm_gateway.slot('batch'):
+                    async with host_pool.request('generate', config.rag_config.MODEL_NAME) as url:
+                        response = await client.post(f'{url}/api/generate', json=data, timeout=self.timeout)
+                        # Ответ 5xx учитывается пулом как ошибка хоста
+                        response.raise_for_status()
+                answer = json.loads(response.json()['response'])
+            except Exception as e:
+                logger.error(f'Ошибка запроса описания для {list(chunk)}: {e}')
+                return {}
+        if not isinstance(answer, dict):
+            logger.error(f'LLM вернула не JSON-объект для {list(chunk)}')
+            return {}
+        return self.validate(chunk, answer)
+
+    async def describe(self, schema_info: dict[str, list[str]]) -> dict[str, dict]:
+        """
+        Генерирует описания для всех таблиц схемы.
+
+        Args:
+            schema_info: Словарь, где ключ - имя таблицы, значение - список колонок
+
+        Returns:
+            dict[str, dict]: Описания полей; таблицы, которые не удалось описать
+                             за все попытки, в результат не попадают
+        """
+        result: dict[str, dict] = {}
+        pending = dict(schema_info)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # Общий клиент реестра моделей: соединения с хостами переиспользуются
+        client = model_registry.http_client
+        for attempt in range(self.retries + 1):
+            chunks = self.split(pending)
+            logger.info(f'Попытка {attempt + 1}: {len(pending)} таблиц в {len(chunks)} пачках')
+            answers = await asyncio.gather(
+                *(self._describe_chunk(client, semaphore, chunk) for chunk in chunks)
+            )
+            for answer in answers:
+                result.update(answer)
+            pending = {name: columns for name, columns in pending.items() if name not in result}
+            if not pending:
+                break
+        if pending:
+            logger.error(f'Не удалось описать таблицы: {list(pending)}')
+        return result
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Обертка над моделью эмбеддингов с кэшем в памяти и на диске.
+
+    Ключ кэша - хэш пары (название модели, текст). Поиск идет сначала в LRU кэше
+    в памяти, затем в SQLite файле на диске; в модель отправляются только тексты,
+    которых нет ни там, ни там, причем одним запросом.
+
+    Attributes:
+        embeddings (Embeddings): Исходная модель эмбеддингов
+        model_name (str): Название модели, входит в ключ кэша
+        max_memory_items (int): Размер LRU кэша в памяти (0 - кэш в памяти выключен)
+        cache_path (Path | None): Путь к SQLite файлу кэша (None - кэш на диске выключен)
+        hits_memory (int): Число попаданий в кэш в памяти
+        hits_disk (int): Число попаданий в кэш на диске
+        misses (int): Число текстов, отправленных в модель
+
+    Args:
+        embeddings (Embeddings): Исходная модель эмбеддингов
+        model_name (str): Название модели
+        max_memory_items (int, optional): Размер LRU кэша в памяти. Defaults to 10000.
+        cache_path (Path | str | None, optional): Путь к SQLite файлу кэша. Defaults to None.
+    """
+    def __init__(
+            self,
+            embeddings: Embeddings,
+            model_name: str,
+            max_memory_items: int = 10000,
+            cache_path: Path | str | None = None,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+        if self.cache_path:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)')
+            self._db.commit()
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает счетчики попаданий и промахов кэша"""
+        total = self.hits_memory + self.hits_disk + self.misses
+        return {
+            'model': self.model_name,
+            'hits_memory': self.hits_memory,
+            'hits_disk': self.hits_disk,
+            'misses': self.misses,
+            'hit_ratio': (self.hits_memory + self.hits_disk) / total if total else 0.0,
+            'memory_items': len(self._memory),
+        }
+
+    def _key(self, text: str) -> str:
+        """Возвращает ключ кэша для текста"""
+        return hashlib.sha256(f'{self.model_name}\0{text}'.encode()).hexdigest()
+
+    def _remember(self, key: str, vector: list[float]):
+        """Кладет вектор в LRU кэш в памяти"""
+        if self.max_memory_items <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, keys: list[str]) -> dict[str, list[float]]:
+        """Читает векторы из кэша на диске"""
+        if not self._db or not keys:
+            return {}
+        found = {}
+        with self._lock:
+            # SQLite ограничивает число параметров в запросе
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._db.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({",".join("?" * len(part))})',
+                    part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+        return found
+
+    def _write_disk(self, items: dict[str, list[float]]):
+        """Записывает векторы в кэш на диске"""
+        if not self._db or not items:
+            return
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)',
+                [(key, array('f', vector).tobytes()) for key, vector in items.items()]
+            )
+            self._db.commit()
+
+    def _lookup(self, texts: list[str]) -> tuple[list[str], dict[str, list[float]], list[str]]:
+        """
+        Ищет тексты в кэше.
+
+        Returns:
+            tuple: Ключи текстов, найденные векторы и тексты, которых нет в кэше
+        """
+        keys = [self._key(text) for text in texts]
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.hits_memory += 1
+            from_disk = self._read_disk([key for key in set(keys) if key not in found])
+            for key, vector in from_disk.items():
+                self._remember(key, vector)
+                self.hits_disk += 1
+            found.update(from_disk)
+
+            missing, seen = [], set()
+            for key, text in zip(keys, texts):
+                if key not in found and key not in seen:
+                    seen.add(key)
+                    missing.append(text)
+            self.misses += len(missing)
+        return keys, found, missing
+
+    def _store(self, texts: list[str], vectors: list[list[float]]) -> dict[str, list[float]]:
+        """Сохраняет вычисленные векторы в кэши"""
+        computed = {self._key(text): vector for text, vector in zip(texts, vectors)}
+        with self._lock:
+            for key, vector in computed.items():
+                self._remember(key, vector)
+            self._write_disk(computed)
+        return computed
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            found.update(self._store(missing, self.embeddings.embed_documents(missing)))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, found, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(missing)
+            found.update(await asyncio.to_thread(self._store, missing, vectors))
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vectors = await self.aembed_documents([text])
+        return vectors[0]
+
+    def close(self):
+        """Закрывает файл кэша на диске"""
+        if self._db:
+            with self._lock:
+                self._db.close()
+            self._db = None
+            logger.info(f'Кэш эмбеддингов закрыт: {self.stats}')
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection
+from sqlalchemy.sql import text
+from loguru import logger
+
+
+class ColumnInfo(BaseModel):
+    """Описание колонки таблицы.
+
+    Attributes:
+        name(str): Название колонки
+        data_type(str): Тип данных в синтаксисе PostgreSQL
+        nullable(bool): Допускает ли колонка NULL
+        primary_key(bool): Входит ли колонка в первичный ключ
+        references(str | None): Ссылка внешнего ключа в формате "таблица.колонка"
+    """
+    name: str
+    data_type: str
+    nullable: bool = True
+    primary_key: bool = False
+    references: str | None = None
+
+
+class TableInfo(BaseModel):
+    """Описание таблицы базы данных.
+
+    Attributes:
+        name(str): Название таблицы
+        columns(list[ColumnInfo]): Колонки в порядке объявления
+    """
+    name: str
+    columns: list[ColumnInfo] = Field(default_factory=list)
+
+    @property
+    def column_names(self) -> list[str]:
+        """Возвращает названия колонок в порядке объявления"""
+        return [column.name for column in self.columns]
+
+    @property
+    def schema_hash(self) -> str:
+        """Возвращает хэш набора колонок и их типов (порядок колонок не учитывается)"""
+        payload = ','.join(sorted(f'{column.name}:{column.data_type}' for column in self.columns))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SchemaIntrospector:
+    """
+    Интроспекция схемы PostgreSQL через pg_catalog с кэшированием в памяти процесса.
+
+    Таблицы, колонки, типы, nullability, первичные и внешние ключи читаются
+    двумя запросами вместо запроса на каждую таблицу. Результат кэшируется
+    по отпечатку каталога: пока отпечаток не изменился, схема отдается из кэша.
+
+    Attributes:
+        schema (str): Имя схемы БД
+        _cache (dict[str, tuple[str, dict[str, TableInfo]]]): Кэш, где ключ - URL
+            движка, значение - отпечаток каталога и схема
+        _lock (asyncio.Lock): Блокировка от одновременного перечитывания каталога
+
+    Args:
+        schema (str, optional): Имя схемы БД. Defaults to 'public'.
+    """
+    _RELKINDS = "('r', 'p', 'v', 'm', 'f')"
+
+    # Отпечаток меняется при любом DDL, затрагивающем таблицы (в том числе переименование),
+    # колонки или ограничения схемы. ANALYZE и VACUUM обновляют pg_class на месте и xmin не меняют
+    _FINGERPRINT_QUERY = text(f"""
+        SELECT
+            md5(COALESCE((
+                SELECT string_agg(
+                    c.oid::text || ':' || c.relname || ':' || c.xmin::text,
+                    ',' ORDER BY c.oid
+                )
+                FROM pg_catalog.pg_class c
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = :schema
+                  AND c.relkind IN {_RELKINDS}
+            ), ''))
+            || md5(COALESCE((
+                SELECT string_agg(
+                    a.attrelid::text || '.' || a.attnum::text || ':' || a.xmin::text,
+                    ',' ORDER BY a.attrelid, a.attnum
+                )
+                FROM pg_catalog.pg_attribute a
+                JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = :schema
+                  AND c.relkind IN {_RELKINDS}
+                  AND a.attnum > 0
+            ), ''))
+            || md5(COALESCE((
+                SELECT string_agg(con.oid::text || ':' || con.xmin::text, ',' ORDER BY con.oid)
+                FROM pg_catalog.pg_constraint con
+                JOIN pg_catalog.pg_namespace n ON n.oid = con.connamespace
+                WHERE n.nspname = :schema
+            ), ''))
+    """)
+
+    _COLUMNS_QUERY = text(f"""
+        SELECT c.relname AS table_name,
+               a.attname AS column_name,
+               pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type,
+               NOT a.attnotnull AS nullable,
+               EXISTS (
+                   SELECT 1
+                   FROM pg_catalog.pg_index i
+                   WHERE i.indrelid = c.oid
+                     AND i.indisprimary
+                     AND a.attnum = ANY (i.indkey)
+               ) AS primary_key
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid
+        WHERE n.nspname = :schema
+          AND c.relkind IN {_RELKINDS}
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+        ORDER BY c.relname, a.attnum
+    """)
+
+    _FOREIGN_KEYS_QUERY = text("""
+        SELECT src.relname AS table_name,
+               src_attr.attname AS column_name,
+               dst.relname AS ref_table,
+               dst_attr.attname AS ref_column
+        FROM pg_catalog.pg_constraint con
+        JOIN pg_catalog.pg_class src ON src.oid = con.conrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = src.relnamespace
+        JOIN pg_catalog.pg_class dst ON dst.oid = con.confrelid
+        CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(src_attnum, dst_attnum)
+        JOIN pg_catalog.pg_attribute src_attr
+          ON src_attr.attrelid = con.conrelid AND src_attr.attnum = k.src_attnum
+        JOIN pg_catalog.pg_attribute dst_attr
+          ON dst_attr.attrelid = con.confrelid AND dst_attr.attnum = k.dst_attnum
+        WHERE con.contype = 'f'
+          AND n.nspname = :schema
+    """)
+
+    def __init__(self, schema: str = 'public'):
+        self.schema = schema
+        self._cache: dict[str, tuple[str, dict[str, TableInfo]]] = {}
+        self._lock = asyncio.Lock()
+
+    async def fingerprint(self, conn: AsyncConnection) -> str:
+        """
+        Вычисляет отпечаток каталога для схемы.
+
+        Args:
+            conn (AsyncConnection): Открытое соединение с БД
+
+        Returns:
+            str: Строка, меняющаяся при любом изменении колонок или ограничений
+        """
+        result = await conn.execute(self._FINGERPRINT_QUERY, {'schema': self.schema})
+        return result.scalar_one()
+
+    async def _load(self, conn: AsyncConnection) -> dict[str, TableInfo]:
+        """
+        Читает схему из pg_catalog двумя запросами.
+
+        Args:
+            conn (AsyncConnection): Открытое соединение с БД
+
+        Returns:
+            dict[str, TableInfo]: Словарь, где ключ - имя таблицы
+        """
+        tables: dict[str, TableInfo] = {}
+        columns_result = await conn.execute(self._COLUMNS_QUERY, {'schema': self.schema})
+        for row in columns_result.mappings():
+            table = tables.setdefault(row['table_name'], TableInfo(name=row['table_name']))
+            table.columns.append(ColumnInfo(
+                name=row['column_name'],
+                data_type=row['data_type'],
+                nullable=row['nullable'],
+                primary_key=row['primary_key'],
+            ))
+
+        fk_result = await conn.execute(self._FOREIGN_KEYS_QUERY, {'schema': self.schema})
+        references = {
+            (row['table_name'], row['column_name']): f"{row['ref_table']}.{row['ref_column']}"
+            for row in fk_result.mappings()
+        }
+        for table in tables.values():
+            for column in table.columns:
+                column.references = references.get((table.name, column.name))
+
+        return tables
+
+    async def get_schema(self, engine: AsyncEngine, force: bool = False) -> dict[str, TableInfo]:
+        """
+        Возвращает схему БД, перечитывая каталог только при изменении отпечатка.
+
+        Args:
+            engine (AsyncEngine): Асинхронный движок SQLAlchemy
+            force (bool, optional): Перечитать каталог независимо от кэша. Defaults to False.
+
+        Returns:
+            dict[str, TableInfo]: Словарь, где ключ - имя таблицы
+        """
+        key = str(engine.url)
+        async with engine.connect() as conn:
+            fingerprint = await self.fingerprint(conn)
+            cached = self._cache.get(key)
+            if not force and cached and cached[0] == fingerprint:
+                logger.debug('Схема БД отдана из кэша')
+                return cached[1]
+
+            async with self._lock:
+                cached = self._cache.get(key)
+                if not force and cached and cached[0] == fingerprint:
+                    return cached[1]
+                logger.info('Схема БД изменилась, перечитываю каталог')
+                tables = await self._load(conn)
+                self._cache[key] = (fingerprint, tables)
+                logger.info(f'Схема БД загружена: {len(tables)} таблиц')
+                return tables
+
+    def invalidate(self):
+        """Сбрасывает кэш схемы"""
+        self._cache.clear()
+
+
+schema_introspector = SchemaIntrospector()
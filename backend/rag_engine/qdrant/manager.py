@@ -1,10 +1,16 @@
-from langchain_ollama import OllamaEmbeddings
-from qdrant_client.models import Distance, VectorParams
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Record, ScoredPoint, Filter, PointIdsList, FilterSelector
+)
 from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from loguru import logger
 
 from backend.config import config
+from .embeddings import CachedEmbeddings
+from ..llm.gateway import llm_gateway
+from ..llm.registry import model_registry
 
 
 class VectorStoreManager:
@@ -15,34 +21,58 @@ class VectorStoreManager:
     и инициализацией коллекций. Поддерживает работу с несколькими коллекциями
     одновременно, кэшируя их в памяти.
 
+    Все операции приложения (scroll, поиск, upsert, count) выполняются через
+    асинхронный клиент и не блокируют event loop. Синхронный клиент нужен только
+    для QdrantVectorStore из langchain.
+
     Attributes:
-        embeddings (OllamaEmbeddings | None): Модель для создания эмбеддингов
-        qdr_client (QdrantClient | None): Клиент для подключения к Qdrant
+        embeddings (Embeddings | None): Модель для создания эмбеддингов
+            (общая модель реестра, обернутая в CachedEmbeddings)
+        qdr_client (QdrantClient | None): Синхронный клиент Qdrant для QdrantVectorStore
+        async_client (AsyncQdrantClient | None): Асинхронный клиент Qdrant
         vector_stores (dict[str, QdrantVectorStore]): Словарь инициализированных
             векторных хранилищ, где ключ - имя коллекции
 
     Args:
-        embeddings (OllamaEmbeddings | None, optional):
+        embeddings (Embeddings | None, optional):
             Готовая модель эмбеддингов. Если не указана, будет создана при init().
             Defaults to None.
         qdr_client (QdrantClient | None, optional):
             Готовый клиент Qdrant. Если не указан, будет создан при init().
             Defaults to None.
+        async_client (AsyncQdrantClient | None, optional):
+            Готовый асинхронный клиент Qdrant. Если не указан, будет создан при init().
+            Defaults to None.
     """
     def __init__(
             self,
-            embeddings: OllamaEmbeddings | None = None,
+            embeddings: Embeddings | None = None,
             qdr_client: QdrantClient | None = None,
+            async_client: AsyncQdrantClient | None = None,
     ):
         self.embeddings = embeddings
         self.qdr_client = qdr_client
+        self.async_client = async_client
         self.vector_stores: dict[str, QdrantVectorStore] = {}
 
+    @staticmethod
+    def _client_settings() -> dict:
+        """Возвращает параметры подключения к Qdrant из конфигурации"""
+        return {
+            'host': config.rag_config.QDRANT_HOST,
+            'port': config.rag_config.QDRANT_PORT,
+            'grpc_port': config.rag_config.QDRANT_GRPC_PORT,
+            'prefer_grpc': config.rag_config.QDRANT_PREFER_GRPC,
+            'https': config.rag_config.QDRANT_HTTPS,
+            'api_key': config.rag_config.QDRANT_API_KEY,
+            'timeout': config.rag_config.QDRANT_TIMEOUT,
+        }
+
     async def init(self):
         """
         Асинхронная инициализация менеджера векторной БД.
 
-        Создает подключение к Ollama для эмбеддингов, инициализирует клиент Qdrant,
+        Создает подключение к Ollama для эмбеддингов, инициализирует клиенты Qdrant,
         проверяет наличие и создает при необходимости все коллекции из конфигурации.
 
         Raises:
@@ -52,20 +82,20 @@ class VectorStoreManager:
         logger.info('Инициализация менеджера векторной БД...')
         try:
             logger.info('Создание embeddings...')
-            self.embeddings = OllamaEmbeddings(
-                model=config.rag_config.EMBEDDINGS_MODEL_NAME,
-                base_url=config.rag_config.MODEL_HOST,
+            self.embeddings = CachedEmbeddings(
+                model_registry.embeddings(),
+                model_name=config.rag_config.EMBEDDINGS_MODEL_NAME,
+                max_memory_items=config.rag_config.EMBEDDINGS_CACHE_SIZE,
+                cache_path=config.rag_config.embeddings_cache_path,
             )
             logger.info('Создание qdr_client...')
-            self.qdr_client = QdrantClient(
-                host=config.rag_config.QDRANT_HOST,
-                port=config.rag_config.QDRANT_PORT
-            )
+            self.async_client = AsyncQdrantClient(**self._client_settings())
+            self.qdr_client = QdrantClient(**self._client_settings())
             logger.info('Создание коллекций...')
             for collection_name in config.rag_config.LIST_COLLECTION:
                 if collection_name not in self.vector_stores:
-                    if not self.qdr_client.collection_exists(collection_name):
-                        self.qdr_client.create_collection(
+                    if not await self.async_client.collection_exists(collection_name):
+                        await self.async_client.create_collection(
                             collection_name=collection_name,
                             vectors_config=VectorParams(size=config.rag_config.VECTOR_SIZE, distance=Distance.COSINE)
                         )
@@ -79,7 +109,11 @@ class VectorStoreManager:
             raise RuntimeError(f"Не удалось инициализировать менеджер векторной БД: {e}") from e
 
     async def close(self):
-        """Закрывает соединение с клиентом Qdrant."""
+        """Закрывает соединения с клиентами Qdrant и файл кэша эмбеддингов."""
+        if isinstance(self.embeddings, CachedEmbeddings):
+            self.embeddings.close()
+        if self.async_client:
+            await self.async_client.close()
         if self.qdr_client:
             self.qdr_client.close()
 
@@ -98,5 +132,224 @@ class VectorStoreManager:
         """
         return self.vector_stores[collection_name]
 
+    @staticmethod
+    def to_document(point: Record | ScoredPoint) -> Document:
+        """
+        Преобразует точку Qdrant в документ langchain.
+
+        Args:
+            point (Record | ScoredPoint): Точка с payload в формате QdrantVectorStore
+
+        Returns:
+            Document: Документ с текстом и метаданными точки
+        """
+        payload = point.payload or {}
+        return Document(
+            id=str(point.id),
+            page_content=payload.get(QdrantVectorStore.CONTENT_KEY, ''),
+            metadata=payload.get(QdrantVectorStore.METADATA_KEY) or {},
+        )
+
+    async def scroll(
+            self,
+            collection_name: str,
+            limit: int = 100,
+            offset: int | str | None = None,
+            scroll_filter: Filter | None = None,
+            with_payload: bool | list[str] = True,
+    ) -> tuple[list[Record], int | str | None]:
+        """
+        Возвращает страницу точек коллекции.
+
+        Args:
+            collection_name (str): Имя коллекции
+            limit (int, optional): Размер страницы. Defaults to 100.
+            offset (int | str | None, optional): ID точки, с которой начинается страница.
+            scroll_filter (Filter | None, optional): Фильтр по payload.
+            with_payload (bool | list[str], optional): Возвращать payload целиком
+                или только перечисленные поля. Defaults to True.
+
+        Returns:
+            tuple[list[Record], int | str | None]: Точки и offset следующей страницы
+                                                   (None, если страниц больше нет)
+        """
+        return await self.async_client.scroll(
+            collection_name=collection_name,
+            limit=limit,
+            offset=offset,
+            scroll_filter=scroll_filter,
+            with_payload=with_payload,
+            with_vectors=False,
+        )
+
+    async def search(
+            self,
+            collection_name: str,
+            vector: list[float],
+            limit: int = 4,
+            query_filter: Filter | None = None,
+            score_threshold: float | None = None,
+    ) -> list[ScoredPoint]:
+        """
+        Ищет ближайшие к вектору точки коллекции.
+
+        Args:
+            collection_name (str): Имя коллекции
+            vector (list[float]): Вектор запроса
+            limit (int, optional): Число результатов. Defaults to 4.
+            query_filter (Filter | None, optional): Фильтр по payload.
+            score_threshold (float | None, optional): Минимальная схожесть результата.
+
+        Returns:
+            list[ScoredPoint]: Найденные точки, отсортированные по схожести
+        """
+        response = await self.async_client.query_points(
+            collection_name=collection_name,
+            query=vector,
+            limit=limit,
+            query_filter=query_filter,
+            score_threshold=score_threshold,
+            with_payload=True,
+        )
+        return response.points
+
+    async def similarity_search_with_score(
+            self,
+            collection_name: str,
+            query: str,
+            k: int = 4,
+            query_filter: Filter | None = None,
+            score_threshold: float | None = None,
+    ) -> list[tuple[Document, float]]:
+        """
+        Выполняет семантический поиск по тексту запроса.
+
+        Args:
+            collection_name (str): Имя коллекции
+            query (str): Текст запроса
+            k (int, optional): Число результатов. Defaults to 4.
+            query_filter (Filter | None, optional): Фильтр по payload.
+            score_threshold (float | None, optional): Минимальная схожесть результата.
+
+        Returns:
+            list[tuple[Document, float]]: Документы и их схожесть с запросом
+        """
+        vector = await self.embeddings.aembed_query(query)
+        points = await self.search(collection_name, vector, k, query_filter, score_threshold)
+        return [(self.to_document(point), point.score) for point in points]
+
+    async def similarity_search(self, collection_name: str, query: str, k: int = 4) -> list[Document]:
+        """
+        Выполняет семантический поиск по тексту запроса.
+
+        Args:
+            collection_name (str): Имя коллекции
+            query (str): Текст запроса
+            k (int, optional): Число результатов. Defaults to 4.
+
+        Returns:
+            list[Document]: Документы, отсортированные по релевантности
+        """
+        results = await self.similarity_search_with_score(collection_name, query, k)
+        return [document for document, _ in results]
+
+    async def upsert(self, collection_name: str, points: list[PointStruct]):
+        """
+        Создает или перезаписывает точки коллекции одним запросом.
+
+        Args:
+            collection_name (str): Имя коллекции
+            points (list[PointStruct]): Точки для загрузки
+        """
+        await self.async_client.upsert(collection_name=collection_name, points=points)
+
+    async def delete(
+            self,
+            collection_name: str,
+            ids: list[int | str] | None = None,
+            points_filter: Filter | None = None,
+    ):
+        """
+        Удаляет точки коллекции по ID или по фильтру.
+
+        Args:
+            collection_name (str): Имя коллекции
+            ids (list[int | str] | None, optional): ID удаляемых точек
+            points_filter (Filter | None, optional): Фильтр удаляемых точек
+        """
+        if ids is not None:
+            selector = PointIdsList(points=ids)
+        elif points_filter is not None:
+            selector = FilterSelector(filter=points_filter)
+        else:
+            raise ValueError('Нужно указать ids или points_filter')
+        await self.async_client.delete(collection_name=collection_name, points_selector=selector)
+
+    async def count(self, collection_name: str, count_filter: Filter | None = None, exact: bool = True) -> int:
+        """
+        Возвращает число точек в коллекции.
+
+        Args:
+            collection_name (str): Имя коллекции
+            count_filter (Filter | None, optional): Фильтр по payload.
+            exact (bool, optional): Точный подсчет вместо оценки. Defaults to True.
+
+        Returns:
+            int: Число точек
+        """
+        result = await self.async_client.count(
+            collection_name=collection_name,
+            count_filter=count_filter,
+            exact=exact,
+        )
+        return result.count
+
+    async def upsert_texts(
+            self,
+            collection_name: str,
+            texts: list[str],
+            metadatas: list[dict],
+            ids: list[str],
+            batch_size: int = config.rag_config.EMBED_BATCH_SIZE,
+            vectors: list[list[float]] | None = None,
+    ) -> list[str]:
+        """
+        Векторизует тексты пачками и загружает все точки в коллекцию одним запросом.
+
+        Точки сохраняются в том же формате payload, что и у QdrantVectorStore,
+        поэтому доступны для его поиска.
+
+        Args:
+            collection_name (str): Имя коллекции
+            texts (list[str]): Тексты для векторизации
+            metadatas (list[dict]): Метаданные точек
+            ids (list[str]): ID точек (существующие точки перезаписываются)
+            batch_size (int, optional): Число текстов в одном запросе эмбеддингов.
+            vectors (list[list[float]] | None, optional): Уже вычисленные векторы текстов.
+                Если указаны, модель эмбеддингов не вызывается.
+
+        Returns:
+            list[str]: ID загруженных точек
+        """
+        if vectors is None:
+            vectors = []
+            # Индексация идет фоном и уступает слоты шлюза эмбеддингам запросов диалога
+            with llm_gateway.use_class('batch'):
+                for start in range(0, len(texts), batch_size):
+                    vectors.extend(await self.embeddings.aembed_documents(texts[start:start + batch_size]))
+        points = [
+            PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={
+                    QdrantVectorStore.CONTENT_KEY: text,
+                    QdrantVectorStore.METADATA_KEY: metadata,
+                }
+            )
+            for point_id, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+        ]
+        await self.upsert(collection_name, points)
+        return ids
+
 
 vector_manager = VectorStoreManager()
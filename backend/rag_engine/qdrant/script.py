@@ -1,14 +1,20 @@
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.sql import text
-from sqlalchemy import select, insert
-import requests
+import uuid
 import json
+import base64
+from typing import AsyncIterator
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client.models import Record
 from loguru import logger
 
 from ...database.session import session_manager
 from ...database.executer import sql_manager
 from ..models import QdrantIds
 from .manager import VectorStoreManager
+from .introspection import TableInfo, schema_introspector
+from .describer import SchemaDescriber
+from .sql_cache import sql_cache
 from ...config import config
 
 
@@ -30,6 +36,21 @@ class ScriptVector:
         self.db_session_manager = db_session_manager
         self.engine = db_session_manager.engine if db_session_manager else None
 
+    async def get_db_schema_info(self, force: bool = False) -> dict[str, TableInfo]:
+        """
+        Асинхронно извлекает подробную схему базы данных.
+
+        Таблицы, колонки, типы, nullability, первичные и внешние ключи читаются
+        из pg_catalog и кэшируются до изменения отпечатка каталога.
+
+        Args:
+            force (bool, optional): Перечитать каталог независимо от кэша. Defaults to False.
+
+        Returns:
+            dict[str, TableInfo]: Словарь, где ключ - имя таблицы
+        """
+        return await schema_introspector.get_schema(self.engine, force=force)
+
     async def get_db_schema(self):
         """
         Асинхронно извлекает схему базы данных: список таблиц и их колонок.
@@ -46,137 +67,45 @@ class ScriptVector:
                 'orders': ['id', 'user_id', 'total']
             }
         """
-        # Получаем список всех таблиц через системный запрос
-        async with self.engine.connect() as conn:
-            # Для PostgreSQL получаем список таблиц из information_schema
-            result = await conn.execute(
-                text("""
-                     SELECT table_name
-                     FROM information_schema.tables
-                     WHERE table_schema = 'public'
-                     """)
-            )
-            table_names = [row[0] for row in result.fetchall()]
-
-            schema_info = {}
-
-            for table_name in table_names:
-                # Получаем колонки для каждой таблицы
-                columns_result = await conn.execute(
-                    text("""
-                         SELECT column_name
-                         FROM information_schema.columns
-                         WHERE table_schema = 'public'
-                           AND table_name = :table_name
-                         ORDER BY ordinal_position
-                         """),
-                    {"table_name": table_name}
-                )
-
-                columns = [row[0] for row in columns_result.fetchall()]
-                schema_info[table_name] = columns
+        tables = await self.get_db_schema_info()
+        return {name: table.column_names for name, table in tables.items()}
 
-            return schema_info
-
-    async def db_describe(self):
+    async def db_describe(self, schema_info: dict[str, list[str]] | None = None):
         """
         Асинхронно генерирует описания для полей базы данных с помощью LLM.
 
+        Схема разбивается на пачки в пределах бюджета токенов, которые
+        описываются параллельно (см. SchemaDescriber).
+
+        Args:
+            schema_info: Таблицы для описания (если None, описывается вся схема)
+
         Returns:
             dict[str, dict[str, str]] | None: Словарь с описаниями полей
         """
         logger.info('Начинаю описывать')
-        schema_info = await self.get_db_schema()
+        if schema_info is None:
+            schema_info = await self.get_db_schema()
         logger.info(schema_info)
         logger.info('Получаю описания')
-        prompt = (f'Твоя задача — сгенерировать описания и степень конфиденциальности для полей базы данных.\n'
-                  f'Входные данные (схема БД): {schema_info}\n\n'
-                  f'Требования к ответу:\n'
-                  f'1. Ответ должен быть ТОЛЬКО валидным JSON-объектом\n'
-                  f'2. Никакого дополнительного текста, пояснений, markdown-разметки или обрамления кодом\n'
-                  f'3. Структура JSON:\n'
-                  f'{{\n'
-                  f'  "имя_таблицы_1": {{\n'
-                  f'    "имя_поля_1": {{\n'
-                  f'      "description": "понятное описание на русском языке",\n'
-                  f'      "confidentiality": число_от_1_до_10\n'
-                  f'    }},\n'
-                  f'    "имя_поля_2": {{\n'
-                  f'      "description": "понятное описание на русском языке",\n'
-                  f'      "confidentiality": число_от_1_до_10\n'
-                  f'    }}\n'
-                  f'  }},\n'
-                  f'  "имя_таблицы_2": {{\n'
-                  f'    "имя_поля_1": {{\n'
-                  f'      "description": "понятное описание на русском языке",\n'
-                  f'      "confidentiality": число_от_1_до_10\n'
-                  f'    }}\n'
-                  f'  }}\n'
-                  f'}}\n\n'
-                  f'Правила генерации описаний:\n'
-                  f'- Описания должны быть краткими (2-5 слов)\n'
-                  f'- Описывай, какие данные хранятся в поле\n'
-                  f'- Используй бизнес-контекст, а не технические термины\n'
-                  f'- Для id полей пиши "Уникальный идентификатор записи"\n'
-                  f'- Для полей с датами пиши "Дата и время создания/изменения/события"\n'
-                  f'- Для внешних ключей указывай, на какую таблицу ссылаются\n\n'
-                  f'Правила определения степени конфиденциальности (confidentiality от 1 до 10):\n'
-                  f'- 1-2: Публичная информация (можно публиковать открыто)\n'
-                  f'  * Примеры: id, даты создания, статусы, справочные значения\n'
-                  f'- 3-4: Внутренняя информация (можно показывать внутри компании)\n'
-                  f'  * Примеры: названия, описания, категории, технические поля\n'
-                  f'- 5-6: Ограниченного доступа (только для авторизованных пользователей)\n'
-                  f'  * Примеры: email, username, обезличенная статистика\n'
-                  f'- 7-8: Конфиденциальная информация (ограниченный круг сотрудников)\n'
-                  f'  * Примеры: персональные данные, финансовые показатели, оценки\n'
-                  f'- 9-10: Особо конфиденциальная (только владелец и администраторы)\n'
-                  f'  * Примеры: пароли, токены, ключи доступа, медицинские данные\n\n'
-                  f'Пример:\n'
-                  f'Вход: {{"users": ["id", "username", "email", "password", "created_at", "scopes"]}}\n'
-                  f'Ответ: {{\n'
-                  f'  "users": {{\n'
-                  f'    "id": {{\n'
-                  f'      "description": "Уникальный идентификатор пользователя",\n'
-                  f'      "confidentiality": 1\n'
-                  f'    }},\n'
-                  f'    "username": {{\n'
-                  f'      "description": "Имя пользователя для входа",\n'
-                  f'      "confidentiality": 5\n'
-                  f'    }},\n'
-                  f'    "email": {{\n'
-                  f'      "description": "Электронная почта пользователя",\n'
-                  f'      "confidentiality": 6\n'
-                  f'    }},\n'
-                  f'    "password": {{\n'
-                  f'      "description": "Хэш пароля",\n'
-                  f'      "confidentiality": 10\n'
-                  f'    }},\n'
-                  f'    "created_at": {{\n'
-                  f'      "description": "Дата регистрации пользователя",\n'
-                  f'      "confidentiality": 2\n'
-                  f'    }},\n'
-                  f'    "scopes": {{\n'
-                  f'      "description": "Разрешения и роли пользователя",\n'
-                  f'      "confidentiality": 8\n'
-                  f'    }}\n'
-                  f'  }}\n'
-                  f'}}\n\n'
-                  f'Начинай генерацию ответа сразу с JSON:')
-
-        url = f'{config.rag_config.MODEL_HOST}/api/generate'
-        data = {
-            "model": config.rag_config.MODEL_NAME,
-            "stream": False,
-            "prompt": prompt
-        }
+        descriptions = await SchemaDescriber().describe(schema_info)
+        return descriptions or None
 
-        try:
-            response = requests.post(url, json=data)
-            processed_response = response.json()['response']
-            return json.loads(processed_response)
+    @staticmethod
+    def point_id(collection_name: str, table_name: str) -> str:
+        """
+        Возвращает детерминированный ID точки для таблицы.
 
-        except Exception as e:
-            logger.error(f'Ошибка запроса {e}')
+        Повторная загрузка той же таблицы перезаписывает точку, а не создает дубликат.
+
+        Args:
+            collection_name: Название коллекции
+            table_name: Название таблицы
+
+        Returns:
+            str: UUID точки
+        """
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f'{collection_name}/{table_name}'))
 
     @session_manager.connection(commit=True)
     async def add_data_to_vdb(self, db_session: AsyncSession, collection_name: str, vector_manager: VectorStoreManager,
@@ -184,117 +113,247 @@ class ScriptVector:
         """
         Генерирует описания для полей базы данных и сохраняет их в векторную БД.
 
+        Описываются и векторизуются только новые таблицы и таблицы, у которых
+        изменился набор колонок или их типы (сравнивается хэш схемы таблицы,
+        сохраненный в QdrantIds). Для остальных таблиц используются уже
+        сохраненные описания.
+
+        Загрузка выполняется пакетно: существующие записи QdrantIds читаются
+        одним запросом, тексты векторизуются пачками, точки загружаются
+        в Qdrant одним upsert, а новые записи QdrantIds - одним insert.
+
         Args:
             collection_name: Название коллекции
             db_session: Сессия бд
-            vector_database: Список названий векторных хранилищ
             vector_manager: Менеджер векторных хранилищ
             fields_description: Описания полей (если None, генерируются автоматически)
 
         Returns:
-            str | None: Сообщение об ошибке или None при успехе
+            dict[str, list[str]] | str: Отчет с ключами added, updated, skipped, failed
+                                        или сообщение об ошибке
         """
 
         logger.info('Начинаю обработку')
 
         try:
+            tables = await self.get_db_schema_info()
+            existing = {
+                row.table_name: row
+                for row in await sql_manager(select(QdrantIds)).scalars(db_session)
+            }
+            table_names = list(fields_description) if fields_description is not None else list(tables)
+
+            report = {'added': [], 'updated': [], 'skipped': [], 'failed': []}
+            schema_hashes = {}
+            to_describe = []
+            for name in table_names:
+                schema_hash = tables[name].schema_hash if name in tables else None
+                schema_hashes[name] = schema_hash
+                existing_field = existing.get(name)
+                if existing_field and (schema_hash is None or existing_field.schema_hash == schema_hash):
+                    logger.info(f'Таблица {name} не изменилась, описание переиспользуется')
+                    report['skipped'].append(name)
+                else:
+                    to_describe.append(name)
+
+            if not to_describe:
+                logger.info('Изменений в схеме нет')
+                return report
+
             if fields_description is None:
-                response = await self.db_describe()
+                response = await self.db_describe({name: tables[name].column_names for name in to_describe})
             else:
-                response = fields_description
+                response = {name: fields_description[name] for name in to_describe}
 
             logger.info(f'Ответ обработчика бд: {response}, {type(response)}')
 
             if response is None:
                 logger.error("Не удалось получить описания полей")
                 return "Ошибка: не удалось получить описания полей"
-            logger.info(collection_name)
-            vector_store = vector_manager.get_vector_store(collection_name)
-            logger.info('векторная бд получена')
-            if vector_store is None:
-                logger.error(f"Векторное хранилище {collection_name} не найдено")
-
-
-            for key, value in response.items():
-                logger.info(key)
-                existing_field = await sql_manager(
-                    select(QdrantIds).where(
-                        QdrantIds.table_name == key
-                    )
-                ).scalar_one_or_none(db_session)
-                logger.info(existing_field)
+
+            texts, metadatas, ids = [], [], []
+            new_rows, updated_rows = [], []
+            for key in to_describe:
+                value = response.get(key)
+                if value is None:
+                    logger.warning(f'Для таблицы {key} не получено описание')
+                    report['failed'].append(key)
+                    continue
+                existing_field = existing.get(key)
+                point_id = str(existing_field.ids) if existing_field else self.point_id(collection_name, key)
+                texts.append(f'Название таблицы: {key} Значения и описания: {value}')
+                metadatas.append({'table_name': key, 'value': value})
+                ids.append(point_id)
                 if existing_field:
-                    logger.info(f'Таблица {key} уже в векторной бд')
+                    updated_rows.append({'id': existing_field.id, 'schema_hash': schema_hashes[key]})
+                    report['updated'].append(key)
                 else:
-                    text = f'Название таблицы: {key} Значения и описания: {value}'
-                    point = await vector_store.aadd_texts(
-                        texts=[text],
-                        metadatas=[{
-                            'table_name': key,
-                            'value': value
-                        }]
-                    )
-                    await sql_manager(
-                        insert(QdrantIds).values(
-                            {'ids': point[0], 'table_name': key}
-                        )
-                    ).execute(db_session)
+                    new_rows.append({'ids': uuid.UUID(point_id), 'table_name': key, 'schema_hash': schema_hashes[key]})
+                    report['added'].append(key)
+
+            if texts:
+                logger.info(f'Загрузка {len(texts)} точек в коллекцию {collection_name}')
+                await vector_manager.upsert_texts(
+                    collection_name=collection_name,
+                    texts=texts,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+            if new_rows:
+                await sql_manager(insert(QdrantIds).values(new_rows)).execute(db_session)
+            if updated_rows:
+                await sql_manager(update(QdrantIds)).execute(db_session, updated_rows)
+                await sql_cache.evict_tables(vector_manager, report['updated'])
+
+            logger.info(
+                f"Добавлено: {len(report['added'])}, обновлено: {len(report['updated'])}, "
+                f"пропущено: {len(report['skipped'])}, с ошибкой: {len(report['failed'])}"
+            )
+            return report
         except Exception as e:
             logger.error(f"Ошибка: {e}")
             return f'Ошибка {e}'
 
     @staticmethod
-    async def get_all_points(vector_manager: VectorStoreManager):
-        try:
-            qdr_client = vector_manager.qdr_client
-            all_points = []  # список для всех точек
-            logger.info(config.rag_config.LIST_COLLECTION)
+    def encode_cursor(collection_name: str, offset: int | str | None) -> str:
+        """
+        Кодирует позицию обхода точек в непрозрачный курсор.
 
-            for name in config.rag_config.LIST_COLLECTION:
-                logger.info(f"Получение точек из коллекции: {name}")
+        Args:
+            collection_name: Коллекция, с которой продолжается обход
+            offset: next_offset Qdrant внутри коллекции (None - с начала коллекции)
 
-                # scroll возвращает кортеж (points, next_offset)
-                result = qdr_client.scroll(
-                    collection_name=name,
-                    with_payload=True,
-                )
+        Returns:
+            str: Курсор для передачи клиенту
+        """
+        raw = json.dumps({'collection': collection_name, 'offset': offset})
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[str, int | str | None]:
+        """
+        Декодирует курсор, выданный encode_cursor.
+
+        Args:
+            cursor: Курсор
+
+        Returns:
+            tuple[str, int | str | None]: Коллекция и offset внутри нее
 
-                # Распаковываем кортеж
-                points, next_offset = result
+        Raises:
+            ValueError: Если курсор поврежден
+        """
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return data['collection'], data['offset']
+        except Exception as e:
+            raise ValueError(f'Некорректный курсор: {cursor}') from e
 
-                # Обрабатываем полученные точки
-                for point in points:
-                    point_data = {
-                        'id': point.id,
-                        'collection': name,
-                        'matadata': point.payload['metadata']
-                    }
+    @staticmethod
+    def format_point(point: Record, collection_name: str) -> dict:
+        """Приводит точку Qdrant к формату ответа API"""
+        payload = point.payload or {}
+        return {
+            'id': point.id,
+            'collection': collection_name,
+            'metadata': payload.get(QdrantVectorStore.METADATA_KEY, {}),
+        }
 
-                    all_points.append(point_data)
+    @classmethod
+    async def get_points_page(
+            cls,
+            vector_manager: VectorStoreManager,
+            collection_name: str | None = None,
+            cursor: str | None = None,
+            limit: int = 100,
+            fields: list[str] | None = None,
+    ) -> tuple[list[dict], str | None]:
+        """
+        Возвращает одну страницу точек, используя next_offset Qdrant.
 
-                logger.info(f"Получено {len(points)} точек из {name}")
+        Если коллекция не указана, обходятся все коллекции из LIST_COLLECTION
+        по очереди; курсор хранит текущую коллекцию и offset внутри нее.
 
-                while next_offset is not None:
-                    result = qdr_client.scroll(
-                        collection_name=name,
-                        with_payload=True,
-                        offset=next_offset
-                    )
-                    points, next_offset = result
+        Args:
+            vector_manager: Менеджер векторных хранилищ
+            collection_name: Коллекция для обхода (None - все коллекции)
+            cursor: Курсор предыдущей страницы (None - с начала)
+            limit: Максимальное число точек на странице
+            fields: Поля metadata, которые нужно вернуть (None - все поля)
 
-                    for point in points:
-                        point_data = {
-                            'id': point.id,
-                            'collection': name,
-                            'payload': point.payload
-                        }
-                        if point.payload and 'metadata' in point.payload:
-                            point_data['table_info'] = point.payload['metadata']
+        Returns:
+            tuple[list[dict], str | None]: Точки и курсор следующей страницы
+                                           (None, если точек больше нет)
 
-                        all_points.append(point_data)
+        Raises:
+            ValueError: Если курсор поврежден или коллекция неизвестна
+        """
+        collections = [collection_name] if collection_name else list(config.rag_config.LIST_COLLECTION)
+        offset = None
+        if cursor:
+            current, offset = cls.decode_cursor(cursor)
+            if current not in collections:
+                raise ValueError(f'Курсор не относится к коллекции {collection_name}')
+            collections = collections[collections.index(current):]
+        for name in collections:
+            if name not in config.rag_config.LIST_COLLECTION:
+                raise ValueError(f'Неизвестная коллекция: {name}')
+
+        with_payload = [f'{QdrantVectorStore.METADATA_KEY}.{field}' for field in fields] if fields else True
+        page: list[dict] = []
+        for index, name in enumerate(collections):
+            while len(page) < limit:
+                points, next_offset = await vector_manager.scroll(
+                    collection_name=name,
+                    limit=limit - len(page),
+                    offset=offset,
+                    with_payload=with_payload,
+                )
+                page.extend(cls.format_point(point, name) for point in points)
+                offset = next_offset
+                if next_offset is None:
+                    break
+            if offset is not None:
+                return page, cls.encode_cursor(name, offset)
+            if len(page) >= limit:
+                if index + 1 < len(collections):
+                    return page, cls.encode_cursor(collections[index + 1], None)
+                return page, None
+        return page, None
+
+    @classmethod
+    async def iter_points(
+            cls,
+            vector_manager: VectorStoreManager,
+            collection_name: str | None = None,
+            cursor: str | None = None,
+            page_size: int = 256,
+            fields: list[str] | None = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Обходит точки постранично, удерживая в памяти не больше одной страницы.
 
-                    logger.info(f"Получено еще {len(points)} точек из {name}")
+        Args:
+            vector_manager: Менеджер векторных хранилищ
+            collection_name: Коллекция для обхода (None - все коллекции)
+            cursor: Курсор, с которого начинается обход (None - с начала)
+            page_size: Размер страницы запроса к Qdrant
+            fields: Поля metadata, которые нужно вернуть (None - все поля)
 
+        Yields:
+            dict: Точка в формате API
+        """
+        while True:
+            page, cursor = await cls.get_points_page(vector_manager, collection_name, cursor, page_size, fields)
+            for point in page:
+                yield point
+            if cursor is None:
+                break
+
+    @classmethod
+    async def get_all_points(cls, vector_manager: VectorStoreManager):
+        try:
+            all_points = [point async for point in cls.iter_points(vector_manager)]
             logger.success(f"Всего получено точек: {len(all_points)}")
             return all_points
 
@@ -0,0 +1,218 @@
+import re
+import uuid
+from pydantic import BaseModel
+from qdrant_client.models import Filter, FieldCondition, MatchValue, MatchAny
+from sqlalchemy.ext.asyncio import AsyncEngine
+from loguru import logger
+
+from .manager import VectorStoreManager
+from .introspection import schema_introspector
+from ...config import config
+
+
+class CachedSql(BaseModel):
+    """Найденный в кэше SQL запрос.
+
+    Attributes:
+        point_id(str): ID точки в коллекции кэша
+        question(str): Вопрос, для которого был сгенерирован запрос
+        sql_query(str): SQL запрос
+        row_count(int): Число строк, которое вернул запрос
+        score(float): Схожесть нового вопроса с сохраненным
+        reusable(bool): Схожесть достаточна, чтобы выполнить запрос без LLM
+    """
+    point_id: str
+    question: str
+    sql_query: str
+    row_count: int
+    score: float
+    reusable: bool
+
+
+class SqlCache:
+    """
+    Семантический кэш "вопрос -> SQL" в коллекции Qdrant.
+
+    Успешно выполненные запросы сохраняются вместе с вопросом, контекстом схемы,
+    числом строк и хэшами схем таблиц, на которые ссылается запрос. Если новый
+    вопрос того же намерения достаточно близок к сохраненному и содержит те же
+    литералы (числа, даты, строки в кавычках), SQL переиспользуется без LLM;
+    иначе - передается LLM как пример для адаптации.
+    Записи, у которых изменилась схема хотя бы одной таблицы, удаляются.
+
+    Attributes:
+        collection_name (str): Коллекция кэша
+        reuse_threshold (float): Схожесть, начиная с которой SQL выполняется без LLM
+        hint_threshold (float): Схожесть, начиная с которой SQL передается LLM как пример
+    """
+    _IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_$]*')
+    # Числа (в том числе даты вида 2024-01-31 и 31.01.2024) и строки в кавычках
+    _LITERAL = re.compile(r'"[^"]*"|\'[^\']*\'|«[^»]*»|\d+(?:[.,:/-]\d+)*')
+
+    def __init__(
+            self,
+            collection_name: str = config.rag_config.SQL_CACHE_COLLECTION,
+            reuse_threshold: float = config.rag_config.SQL_CACHE_REUSE_THRESHOLD,
+            hint_threshold: float = config.rag_config.SQL_CACHE_HINT_THRESHOLD,
+    ):
+        self.collection_name = collection_name
+        self.reuse_threshold = reuse_threshold
+        self.hint_threshold = min(hint_threshold, reuse_threshold)
+
+    @classmethod
+    def referenced_tables(cls, sql_query: str, table_names: list[str]) -> list[str]:
+        """
+        Определяет таблицы схемы, на которые ссылается запрос.
+
+        Args:
+            sql_query: SQL запрос
+            table_names: Таблицы схемы
+
+        Returns:
+            list[str]: Таблицы, имена которых встречаются в запросе
+        """
+        identifiers = {token.lower() for token in cls._IDENTIFIER.findall(sql_query)}
+        return [name for name in table_names if name.lower() in identifiers]
+
+    @classmethod
+    def literals(cls, question: str) -> list[str]:
+        """
+        Извлекает из вопроса литералы, которые попадают в SQL.
+
+        Вопросы "топ 10" и "топ 20" почти совпадают по эмбеддингу, но требуют
+        разного SQL, поэтому запрос переиспользуется только при совпадении литералов.
+        """
+        return sorted(literal.lower() for literal in cls._LITERAL.findall(question))
+
+    @staticmethod
+    def point_id(intent: str, question: str) -> str:
+        """Возвращает детерминированный ID записи для пары (намерение, вопрос)"""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f'sql/{intent}/{question.strip().lower()}'))
+
+    async def lookup(
+            self,
+            vector_manager: VectorStoreManager,
+            engine: AsyncEngine,
+            question: str,
+            intent: str,
+            query_embedding: list[float] | None = None,
+    ) -> CachedSql | None:
+        """
+        Ищет в кэше SQL для похожего вопроса того же намерения.
+
+        Args:
+            vector_manager: Менеджер векторных хранилищ
+            engine: Движок БД, по схеме которой проверяется актуальность записи
+            question: Вопрос пользователя
+            intent: Намерение (data, statistics, analytics)
+            query_embedding: Уже вычисленный эмбеддинг вопроса (если None, вычисляется)
+
+        Returns:
+            CachedSql | None: Найденный запрос или None
+        """
+        if query_embedding is None:
+            query_embedding = await vector_manager.embeddings.aembed_query(question)
+        points = await vector_manager.search(
+            self.collection_name,
+            query_embedding,
+            limit=1,
+            query_filter=Filter(must=[FieldCondition(key='metadata.intent', match=MatchValue(value=intent))]),
+            score_threshold=self.hint_threshold,
+        )
+        if not points:
+            return None
+        document, score = vector_manager.to_document(points[0]), points[0].score
+
+        tables = await schema_introspector.get_schema(engine)
+        table_hashes: dict[str, str] = document.metadata.get('table_hashes', {})
+        stale = [
+            name for name, schema_hash in table_hashes.items()
+            if name not in tables or tables[name].schema_hash != schema_hash
+        ]
+        if stale:
+            logger.info(f'Запись кэша SQL устарела, изменились таблицы: {stale}')
+            await vector_manager.delete(self.collection_name, ids=[document.id])
+            return None
+
+        cached_question = document.metadata['question']
+        reusable = score >= self.reuse_threshold
+        if reusable and self.literals(question) != self.literals(cached_question):
+            logger.info('Литералы вопросов различаются, SQL из кэша передается LLM как пример')
+            reusable = False
+        logger.info(f'Найден похожий вопрос в кэше SQL (схожесть {score:.3f})')
+        return CachedSql(
+            point_id=document.id,
+            question=cached_question,
+            sql_query=document.metadata['sql_query'],
+            row_count=document.metadata.get('row_count', 0),
+            score=score,
+            reusable=reusable,
+        )
+
+    async def store(
+            self,
+            vector_manager: VectorStoreManager,
+            engine: AsyncEngine,
+            question: str,
+            intent: str,
+            schema_info: str | None,
+            sql_query: str,
+            row_count: int,
+            query_embedding: list[float] | None = None,
+    ):
+        """
+        Сохраняет успешно выполненный запрос в кэш.
+
+        Args:
+            vector_manager: Менеджер векторных хранилищ
+            engine: Движок БД, по схеме которой вычисляются хэши таблиц
+            question: Вопрос пользователя
+            intent: Намерение (data, statistics, analytics)
+            schema_info: Контекст схемы, по которому был сгенерирован запрос
+            sql_query: SQL запрос
+            row_count: Число строк, которое вернул запрос
+            query_embedding: Уже вычисленный эмбеддинг вопроса (если None, вычисляется)
+        """
+        tables = await schema_introspector.get_schema(engine)
+        referenced = self.referenced_tables(sql_query, list(tables))
+        await vector_manager.upsert_texts(
+            collection_name=self.collection_name,
+            texts=[question],
+            metadatas=[{
+                'question': question,
+                'intent': intent,
+                'schema_info': schema_info,
+                'sql_query': sql_query,
+                'row_count': row_count,
+                'table_names': referenced,
+                'table_hashes': {name: tables[name].schema_hash for name in referenced},
+            }],
+            ids=[self.point_id(intent, question)],
+            vectors=[query_embedding] if query_embedding is not None else None,
+        )
+        logger.info(f'Запрос сохранен в кэш SQL, таблицы: {referenced}')
+
+    async def evict(self, vector_manager: VectorStoreManager, point_id: str):
+        """Удаляет запись из кэша (например, если запрос из кэша перестал выполняться)"""
+        await vector_manager.delete(self.collection_name, ids=[point_id])
+
+    async def evict_tables(self, vector_manager: VectorStoreManager, table_names: list[str]):
+        """
+        Удаляет записи кэша, которые ссылаются на перечисленные таблицы.
+
+        Args:
+            vector_manager: Менеджер векторных хранилищ
+            table_names: Таблицы, схема которых изменилась
+        """
+        if not table_names:
+            return
+        await vector_manager.delete(
+            self.collection_name,
+            points_filter=Filter(must=[
+                FieldCondition(key='metadata.table_names', match=MatchAny(any=table_names))
+            ]),
+        )
+        logger.info(f'Из кэша SQL удалены записи для таблиц: {table_names}')
+
+
+sql_cache = SqlCache()
@@ -0,0 +1,49 @@
+import json
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+
+class PlanEstimate(BaseModel):
+    """Оценка планировщика PostgreSQL для запроса.
+
+    Attributes:
+        rows(int): Ожидаемое число строк результата
+        cost(float): Ожидаемая полная стоимость выполнения
+        plan(dict): Корневой узел плана из EXPLAIN (FORMAT JSON)
+    """
+    rows: int
+    cost: float
+    plan: dict
+
+
+def strip_query(query: str) -> str:
+    """Убирает пробелы и завершающие точки с запятой, недопустимые внутри EXPLAIN и подзапросов"""
+    return query.strip().rstrip(';').strip()
+
+
+async def explain(session: AsyncSession, query: str) -> PlanEstimate:
+    """
+    Получает оценку запроса через EXPLAIN (FORMAT JSON) без его выполнения.
+
+    EXPLAIN выполняется в савепоинте: ошибка в запросе не ломает транзакцию сессии.
+
+    Args:
+        session (AsyncSession): Сессия БД
+        query (str): SQL запрос
+
+    Returns:
+        PlanEstimate: Оценка строк и стоимости
+
+    Raises:
+        Exception: Ошибка БД, если запрос некорректен
+    """
+    async with session.begin_nested():
+        connection = await session.connection()
+        result = await connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {strip_query(query)}')
+        raw = result.scalar_one()
+    document = json.loads(raw) if isinstance(raw, str) else raw
+    plan = document[0]['Plan']
+    estimate = PlanEstimate(rows=int(plan['Plan Rows']), cost=float(plan['Total Cost']), plan=plan)
+    logger.debug(f'Оценка запроса: {estimate.rows} строк, стоимость {estimate.cost}')
+    return estimate
@@ -0,0 +1,153 @@
+import time
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from .explain import PlanEstimate, explain
+from ...config import config
+
+
+class SqlValidationError(Exception):
+    """
+    Сгенерированный запрос отклонен до выполнения.
+
+    Attributes:
+        code (str): Причина (multiple_statements, not_read_only, explain_error, too_costly, too_many_rows)
+        detail (str): Описание причины для промпта повторной генерации
+        estimate (PlanEstimate | None): Оценка планировщика, если EXPLAIN выполнился
+    """
+    def __init__(self, code: str, detail: str, estimate: PlanEstimate | None = None):
+        super().__init__(f'Запрос отклонен до выполнения ({code}): {detail}')
+        self.code = code
+        self.detail = detail
+        self.estimate = estimate
+
+
+class SqlValidator:
+    """
+    Проверка сгенерированного SQL до выполнения.
+
+    Сначала запрос разбирается локально (sqlglot, диалект PostgreSQL): он должен
+    быть одним запросом на чтение. Если sqlglot не смог разобрать запрос,
+    решение остается за БД. Затем EXPLAIN (FORMAT JSON) проверяет запрос
+    в PostgreSQL без выполнения: синтаксис, таблицы и колонки, типы. Запросы
+    с оценкой стоимости или числа строк выше порогов отклоняются.
+
+    Для отклоненных запросов считается сэкономленная работа: суммарная оценка
+    стоимости и строк, которые не пришлось выполнять и передавать.
+
+    Attributes:
+        max_cost (float | None): Порог оценки стоимости (None - без ограничения)
+        max_rows (int | None): Порог оценки числа строк (None - без ограничения)
+        validated (int): Число проверенных запросов
+        rejected (dict[str, int]): Число отклоненных запросов по причинам
+        saved_cost (float): Суммарная оценка стоимости отклоненных запросов
+        saved_rows (int): Суммарная оценка строк отклоненных запросов
+        explain_time (float): Суммарное время EXPLAIN в секундах
+
+    Args:
+        max_cost (float | None, optional): Порог стоимости. Defaults to config.rag_config.SQL_MAX_ESTIMATED_COST.
+        max_rows (int | None, optional): Порог строк. Defaults to config.rag_config.SQL_MAX_ESTIMATED_ROWS.
+    """
+    _READ_ONLY = (exp.Select, exp.Union, exp.Intersect, exp.Except, exp.Subquery)
+
+    def __init__(
+            self,
+            max_cost: float | None = config.rag_config.SQL_MAX_ESTIMATED_COST,
+            max_rows: int | None = config.rag_config.SQL_MAX_ESTIMATED_ROWS,
+    ):
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.validated = 0
+        self.rejected: dict[str, int] = {}
+        self.saved_cost = 0.0
+        self.saved_rows = 0
+        self.explain_time = 0.0
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает счетчики проверок и сэкономленной работы"""
+        return {
+            'validated': self.validated,
+            'rejected': dict(self.rejected),
+            'saved_cost': self.saved_cost,
+            'saved_rows': self.saved_rows,
+            'explain_time': self.explain_time,
+        }
+
+    def _reject(self, code: str, detail: str, estimate: PlanEstimate | None = None) -> SqlValidationError:
+        self.rejected[code] = self.rejected.get(code, 0) + 1
+        if estimate is not None:
+            self.saved_cost += estimate.cost
+            self.saved_rows += estimate.rows
+        logger.warning(f'SQL отклонен до выполнения ({code}): {detail}')
+        return SqlValidationError(code, detail, estimate)
+
+    def check_syntax(self, query: str):
+        """
+        Локальная проверка: один запрос и только чтение.
+
+        Raises:
+            SqlValidationError: Если запрос не является одним SELECT запросом
+        """
+        try:
+            statements = [statement for statement in sqlglot.parse(query, read='postgres') if statement is not None]
+        except ParseError as e:
+            # sqlglot поддерживает не весь синтаксис PostgreSQL, окончательно решит EXPLAIN
+            logger.debug(f'sqlglot не разобрал запрос: {e}')
+            return
+        if len(statements) != 1:
+            raise self._reject('multiple_statements', f'нужен ровно один запрос, получено {len(statements)}')
+        if not isinstance(statements[0], self._READ_ONLY):
+            raise self._reject(
+                'not_read_only',
+                f'разрешены только запросы на чтение (SELECT), получен {statements[0].key.upper()}'
+            )
+
+    async def validate(self, session: AsyncSession, query: str, check_rows: bool = True) -> PlanEstimate:
+        """
+        Проверяет запрос локально и через EXPLAIN.
+
+        Args:
+            session (AsyncSession): Сессия БД
+            query (str): SQL запрос
+            check_rows (bool, optional): Проверять порог строк (выгрузки ограничивают строки сами).
+                Defaults to True.
+
+        Returns:
+            PlanEstimate: Оценка планировщика для прошедшего проверку запроса
+
+        Raises:
+            SqlValidationError: Если запрос отклонен, с причиной для повторной генерации
+        """
+        self.validated += 1
+        self.check_syntax(query)
+
+        started = time.perf_counter()
+        try:
+            estimate = await explain(session, query)
+        except Exception as e:
+            raise self._reject('explain_error', str(e)) from e
+        finally:
+            self.explain_time += time.perf_counter() - started
+
+        if self.max_cost is not None and estimate.cost > self.max_cost:
+            raise self._reject(
+                'too_costly',
+                f'оценка стоимости {estimate.cost:.0f} больше допустимой {self.max_cost:.0f}; '
+                f'проверь условия соединения таблиц и добавь фильтры',
+                estimate,
+            )
+        if check_rows and self.max_rows is not None and estimate.rows > self.max_rows:
+            raise self._reject(
+                'too_many_rows',
+                f'ожидается {estimate.rows} строк при допустимых {self.max_rows}; '
+                f'добавь фильтры или агрегацию',
+                estimate,
+            )
+        return estimate
+
+
+sql_validator = SqlValidator()
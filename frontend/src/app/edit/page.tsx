@@ -19,7 +19,7 @@ interface PointMetadata {
 interface Point {
   id: string
   collection: string
-  matadata: PointMetadata
+  metadata: PointMetadata
 }
 
 interface EditingField {
@@ -53,18 +53,30 @@ export default function EditPage() {
     setLoading(true)
 
     try {
-      const response = await fetch(`${backendUrl}/vector/points`, {
-        method: 'GET',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-      })
+      const data: Point[] = []
+      let cursor: string | null = null
 
-      if (!response.ok) {
-        throw new Error(`Ошибка загрузки: ${response.status}`)
-      }
+      do {
+        const params = new URLSearchParams({ limit: '500' })
+        if (cursor) {
+          params.set('cursor', cursor)
+        }
+        const response = await fetch(`${backendUrl}/vector/points?${params}`, {
+          method: 'GET',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+        })
+
+        if (!response.ok) {
+          throw new Error(`Ошибка загрузки: ${response.status}`)
+        }
+
+        const page = await response.json()
+        data.push(...page.points)
+        cursor = page.next_cursor
+      } while (cursor)
 
-      const data = await response.json()
       setPoints(data)
 
       const initialEditing: Record<string, EditingPoint> = {}
@@ -72,8 +84,8 @@ export default function EditPage() {
         initialEditing[point.id] = {
           id: point.id,
           collection: point.collection,
-          table_name: point.matadata.table_name,
-          fields: { ...point.matadata.value },
+          table_name: point.metadata.table_name,
+          fields: { ...point.metadata.value },
           hasChanges: false
         }
       })
@@ -189,8 +201,8 @@ export default function EditPage() {
         [pointId]: {
           id: pointId,
           collection: originalPoint.collection,
-          table_name: originalPoint.matadata.table_name,
-          fields: { ...originalPoint.matadata.value },
+          table_name: originalPoint.metadata.table_name,
+          fields: { ...originalPoint.metadata.value },
           hasChanges: false
         }
       }))
@@ -272,7 +284,7 @@ export default function EditPage() {
                       >
                         <div className="flex items-center space-x-3">
                           <FileText className="w-4 h-4 text-gray-400" />
-                          <span className="font-medium text-gray-900">{point.matadata.table_name}</span>
+                          <span className="font-medium text-gray-900">{point.metadata.table_name}</span>
                           <span className="text-xs text-gray-500">
                             ID: {point.id.slice(0, 8)}...
                           </span>